@@ -0,0 +1,322 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+from app.metrics import registry
+
+load_dotenv()
+
+
+def parse_bytes(value):
+    """Parse docker-style sizes such as 512m, 2g or a plain byte count"""
+    if value is None or value == "":
+        return 0
+    value = str(value).strip().lower().rstrip("b")
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(float(value))
+
+
+def detect_host_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def detect_host_memory():
+    """Total memory available to this host, honouring a cgroup v2 limit if one is set"""
+    total = 0
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    total = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        try:
+            total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        except (ValueError, OSError, AttributeError):
+            total = 0
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            limit = f.read().strip()
+            if limit != "max" and (not total or int(limit) < total):
+                total = int(limit)
+    except (OSError, ValueError):
+        pass
+    return total or parse_bytes("4g")
+
+
+HOST_CPUS = float(os.getenv("HOST_CPUS") or detect_host_cpus())
+HOST_MEMORY = parse_bytes(os.getenv("HOST_MEMORY")) or detect_host_memory()
+HOST_RESERVED_MEMORY = parse_bytes(os.getenv("HOST_RESERVED_MEMORY", "1g"))
+ADMISSION_CPU_OVERCOMMIT = float(os.getenv("ADMISSION_CPU_OVERCOMMIT", "1.0"))
+
+CONTAINER_PROFILES = {
+    "build": {
+        "cpus": float(os.getenv("BUILD_CPUS", "2")),
+        "memory": parse_bytes(os.getenv("BUILD_MEMORY", "2g")),
+        "pids_limit": int(os.getenv("BUILD_PIDS_LIMIT", "1024")),
+        "max_concurrent": int(os.getenv("MAX_CONCURRENT_BUILDS", "0")),
+        "queue_timeout": float(os.getenv("BUILD_QUEUE_TIMEOUT", "900")),
+    },
+    "backend": {
+        "cpus": float(os.getenv("BACKEND_CPUS", "1")),
+        "memory": parse_bytes(os.getenv("BACKEND_MEMORY", "512m")),
+        "pids_limit": int(os.getenv("BACKEND_PIDS_LIMIT", "256")),
+        "max_concurrent": int(os.getenv("MAX_CONCURRENT_BACKENDS", "0")),
+        "queue_timeout": float(os.getenv("BACKEND_QUEUE_TIMEOUT", "60")),
+    },
+}
+
+
+def container_limits(kind: str):
+    """Docker SDK keyword arguments enforcing the resource profile of a container kind"""
+    profile = CONTAINER_PROFILES[kind]
+    limits = {}
+    if profile["cpus"]:
+        limits["nano_cpus"] = int(profile["cpus"] * 1e9)
+    if profile["memory"]:
+        limits["mem_limit"] = profile["memory"]
+        limits["memswap_limit"] = profile["memory"]
+    if profile["pids_limit"]:
+        limits["pids_limit"] = profile["pids_limit"]
+    return limits
+
+
+class AdmissionTimeout(Exception):
+    def __init__(self, kind: str, waited: float):
+        super().__init__(f"Timed out after {waited:.1f}s waiting for a free {kind} slot")
+        self.kind = kind
+        self.waited = waited
+
+
+class AdmissionTicket:
+    def __init__(self, kind: str, wait_seconds: float):
+        self.kind = kind
+        self.wait_seconds = wait_seconds
+        self.admitted_at = time.time()
+        self.released = False
+
+
+class _Waiter:
+    def __init__(self, kind, loop, future):
+        self.kind = kind
+        self.loop = loop
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+def _resolve_waiter(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class AdmissionController:
+    """Admits builds and backends while their reserved CPU and memory fit on the host.
+
+    Work that does not fit waits in a FIFO queue per kind. Tickets may be
+    released from any thread (backends are released by their monitor thread).
+    """
+
+    def __init__(self, total_cpus, total_memory, profiles):
+        self.total_cpus = total_cpus
+        self.total_memory = total_memory
+        self.profiles = profiles
+        self._lock = threading.Lock()
+        self._used_cpus = 0.0
+        self._used_memory = 0
+        self._running = {kind: 0 for kind in profiles}
+        self._waiters = deque()
+        self._paused = {}
+        self._stats = {
+            kind: {"admitted": 0, "timed_out": 0, "wait_seconds_total": 0.0, "max_wait_seconds": 0.0}
+            for kind in profiles
+        }
+
+    def capacity(self, kind: str):
+        """Maximum number of containers of this kind the host can run at once"""
+        profile = self.profiles[kind]
+        limits = []
+        if profile["cpus"]:
+            limits.append(int(self.total_cpus * ADMISSION_CPU_OVERCOMMIT // profile["cpus"]))
+        if profile["memory"]:
+            limits.append(int(self.total_memory // profile["memory"]))
+        if profile["max_concurrent"]:
+            limits.append(profile["max_concurrent"])
+        return max(1, min(limits)) if limits else 1
+
+    def _fits(self, kind):
+        profile = self.profiles[kind]
+        if kind in self._paused or self._running[kind] >= self.capacity(kind):
+            return False
+        if not any(self._running.values()):
+            return True
+        return (
+            self._used_cpus + profile["cpus"] <= self.total_cpus * ADMISSION_CPU_OVERCOMMIT
+            and self._used_memory + profile["memory"] <= self.total_memory
+        )
+
+    def _take(self, kind):
+        profile = self.profiles[kind]
+        self._running[kind] += 1
+        self._used_cpus += profile["cpus"]
+        self._used_memory += profile["memory"]
+
+    def _give_back(self, kind):
+        profile = self.profiles[kind]
+        self._running[kind] -= 1
+        self._used_cpus = max(0.0, self._used_cpus - profile["cpus"])
+        self._used_memory = max(0, self._used_memory - profile["memory"])
+
+    def _grant_waiters(self):
+        blocked = set()
+        for waiter in list(self._waiters):
+            if waiter.kind in blocked:
+                continue
+            if self._fits(waiter.kind):
+                self._take(waiter.kind)
+                self._waiters.remove(waiter)
+                waiter.loop.call_soon_threadsafe(_resolve_waiter, waiter.future)
+            else:
+                blocked.add(waiter.kind)
+
+    def _record_wait(self, kind, waited):
+        stats = self._stats[kind]
+        stats["admitted"] += 1
+        stats["wait_seconds_total"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+
+    async def acquire(self, kind: str, timeout=None):
+        """Wait for a slot of the given kind; raises AdmissionTimeout if none frees up in time"""
+        if timeout is None:
+            timeout = self.profiles[kind]["queue_timeout"]
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not any(w.kind == kind for w in self._waiters) and self._fits(kind):
+                self._take(kind)
+                self._record_wait(kind, 0.0)
+                return AdmissionTicket(kind, 0.0)
+            waiter = _Waiter(kind, loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            waited = time.monotonic() - waiter.enqueued_at
+            with self._lock:
+                granted = waiter not in self._waiters
+                if not granted:
+                    self._waiters.remove(waiter)
+                    if isinstance(e, asyncio.TimeoutError):
+                        self._stats[kind]["timed_out"] += 1
+                else:
+                    # A slot was handed over while we were giving up; pass it on
+                    self._give_back(kind)
+                    self._grant_waiters()
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionTimeout(kind, waited)
+            raise
+
+        waited = time.monotonic() - waiter.enqueued_at
+        with self._lock:
+            self._record_wait(kind, waited)
+        return AdmissionTicket(kind, waited)
+
+    def release(self, ticket):
+        if ticket is None or ticket.released:
+            return
+        with self._lock:
+            ticket.released = True
+            self._give_back(ticket.kind)
+            self._grant_waiters()
+
+    @asynccontextmanager
+    async def slot(self, kind: str, timeout=None):
+        ticket = await self.acquire(kind, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def pause(self, kind: str, reason: str):
+        """Admit nothing more of this kind until resume(); requests queue up as if the host were full"""
+        with self._lock:
+            self._paused[kind] = reason
+
+    def resume(self, kind: str):
+        with self._lock:
+            if self._paused.pop(kind, None) is not None:
+                self._grant_waiters()
+
+    def paused(self, kind: str):
+        """Why admission of this kind is paused, or None"""
+        return self._paused.get(kind)
+
+    def queue_depth(self, kind: str):
+        return sum(1 for w in self._waiters if w.kind == kind)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            kinds = {}
+            for kind, profile in self.profiles.items():
+                stats = self._stats[kind]
+                queued = [w for w in self._waiters if w.kind == kind]
+                kinds[kind] = {
+                    "capacity": self.capacity(kind),
+                    "running": self._running[kind],
+                    "paused": self._paused.get(kind),
+                    "queued": len(queued),
+                    "oldest_queued_seconds": round(now - queued[0].enqueued_at, 3) if queued else 0.0,
+                    "admitted": stats["admitted"],
+                    "timed_out": stats["timed_out"],
+                    "avg_wait_seconds": round(stats["wait_seconds_total"] / stats["admitted"], 3) if stats["admitted"] else 0.0,
+                    "max_wait_seconds": round(stats["max_wait_seconds"], 3),
+                    "limits": {
+                        "cpus": profile["cpus"],
+                        "memory_bytes": profile["memory"],
+                        "pids_limit": profile["pids_limit"],
+                    },
+                }
+            return {
+                "host": {
+                    "cpus": self.total_cpus,
+                    "memory_bytes": self.total_memory,
+                    "used_cpus": round(self._used_cpus, 3),
+                    "used_memory_bytes": self._used_memory,
+                },
+                "kinds": kinds,
+            }
+
+
+admission = AdmissionController(
+    HOST_CPUS,
+    max(HOST_MEMORY - HOST_RESERVED_MEMORY, parse_bytes("512m")),
+    CONTAINER_PROFILES,
+)
+
+registry.gauge(
+    "hoster_admission_running",
+    "Containers currently admitted, per kind",
+    ("kind",),
+    callback=lambda: {(k,): v["running"] for k, v in admission.stats()["kinds"].items()},
+)
+registry.gauge(
+    "hoster_admission_queued",
+    "Requests waiting for admission, per kind",
+    ("kind",),
+    callback=lambda: {(k,): v["queued"] for k, v in admission.stats()["kinds"].items()},
+)
+registry.gauge(
+    "hoster_admission_paused",
+    "1 while admission of a kind is paused (e.g. builds under disk pressure)",
+    ("kind",),
+    callback=lambda: {(k,): 0 if v["paused"] is None else 1 for k, v in admission.stats()["kinds"].items()},
+)
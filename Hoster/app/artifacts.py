@@ -0,0 +1,296 @@
+import io
+import os
+import gzip
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from app.metrics import s3_bytes
+from app.cache_policy import classify, manifest_hashed_files, CACHE_CONTROL, IMMUTABLE, REVALIDATE
+from app.log import get_logger
+
+load_dotenv()
+
+
+ARTIFACT_GZIP_LEVEL = int(os.getenv("ARTIFACT_GZIP_LEVEL", "6"))
+ARTIFACT_GZIP_MIN_BYTES = int(os.getenv("ARTIFACT_GZIP_MIN_BYTES", "1024"))
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "8"))
+# Upload compressible files gzip-encoded (Content-Encoding: gzip) instead of as-is
+S3_UPLOAD_GZIP = os.getenv("S3_UPLOAD_GZIP", "false").lower() in ("1", "true", "yes")
+MANIFEST_NAME = ".hoster-manifest.json"
+
+log = get_logger("artifacts")
+
+CONTENT_TYPES = {
+    ".html": "text/html",
+    ".htm": "text/html",
+    ".css": "text/css",
+    ".js": "application/javascript",
+    ".json": "application/json",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".svg": "image/svg+xml",
+    ".webp": "image/webp",
+    ".ico": "image/x-icon",
+    ".woff": "font/woff",
+    ".woff2": "font/woff2",
+    ".ttf": "font/ttf",
+    ".otf": "font/otf",
+    ".mjs": "application/javascript",
+    ".map": "application/json",
+    ".txt": "text/plain",
+    ".xml": "application/xml",
+    ".webmanifest": "application/manifest+json",
+    ".wasm": "application/wasm",
+    ".avif": "image/avif",
+}
+# Worth compressing; images and fonts other than svg/ttf/otf are compressed already
+COMPRESSIBLE_EXTENSIONS = (".html", ".htm", ".css", ".js", ".mjs", ".json", ".map", ".svg", ".txt", ".xml", ".ttf", ".otf", ".wasm")
+
+
+def content_type_for(name: str):
+    return CONTENT_TYPES.get(os.path.splitext(name.lower())[1], "application/octet-stream")
+
+
+def is_compressible(name: str, size: int):
+    return size >= ARTIFACT_GZIP_MIN_BYTES and name.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+class ChunkReader(io.RawIOBase):
+    """File object over an iterator of byte chunks, e.g. docker-py's get_archive stream"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class S3Uploader:
+    """Uploads objects on a thread pool, bounding how many bodies wait in memory"""
+
+    def __init__(self, s3, bucket: str, s3_prefix: str, base_url: str = ""):
+        self.s3 = s3
+        self.bucket = bucket
+        self.s3_prefix = s3_prefix
+        self.base_url = base_url or ""
+        self.uploaded = []
+        self.failed = []
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(S3_UPLOAD_CONCURRENCY * 2)
+        self._pool = ThreadPoolExecutor(max_workers=S3_UPLOAD_CONCURRENCY, thread_name_prefix="s3-upload")
+        self._futures = []
+
+    def submit(self, name: str, data: bytes, gzipped: bytes = None, cache_class: str = None):
+        self._slots.acquire()
+        self._futures.append(self._pool.submit(self._put, name, data, gzipped, cache_class or classify(name)))
+
+    def _put(self, name: str, data: bytes, gzipped: bytes, cache_class: str):
+        key = f"{self.s3_prefix}/{name}"
+        extra_args = {"ContentType": content_type_for(name), "CacheControl": CACHE_CONTROL[cache_class]}
+        body = data
+        if S3_UPLOAD_GZIP and gzipped is not None:
+            body = gzipped
+            extra_args["ContentEncoding"] = "gzip"
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, **extra_args)
+            with self._lock:
+                self.uploaded.append(f"{self.base_url}{key}")
+                self.bytes += len(body)
+        except Exception as e:
+            with self._lock:
+                self.failed.append({"file": name, "error": str(e)})
+        finally:
+            self._slots.release()
+
+    def wait(self):
+        for future in self._futures:
+            future.result()
+        self._futures = []
+
+    def close(self):
+        self.wait()
+        self._pool.shutdown()
+        s3_bytes.inc(self.bytes, operation="upload")
+
+
+class ArtifactPipeline:
+    """Single pass over a build's output tar stream.
+
+    Each file is read once and then hashed into the manifest, gzip-compressed
+    when worthwhile, written to a staging copy of the local store, and handed
+    to the S3 uploader.
+
+    Only files with a content hash in their name are uploaded while the
+    stream is read. The rest wait for finish(): a build manifest later in the
+    stream may still mark them immutable. HTML and other revalidated entry
+    points go last, so a deploy never references assets that are not there
+    yet and a build that fails validation leaves the live index.html alone.
+    """
+
+    def __init__(self, store_dir: str, uploader: S3Uploader = None):
+        self.store_dir = store_dir
+        self.staging_dir = os.path.join(
+            os.path.dirname(store_dir) or ".", f".{os.path.basename(store_dir)}.staging-{uuid.uuid4().hex[:8]}"
+        )
+        self.uploader = uploader
+        self.files = {}
+        self.hashed_files = set()
+        self.index_html = None
+        self._deferred = []
+        self.stats = {"files": 0, "bytes": 0, "gzip_bytes": 0}
+
+    def consume(self, chunks):
+        """Read a tar stream whose entries sit under one top-level directory (docker get_archive of a folder)"""
+        started_at = time.perf_counter()
+        os.makedirs(self.staging_dir, exist_ok=True)
+        with tarfile.open(fileobj=io.BufferedReader(ChunkReader(chunks), 1 << 20), mode="r|") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                parts = member.name.split("/")[1:]
+                if not parts or ".." in parts or member.name.startswith("/"):
+                    continue
+                self.add("/".join(parts), tar.extractfile(member).read())
+        self.stats["read_ms"] = round((time.perf_counter() - started_at) * 1000, 1)
+        return self.stats
+
+    def add(self, name: str, data: bytes):
+        gzipped = None
+        if is_compressible(name, len(data)):
+            gzipped = gzip.compress(data, ARTIFACT_GZIP_LEVEL, mtime=0)
+            if len(gzipped) >= len(data):
+                gzipped = None
+        self.files[name] = {
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "size": len(data),
+            "content_type": content_type_for(name),
+            **({"gzip_size": len(gzipped)} if gzipped else {}),
+        }
+        if name == "index.html":
+            self.index_html = data
+        self.hashed_files |= manifest_hashed_files(name, data)
+
+        target = os.path.join(self.staging_dir, *name.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(data)
+        if gzipped:
+            with open(target + ".gz", "wb") as f:
+                f.write(gzipped)
+
+        self.stats["files"] += 1
+        self.stats["bytes"] += len(data)
+        self.stats["gzip_bytes"] += len(gzipped) if gzipped else 0
+        if self.uploader:
+            if classify(name) == IMMUTABLE:
+                self.uploader.submit(name, data, gzipped, IMMUTABLE)
+            else:
+                self._deferred.append(name)
+
+    def _read_staged(self, name: str):
+        target = os.path.join(self.staging_dir, *name.split("/"))
+        with open(target, "rb") as f:
+            data = f.read()
+        gzipped = None
+        if "gzip_size" in self.files[name]:
+            with open(target + ".gz", "rb") as f:
+                gzipped = f.read()
+        return data, gzipped
+
+    def manifest(self):
+        digest = hashlib.sha256()
+        for name in sorted(self.files):
+            digest.update(f"{name}\0{self.files[name]['sha256']}\n".encode("utf-8"))
+            self.files[name]["cache"] = classify(name, self.hashed_files)
+        return {"digest": digest.hexdigest(), "files": self.files}
+
+    def finish(self):
+        """Upload the entry points, wait for S3 and swap the staging copy into the local store"""
+        manifest = self.manifest()
+        with open(os.path.join(self.staging_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+        summary = {**self.stats, "digest": manifest["digest"], "uploaded": [], "failed": []}
+        if self.uploader:
+            # Assets first, then the documents that reference them
+            entry_points = [name for name in self._deferred if self.files[name]["cache"] == REVALIDATE]
+            for name in self._deferred:
+                if name not in entry_points:
+                    self.uploader.submit(name, *self._read_staged(name), self.files[name]["cache"])
+            self.uploader.wait()
+            for name in entry_points:
+                self.uploader.submit(name, *self._read_staged(name), REVALIDATE)
+            self.uploader.close()
+            summary.update(uploaded=self.uploader.uploaded, failed=self.uploader.failed)
+            if self.uploader.failed:
+                log.warning("S3 upload failures", s3_prefix=self.uploader.s3_prefix, failed=self.uploader.failed[:10])
+
+        previous = f"{self.staging_dir}.old"
+        try:
+            os.rename(self.store_dir, previous)
+        except FileNotFoundError:
+            # No earlier build, or the janitor just removed it
+            previous = None
+        os.rename(self.staging_dir, self.store_dir)
+        if previous:
+            shutil.rmtree(previous, ignore_errors=True)
+        return summary
+
+    def discard(self):
+        if self.uploader:
+            self.uploader.close()
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+
+def upload_directory(uploader: S3Uploader, local_folder: str):
+    """Upload a local store directory as written by ArtifactPipeline, entry points last"""
+    try:
+        with open(os.path.join(local_folder, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            cache_classes = {name: entry.get("cache") for name, entry in json.load(f)["files"].items()}
+    except (OSError, ValueError, KeyError):
+        cache_classes = {}
+    deferred = []
+    for root, _, names in os.walk(local_folder):
+        for file_name in names:
+            local_path = os.path.join(root, file_name)
+            if file_name == MANIFEST_NAME or (file_name.endswith(".gz") and os.path.exists(local_path[:-3])):
+                continue
+            name = os.path.relpath(local_path, local_folder).replace("\\", "/")
+            with open(local_path, "rb") as f:
+                data = f.read()
+            gzipped = None
+            if S3_UPLOAD_GZIP and os.path.exists(local_path + ".gz"):
+                with open(local_path + ".gz", "rb") as f:
+                    gzipped = f.read()
+            cache_class = cache_classes.get(name) or classify(name)
+            if cache_class == REVALIDATE:
+                deferred.append((name, data, gzipped))
+            else:
+                uploader.submit(name, data, gzipped, cache_class)
+    uploader.wait()
+    for name, data, gzipped in deferred:
+        uploader.submit(name, data, gzipped, REVALIDATE)
+    uploader.close()
+    return uploader
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+BUILD_CACHE_PATH = os.getenv("BUILD_CACHE_PATH", "./build_cache.json")
+BUILD_CACHE_MAX_ENTRIES = int(os.getenv("BUILD_CACHE_MAX_ENTRIES", "500"))
+
+
+def build_cache_key(tree_sha: str, settings: dict):
+    """Cache key for the content of a project subtree built with the given settings"""
+    material = json.dumps({"tree_sha": tree_sha, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class BuildCache:
+    """Persistent index of successful builds keyed by subtree content hash.
+
+    A hit is only reported when its artifacts are still in place: either the
+    deploy target still serves that exact build, or the local build directory
+    still holds it and can be re-deployed without rebuilding.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+            self._data.setdefault("entries", {})
+            self._data.setdefault("deployed", {})
+            self._data.setdefault("local", {})
+            # build_path -> the deploy target its build was made for
+            self._data.setdefault("local_targets", {})
+        return self._data
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, key: str, target: str):
+        """Return (entry, state) where state is 'deployed', 'local' or None"""
+        with self._lock:
+            data = self._load()
+            entry = data["entries"].get(key)
+            if not entry:
+                return None, None
+            if data["deployed"].get(target) == key:
+                state = "deployed"
+            elif data["local"].get(entry["build_path"]) == key and os.path.exists(
+                os.path.join(entry["build_path"], "index.html")
+            ):
+                state = "local"
+            else:
+                return None, None
+            entry["hits"] = entry.get("hits", 0) + 1
+            entry["last_hit_at"] = time.time()
+            self._save()
+            return dict(entry), state
+
+    def store(self, key: str, target: str, entry: dict, local: bool = True):
+        """Record a build; local=False for builds whose build_path is on another host, only reusable while deployed"""
+        with self._lock:
+            data = self._load()
+            data["entries"][key] = {**entry, "key": key, "created_at": time.time(), "hits": 0}
+            if local:
+                data["local"][entry["build_path"]] = key
+                data["local_targets"][entry["build_path"]] = target
+            if entry.get("deployed"):
+                data["deployed"][target] = key
+            else:
+                data["deployed"].pop(target, None)
+            if len(data["entries"]) > BUILD_CACHE_MAX_ENTRIES:
+                live = set(data["deployed"].values()) | set(data["local"].values())
+                stale = sorted(
+                    (e for k, e in data["entries"].items() if k not in live),
+                    key=lambda e: e.get("last_hit_at", e["created_at"])
+                )
+                for old in stale[:len(data["entries"]) - BUILD_CACHE_MAX_ENTRIES]:
+                    del data["entries"][old["key"]]
+            self._save()
+
+    def mark_deployed(self, key: str, target: str):
+        """Record that key is live at target; None when the live build is not a cached one"""
+        with self._lock:
+            deployed = self._load()["deployed"]
+            if key:
+                deployed[target] = key
+            else:
+                deployed.pop(target, None)
+            self._save()
+
+    def forget_target(self, target: str):
+        """Forget what is deployed to target and to any target nested below it"""
+        with self._lock:
+            deployed = self._load()["deployed"]
+            nested = [t for t in deployed if t == target or t.startswith(target + "/")]
+            for t in nested:
+                del deployed[t]
+            if nested:
+                self._save()
+
+    def deployed_from(self, build_path: str):
+        """True when the deploy target of the build in build_path serves that same build from S3"""
+        build_path = os.path.normpath(build_path)
+        with self._lock:
+            data = self._load()
+            for path, key in data["local"].items():
+                if os.path.normpath(path) == build_path:
+                    target = data["local_targets"].get(path)
+                    return target is not None and data["deployed"].get(target) == key
+            return False
+
+    def forget_local(self, build_path: str):
+        with self._lock:
+            data = self._load()
+            data["local_targets"].pop(build_path, None)
+            if data["local"].pop(build_path, None):
+                self._save()
+
+
+build_cache = BuildCache(BUILD_CACHE_PATH)
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+from app.metrics import build_phase_seconds
+
+load_dotenv()
+
+
+BUILD_HISTORY_PATH = os.getenv("BUILD_HISTORY_PATH", "./build_history.db")
+BUILD_HISTORY_MAX_PER_REPO = int(os.getenv("BUILD_HISTORY_MAX_PER_REPO", "100"))
+
+
+class BuildTrace:
+    """Span tree of one build; every finished span is also observed as a build phase metric"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self.spans = []
+        self._stack = []
+
+    def _offset_ms(self):
+        return round((time.perf_counter() - self._origin) * 1000, 1)
+
+    def _attach(self, span):
+        (self._stack[-1]["children"] if self._stack else self.spans).append(span)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time a block as a child of the currently open span; yields the span's attrs dict"""
+        span = {"name": name, "start_ms": self._offset_ms(), "duration_ms": None, "attrs": attrs, "children": []}
+        self._attach(span)
+        self._stack.append(span)
+        started_at = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            span["error"] = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started_at
+            span["duration_ms"] = round(elapsed * 1000, 1)
+            self._stack.pop()
+            build_phase_seconds.observe(elapsed, phase=name)
+
+    def add(self, name: str, seconds: float, **attrs):
+        """Record a span that was timed elsewhere, e.g. inside the build container"""
+        self._attach({
+            "name": name,
+            "start_ms": None,
+            "duration_ms": round(seconds * 1000, 1),
+            "attrs": attrs,
+            "children": [],
+        })
+        build_phase_seconds.observe(seconds, phase=name)
+
+    def graft(self, spans):
+        """Attach the spans of a trace recorded in another process, e.g. by a build worker"""
+        pending = list(spans)
+        for span in pending:
+            self._attach(span)
+        while pending:
+            span = pending.pop()
+            if span.get("duration_ms") is not None:
+                build_phase_seconds.observe(span["duration_ms"] / 1000, phase=span["name"])
+            pending.extend(span.get("children", []))
+
+    def to_dict(self):
+        return {"total_ms": self._offset_ms(), "spans": self.spans}
+
+
+class BuildHistory:
+    """Finished builds with their timing traces, kept in SQLite"""
+
+    def __init__(self, path: str, max_per_repo: int):
+        self.path = path
+        self.max_per_repo = max_per_repo
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS builds ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, owner TEXT NOT NULL, repo TEXT NOT NULL, "
+                "project_path TEXT NOT NULL, commit_sha TEXT, outcome TEXT NOT NULL, "
+                "status_code INTEGER NOT NULL, error TEXT, started_at REAL NOT NULL, "
+                "duration_ms REAL NOT NULL, trace TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS builds_repo ON builds (owner, repo, started_at)")
+            self._local.conn = conn
+        return conn
+
+    def record(self, owner: str, repo: str, project_path: str, commit_sha: str, outcome: str,
+               status_code: int, trace: BuildTrace, error: str = None):
+        data = trace.to_dict()
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO builds (owner, repo, project_path, commit_sha, outcome, status_code, error, "
+            "started_at, duration_ms, trace) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (owner, repo, project_path or "", commit_sha, outcome, status_code, error,
+             trace.started_at, data["total_ms"], json.dumps(data["spans"])),
+        )
+        conn.execute(
+            "DELETE FROM builds WHERE owner = ? AND repo = ? AND id NOT IN "
+            "(SELECT id FROM builds WHERE owner = ? AND repo = ? ORDER BY id DESC LIMIT ?)",
+            (owner, repo, owner, repo, self.max_per_repo),
+        )
+
+    def recent(self, owner: str, repo: str, limit: int = 20, project_path: str = None):
+        query = "SELECT * FROM builds WHERE owner = ? AND repo = ?"
+        params = [owner, repo]
+        if project_path is not None:
+            query += " AND project_path = ?"
+            params.append(project_path)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        cursor = self._conn().execute(query, params)
+        columns = [c[0] for c in cursor.description]
+        rows = []
+        for row in cursor.fetchall():
+            entry = dict(zip(columns, row))
+            entry["trace"] = json.loads(entry["trace"])
+            rows.append(entry)
+        return rows
+
+
+build_history = BuildHistory(BUILD_HISTORY_PATH, BUILD_HISTORY_MAX_PER_REPO)
@@ -0,0 +1,120 @@
+import time
+import asyncio
+
+from app.metrics import registry
+
+
+class BuildJob:
+    """One in-flight build of (owner, repo, commit sha, project_path) for one deploy target.
+
+    ref is what the request asked for (a branch, a tag, HEAD or a commit SHA) and resolved to sha.
+    """
+
+    def __init__(self, owner: str, repo: str, sha: str, project_path: str, target: str = "", ref: str = "HEAD"):
+        self.owner = owner
+        self.repo = repo
+        self.sha = sha
+        self.ref = ref or "HEAD"
+        self.project_path = project_path or ""
+        self.target = target
+        self.state = "queued"
+        self.attached = 0
+        self.created_at = time.time()
+        self.task = None
+        self.superseded_by = None
+        # Set where the build can be withdrawn from outside, i.e. a job on a build worker; blocking
+        self.still_current = None
+
+    @property
+    def key(self):
+        return (self.owner, self.repo, self.sha, self.project_path, self.target)
+
+    @property
+    def lineage(self):
+        return (self.owner, self.repo, self.project_path, self.target)
+
+    def current(self):
+        """False once the build was withdrawn; its result must not go live"""
+        return self.still_current is None or self.still_current()
+
+    def to_dict(self):
+        return {
+            "owner": self.owner,
+            "repo": self.repo,
+            "sha": self.sha,
+            "ref": self.ref,
+            "project_path": self.project_path,
+            "target": self.target,
+            "state": self.state,
+            "attached_requests": self.attached,
+            "age_seconds": round(time.time() - self.created_at, 3),
+        }
+
+
+class BuildCoalescer:
+    """Deduplicates concurrent builds of the same commit.
+
+    Requests for a build that is already in flight attach to it and share its
+    result. When a ref now resolves to a different commit, starting that build
+    cancels still queued builds of the same project made for the same ref,
+    and their requests follow the newer build instead. Builds of other refs,
+    e.g. a pinned older commit, are left alone.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+
+    async def run(self, owner: str, repo: str, sha: str, project_path: str, pipeline, target: str = "",
+                  ref: str = "HEAD"):
+        """Run pipeline(job) once per key; returns (result, job, coalesced)"""
+        job = BuildJob(owner, repo, sha, project_path, target, ref)
+        existing = self._jobs.get(job.key)
+        coalesced = existing is not None
+
+        if existing:
+            job = existing
+            job.attached += 1
+        else:
+            for other in list(self._jobs.values()):
+                if other.lineage == job.lineage and other.ref == job.ref and other.state == "queued":
+                    other.superseded_by = job
+                    other.task.cancel()
+                    self._forget(other)
+            job.task = asyncio.create_task(self._execute(job, pipeline))
+            # Also runs for a task cancelled before it started, when _execute never gets to clean up
+            job.task.add_done_callback(lambda _, job=job: self._forget(job))
+            self._jobs[job.key] = job
+
+        while True:
+            try:
+                return await asyncio.shield(job.task), job, coalesced
+            except asyncio.CancelledError:
+                if job.superseded_by is not None and job.task.cancelled():
+                    job = job.superseded_by
+                    job.attached += 1
+                    coalesced = True
+                    continue
+                raise
+
+    async def _execute(self, job, pipeline):
+        try:
+            return await pipeline(job)
+        finally:
+            self._forget(job)
+
+    def _forget(self, job):
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+        job.state = "finished"
+
+    def in_flight(self):
+        return [job.to_dict() for job in self._jobs.values()]
+
+
+build_coalescer = BuildCoalescer()
+
+registry.gauge(
+    "hoster_builds_in_flight",
+    "Distinct builds queued or running",
+    callback=lambda: {(): len(build_coalescer.in_flight())},
+)
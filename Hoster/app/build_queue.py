@@ -0,0 +1,498 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# "sqlite" or "filesystem" for workers on the API host, "redis" for workers on other hosts
+BUILD_QUEUE_BACKEND = os.getenv("BUILD_QUEUE_BACKEND", "sqlite").lower()
+BUILD_QUEUE_SQLITE_PATH = os.getenv("BUILD_QUEUE_SQLITE_PATH", "./build_queue.db")
+BUILD_QUEUE_DIR = os.getenv("BUILD_QUEUE_DIR", "./build_queue")
+BUILD_QUEUE_REDIS_URL = os.getenv("BUILD_QUEUE_REDIS_URL", "redis://localhost:6379/0")
+# A job whose lease runs out (its worker stopped renewing it) is handed to another worker
+BUILD_JOB_LEASE_SECONDS = float(os.getenv("BUILD_JOB_LEASE_SECONDS", "60"))
+BUILD_JOB_MAX_ATTEMPTS = int(os.getenv("BUILD_JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs nobody collected are deleted after this long
+BUILD_JOB_RESULT_TTL = float(os.getenv("BUILD_JOB_RESULT_TTL", "3600"))
+# Workers without a heartbeat for this long are no longer listed
+WORKER_TTL = float(os.getenv("WORKER_TTL", "30"))
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+CANCELLED = "cancelled"
+FINISHED = (DONE, CANCELLED)
+
+
+def new_job_id():
+    """Unique id that sorts by submission time"""
+    return f"{time.time_ns():020d}-{uuid.uuid4().hex[:12]}"
+
+
+def lost_result(attempts):
+    return {"payload": {"success": False, "error": f"Build worker stopped responding ({attempts} attempts)"},
+            "status_code": 503}
+
+
+class SQLiteBuildQueue:
+    """Build jobs in a local SQLite file shared by the API and the workers on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, payload TEXT NOT NULL, state TEXT NOT NULL, worker TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, lease_expires REAL, updated_at REAL NOT NULL, result TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, info TEXT NOT NULL, seen_at REAL NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def submit(self, payload: dict):
+        job_id = new_job_id()
+        self._conn().execute(
+            "INSERT INTO jobs (id, payload, state, updated_at) VALUES (?, ?, ?, ?)",
+            (job_id, json.dumps(payload), QUEUED, time.time()),
+        )
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float = BUILD_JOB_LEASE_SECONDS):
+        """Lease the oldest waiting job, or one whose lease expired; returns (job_id, payload) or None"""
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT id, payload, attempts FROM jobs WHERE state = ? OR (state = ? AND lease_expires < ?) "
+                    "ORDER BY id LIMIT 1", (QUEUED, LEASED, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, payload, attempts = row
+                if attempts >= BUILD_JOB_MAX_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE jobs SET state = ?, worker = NULL, updated_at = ?, result = ?, "
+                        "payload = json_remove(payload, '$.authorization') WHERE id = ?",
+                        (DONE, now, json.dumps(lost_result(attempts)), job_id),
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET state = ?, worker = ?, attempts = attempts + 1, lease_expires = ?, "
+                    "updated_at = ? WHERE id = ?", (LEASED, worker_id, now + lease_seconds, now, job_id),
+                )
+                return job_id, json.loads(payload)
+
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float = BUILD_JOB_LEASE_SECONDS):
+        """Extend a lease; False when the job is no longer leased to worker_id"""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND state = ? AND worker = ?",
+            (time.time() + lease_seconds, job_id, LEASED, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: dict):
+        now = time.time()
+        with self._transaction() as conn:
+            # Finished jobs no longer need the user's credentials
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, updated_at = ?, result = ?, payload = json_remove(payload, '$.authorization') "
+                "WHERE id = ? AND state = ? AND worker = ?",
+                (DONE, now, json.dumps(result), job_id, LEASED, worker_id),
+            )
+            conn.execute("DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?", (*FINISHED, now - BUILD_JOB_RESULT_TTL))
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id: str):
+        """Withdraw a job no worker has taken yet"""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ? AND state = ?", (CANCELLED, time.time(), job_id, QUEUED)
+        )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str):
+        row = self._conn().execute(
+            "SELECT state, worker, attempts, result FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"state": row[0], "worker": row[1], "attempts": row[2], "result": json.loads(row[3]) if row[3] else None}
+
+    def remove(self, job_id: str):
+        """Delete a job and its payload; a worker still holding its lease loses it"""
+        self._conn().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def heartbeat(self, worker_id: str, info: dict):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO workers (id, info, seen_at) VALUES (?, ?, ?)", (worker_id, json.dumps(info), time.time())
+        )
+
+    def unregister(self, worker_id: str):
+        self._conn().execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def workers(self):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM workers WHERE seen_at < ?", (now - WORKER_TTL,))
+        return [
+            {**json.loads(info), "id": worker_id, "seen_seconds_ago": round(now - seen_at, 1)}
+            for worker_id, info, seen_at in conn.execute("SELECT id, info, seen_at FROM workers ORDER BY id")
+        ]
+
+    def stats(self):
+        counts = dict(self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return {"queued": counts.get(QUEUED, 0), "leased": counts.get(LEASED, 0)}
+
+
+class FileBuildQueue:
+    """Build jobs as JSON files in a directory on the host, one file per job.
+
+    Every change happens under an exclusive flock on the directory's lock
+    file, so the API and any number of worker processes can share it.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.jobs_dir = os.path.join(directory, "jobs")
+        self.workers_dir = os.path.join(directory, "workers")
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        os.makedirs(self.workers_dir, exist_ok=True)
+        self._lock_path = os.path.join(directory, "queue.lock")
+
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _path(self, job_id: str):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _read(self, path: str):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path: str, data: dict):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def _jobs(self):
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if name.endswith(".json"):
+                job = self._read(os.path.join(self.jobs_dir, name))
+                if job is not None:
+                    yield name[:-5], job
+
+    def submit(self, payload: dict):
+        job_id = new_job_id()
+        with self._locked():
+            self._write(self._path(job_id), {
+                "payload": payload, "state": QUEUED, "worker": None, "attempts": 0,
+                "lease_expires": None, "updated_at": time.time(), "result": None,
+            })
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float = BUILD_JOB_LEASE_SECONDS):
+        now = time.time()
+        with self._locked():
+            for job_id, job in self._jobs():
+                if job["state"] in FINISHED:
+                    if job["updated_at"] < now - BUILD_JOB_RESULT_TTL:
+                        os.remove(self._path(job_id))
+                    continue
+                if job["state"] == LEASED and job["lease_expires"] >= now:
+                    continue
+                job["updated_at"] = now
+                if job["attempts"] >= BUILD_JOB_MAX_ATTEMPTS:
+                    job["payload"].pop("authorization", None)
+                    job.update(state=DONE, worker=None, result=lost_result(job["attempts"]))
+                    self._write(self._path(job_id), job)
+                    continue
+                job.update(state=LEASED, worker=worker_id, attempts=job["attempts"] + 1, lease_expires=now + lease_seconds)
+                self._write(self._path(job_id), job)
+                return job_id, job["payload"]
+        return None
+
+    def _update_leased(self, job_id: str, worker_id: str, **changes):
+        with self._locked():
+            job = self._read(self._path(job_id))
+            if job is None or job["state"] != LEASED or job["worker"] != worker_id:
+                return False
+            job.update(changes)
+            self._write(self._path(job_id), job)
+            return True
+
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float = BUILD_JOB_LEASE_SECONDS):
+        return self._update_leased(job_id, worker_id, lease_expires=time.time() + lease_seconds)
+
+    def complete(self, job_id: str, worker_id: str, result: dict):
+        with self._locked():
+            job = self._read(self._path(job_id))
+            if job is None or job["state"] != LEASED or job["worker"] != worker_id:
+                return False
+            job["payload"].pop("authorization", None)
+            job.update(state=DONE, updated_at=time.time(), result=result)
+            self._write(self._path(job_id), job)
+            return True
+
+    def cancel(self, job_id: str):
+        with self._locked():
+            job = self._read(self._path(job_id))
+            if job is None or job["state"] != QUEUED:
+                return False
+            job.update(state=CANCELLED, updated_at=time.time())
+            self._write(self._path(job_id), job)
+            return True
+
+    def get(self, job_id: str):
+        job = self._read(self._path(job_id))
+        if job is None:
+            return None
+        return {key: job[key] for key in ("state", "worker", "attempts", "result")}
+
+    def remove(self, job_id: str):
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def heartbeat(self, worker_id: str, info: dict):
+        self._write(os.path.join(self.workers_dir, f"{worker_id.replace('/', '_')}.json"),
+                    {"id": worker_id, "info": info, "seen_at": time.time()})
+
+    def unregister(self, worker_id: str):
+        try:
+            os.remove(os.path.join(self.workers_dir, f"{worker_id.replace('/', '_')}.json"))
+        except FileNotFoundError:
+            pass
+
+    def workers(self):
+        now = time.time()
+        workers = []
+        for name in sorted(os.listdir(self.workers_dir)):
+            entry = self._read(os.path.join(self.workers_dir, name)) if name.endswith(".json") else None
+            if entry and entry["seen_at"] >= now - WORKER_TTL:
+                workers.append({**entry["info"], "id": entry["id"], "seen_seconds_ago": round(now - entry["seen_at"], 1)})
+        return workers
+
+    def stats(self):
+        states = [job["state"] for _, job in self._jobs()]
+        return {"queued": states.count(QUEUED), "leased": states.count(LEASED)}
+
+
+# KEYS: queue list, leased zset; ARGV: worker id, now, lease seconds, max attempts, result ttl, job key prefix, lost result
+REDIS_CLAIM = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[2])
+for _, job_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], job_id)
+    redis.call('HSET', ARGV[6] .. job_id, 'state', 'queued')
+    redis.call('RPUSH', KEYS[1], job_id)
+end
+while true do
+    local job_id = redis.call('RPOP', KEYS[1])
+    if not job_id then
+        return nil
+    end
+    local key = ARGV[6] .. job_id
+    local state = redis.call('HGET', key, 'state')
+    if state == 'queued' then
+        local attempts = tonumber(redis.call('HGET', key, 'attempts') or '0')
+        if attempts >= tonumber(ARGV[4]) then
+            local payload = cjson.decode(redis.call('HGET', key, 'payload'))
+            payload['authorization'] = nil
+            redis.call('HSET', key, 'state', 'done', 'result', string.gsub(ARGV[7], '{attempts}', attempts), 'updated_at', ARGV[2],
+                       'payload', cjson.encode(payload))
+            redis.call('EXPIRE', key, ARGV[5])
+        else
+            local expires = tonumber(ARGV[2]) + tonumber(ARGV[3])
+            redis.call('HSET', key, 'state', 'leased', 'worker', ARGV[1], 'attempts', attempts + 1,
+                       'lease_expires', expires, 'updated_at', ARGV[2])
+            redis.call('ZADD', KEYS[2], expires, job_id)
+            return {job_id, redis.call('HGET', key, 'payload')}
+        end
+    end
+end
+"""
+
+# KEYS: job hash, leased zset; ARGV: job id, worker id, lease expiry
+REDIS_RENEW = """
+if redis.call('HGET', KEYS[1], 'state') ~= 'leased' or redis.call('HGET', KEYS[1], 'worker') ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'lease_expires', ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+# KEYS: job hash, leased zset; ARGV: job id, worker id, now, result, result ttl
+REDIS_COMPLETE = """
+if redis.call('HGET', KEYS[1], 'state') ~= 'leased' or redis.call('HGET', KEYS[1], 'worker') ~= ARGV[2] then
+    return 0
+end
+local payload = cjson.decode(redis.call('HGET', KEYS[1], 'payload'))
+payload['authorization'] = nil
+redis.call('HSET', KEYS[1], 'state', 'done', 'updated_at', ARGV[3], 'result', ARGV[4], 'payload', cjson.encode(payload))
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+# KEYS: job hash, queue list; ARGV: job id, now, result ttl
+REDIS_CANCEL = """
+if redis.call('HGET', KEYS[1], 'state') ~= 'queued' then
+    return 0
+end
+redis.call('LREM', KEYS[2], 0, ARGV[1])
+redis.call('HSET', KEYS[1], 'state', 'cancelled', 'updated_at', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class RedisBuildQueue:
+    """Build jobs in any Redis-protocol server, for workers spread over several hosts.
+
+    Claiming, renewing and completing run as Lua scripts, so a job is never
+    leased to two workers at once.
+    """
+
+    def __init__(self, url: str, prefix: str = "hoster:build"):
+        import redis
+
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.queue_key = f"{prefix}:queue"
+        self.leased_key = f"{prefix}:leased"
+        self.workers_key = f"{prefix}:workers"
+        self.job_prefix = f"{prefix}:job:"
+        self._claim = self._redis.register_script(REDIS_CLAIM)
+        self._renew = self._redis.register_script(REDIS_RENEW)
+        self._complete = self._redis.register_script(REDIS_COMPLETE)
+        self._cancel = self._redis.register_script(REDIS_CANCEL)
+
+    def submit(self, payload: dict):
+        job_id = new_job_id()
+        pipe = self._redis.pipeline()
+        pipe.hset(self.job_prefix + job_id, mapping={
+            "payload": json.dumps(payload), "state": QUEUED, "attempts": 0, "updated_at": time.time()
+        })
+        pipe.lpush(self.queue_key, job_id)
+        pipe.execute()
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float = BUILD_JOB_LEASE_SECONDS):
+        claimed = self._claim(keys=[self.queue_key, self.leased_key], args=[
+            worker_id, time.time(), lease_seconds, BUILD_JOB_MAX_ATTEMPTS, int(BUILD_JOB_RESULT_TTL),
+            self.job_prefix, json.dumps(lost_result("{attempts}")),
+        ])
+        if not claimed:
+            return None
+        return claimed[0], json.loads(claimed[1])
+
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float = BUILD_JOB_LEASE_SECONDS):
+        return bool(self._renew(keys=[self.job_prefix + job_id, self.leased_key],
+                                args=[job_id, worker_id, time.time() + lease_seconds]))
+
+    def complete(self, job_id: str, worker_id: str, result: dict):
+        return bool(self._complete(keys=[self.job_prefix + job_id, self.leased_key],
+                                   args=[job_id, worker_id, time.time(), json.dumps(result), int(BUILD_JOB_RESULT_TTL)]))
+
+    def cancel(self, job_id: str):
+        return bool(self._cancel(keys=[self.job_prefix + job_id, self.queue_key],
+                                 args=[job_id, time.time(), int(BUILD_JOB_RESULT_TTL)]))
+
+    def get(self, job_id: str):
+        job = self._redis.hgetall(self.job_prefix + job_id)
+        if not job:
+            return None
+        return {
+            "state": job["state"],
+            "worker": job.get("worker"),
+            "attempts": int(job.get("attempts", 0)),
+            "result": json.loads(job["result"]) if job.get("result") else None,
+        }
+
+    def remove(self, job_id: str):
+        pipe = self._redis.pipeline()
+        pipe.delete(self.job_prefix + job_id)
+        # An expired lease would otherwise put the id back in the queue as a job without payload
+        pipe.zrem(self.leased_key, job_id)
+        pipe.lrem(self.queue_key, 0, job_id)
+        pipe.execute()
+
+    def heartbeat(self, worker_id: str, info: dict):
+        self._redis.hset(self.workers_key, worker_id, json.dumps({"info": info, "seen_at": time.time()}))
+
+    def unregister(self, worker_id: str):
+        self._redis.hdel(self.workers_key, worker_id)
+
+    def workers(self):
+        now = time.time()
+        workers = []
+        for worker_id, data in sorted(self._redis.hgetall(self.workers_key).items()):
+            entry = json.loads(data)
+            if entry["seen_at"] < now - WORKER_TTL:
+                self._redis.hdel(self.workers_key, worker_id)
+                continue
+            workers.append({**entry["info"], "id": worker_id, "seen_seconds_ago": round(now - entry["seen_at"], 1)})
+        return workers
+
+    def stats(self):
+        pipe = self._redis.pipeline()
+        pipe.llen(self.queue_key)
+        pipe.zcard(self.leased_key)
+        queued, leased = pipe.execute()
+        return {"queued": queued, "leased": leased}
+
+
+def create_build_queue():
+    if BUILD_QUEUE_BACKEND == "redis":
+        return RedisBuildQueue(BUILD_QUEUE_REDIS_URL)
+    if BUILD_QUEUE_BACKEND == "filesystem":
+        return FileBuildQueue(BUILD_QUEUE_DIR)
+    return SQLiteBuildQueue(BUILD_QUEUE_SQLITE_PATH)
+
+
+_build_queue = None
+_build_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Shared queue, created on first use so API processes that build locally never open it"""
+    global _build_queue
+    with _build_queue_lock:
+        if _build_queue is None:
+            _build_queue = create_build_queue()
+    return _build_queue
@@ -0,0 +1,148 @@
+import os
+import re
+import shutil
+import tarfile
+import threading
+import subprocess
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+DOCKER_CLI = os.getenv("DOCKER_CLI", "docker")
+# Named buildx builder; empty means the current one (the daemon's built-in BuildKit)
+BUILDKIT_BUILDER = os.getenv("BUILDKIT_BUILDER", "")
+BUILDKIT_TIMEOUT = float(os.getenv("BUILDKIT_TIMEOUT", "1800"))
+DOCKERFILE_NAME = "Dockerfile.hoster"
+LOCKFILES = ("package-lock.json", "npm-shrinkwrap.json")
+
+# "Total:	1.23GB" at the end of `docker buildx prune`
+PRUNE_TOTAL = re.compile(r"^Total:\s+([\d.]+)\s*([kKMGT]?B)\s*$", re.MULTILINE)
+DECIMAL_UNITS = {"B": 1, "kB": 1000, "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4}
+
+# "#12 3.456 some output" in --progress=plain
+PROGRESS_PREFIX = re.compile(r"^#\d+ (?:\d+\.\d+ )?")
+
+DOCKERFILE_TEMPLATE = """# syntax=docker/dockerfile:1
+FROM {image} AS deps
+WORKDIR /app
+COPY {dependency_files} ./
+RUN --mount=type=cache,id=hoster-npm,target=/root/.npm,sharing=shared \\
+    echo "@@hoster-phase npm_install start $(node -p 'Date.now()')" && \\
+    {install} && \\
+    echo "@@hoster-phase npm_install end $(node -p 'Date.now()')"
+
+FROM deps AS build
+COPY . .
+RUN echo "@@hoster-phase build start $(node -p 'Date.now()')" && \\
+    npm run build && \\
+    echo "@@hoster-phase build end $(node -p 'Date.now()')" && \\
+    if [ -d build ]; then mv build /out; \\
+    elif [ -d dist ]; then mv dist /out; \\
+    else echo "❌ No build directory found!" && ls -la && exit 1; fi && \\
+    if [ ! -f /out/index.html ]; then echo "❌ No index.html found in build!" && exit 1; fi
+
+FROM scratch
+COPY --from=build /out /output
+"""
+
+DOCKERIGNORE = f"node_modules\n{DOCKERFILE_NAME}\n.dockerignore\n"
+
+
+def dockerfile_for(image: str, dependency_files):
+    """Multi-stage Dockerfile; dependencies sit in their own layer keyed by package.json and the lockfile"""
+    has_lockfile = any(name in LOCKFILES for name in dependency_files)
+    install = (
+        "(npm ci --prefer-offline --no-audit || npm install --prefer-offline --no-audit)"
+        if has_lockfile else "npm install --prefer-offline --no-audit"
+    )
+    return DOCKERFILE_TEMPLATE.format(image=image, dependency_files=" ".join(dependency_files), install=install)
+
+
+def context_files(image: str, dependency_files):
+    """Extra files to add to the build context tar"""
+    return {
+        DOCKERFILE_NAME: dockerfile_for(image, dependency_files).encode("utf-8"),
+        ".dockerignore": DOCKERIGNORE.encode("utf-8"),
+    }
+
+
+def available():
+    return shutil.which(DOCKER_CLI) is not None
+
+
+def build_command():
+    command = [DOCKER_CLI, "buildx", "build"]
+    if BUILDKIT_BUILDER:
+        command += ["--builder", BUILDKIT_BUILDER]
+    return command + [
+        "--file", DOCKERFILE_NAME,
+        "--progress", "plain",
+        "--output", "type=tar,dest=-",
+        "-",
+    ]
+
+
+def plain_logs(progress: str):
+    """Build output without BuildKit's step/time prefixes, so phase markers start their lines"""
+    return "\n".join(PROGRESS_PREFIX.sub("", line) for line in progress.splitlines())
+
+
+def run_build(context_tar: bytes, consume):
+    """Build from a context tar on stdin; consume() reads the exported tar from stdout.
+
+    Returns (exit_code, progress_log, cached_steps).
+    """
+    process = subprocess.Popen(
+        build_command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    progress = []
+
+    def feed():
+        try:
+            process.stdin.write(context_tar)
+        except BrokenPipeError:
+            pass
+        finally:
+            process.stdin.close()
+
+    def drain():
+        progress.append(process.stderr.read().decode("utf-8", errors="replace"))
+
+    threads = [threading.Thread(target=feed, daemon=True), threading.Thread(target=drain, daemon=True)]
+    for thread in threads:
+        thread.start()
+    timer = threading.Timer(BUILDKIT_TIMEOUT, process.kill)
+    timer.start()
+    try:
+        try:
+            consume(iter(lambda: process.stdout.read(1 << 20), b""))
+        except tarfile.ReadError:
+            # Nothing was exported because the build failed; the exit code says why
+            process.stdout.read()
+        exit_code = process.wait()
+    except BaseException:
+        # buildx would block on a full stdout pipe and keep stderr open, hanging the joins below
+        process.kill()
+        process.stdout.read()
+        process.wait()
+        raise
+    finally:
+        timer.cancel()
+        for thread in threads:
+            thread.join()
+    log_text = "".join(progress)
+    cached_steps = sum(1 for line in log_text.splitlines() if line.endswith(" CACHED"))
+    return exit_code, plain_logs(log_text), cached_steps
+
+
+def prune_cache(keep_bytes: int):
+    """Trim the BuildKit cache (layers and the npm cache mount) to keep_bytes; returns the bytes reclaimed"""
+    command = [DOCKER_CLI, "buildx", "prune", "--force", f"--keep-storage={int(keep_bytes)}"]
+    if BUILDKIT_BUILDER:
+        command += ["--builder", BUILDKIT_BUILDER]
+    result = subprocess.run(command, capture_output=True, text=True, timeout=BUILDKIT_TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"docker buildx prune exited with {result.returncode}")
+    match = PRUNE_TOTAL.search(result.stdout)
+    return int(float(match.group(1)) * DECIMAL_UNITS[match.group(2)]) if match else 0
@@ -0,0 +1,95 @@
+import os
+import re
+import json
+import posixpath
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+CACHE_IMMUTABLE_MAX_AGE = int(os.getenv("CACHE_IMMUTABLE_MAX_AGE", "31536000"))
+CACHE_SHORT_MAX_AGE = int(os.getenv("CACHE_SHORT_MAX_AGE", "300"))
+
+IMMUTABLE = "immutable"
+REVALIDATE = "revalidate"
+SHORT = "short"
+
+CACHE_CONTROL = {
+    IMMUTABLE: f"public, max-age={CACHE_IMMUTABLE_MAX_AGE}, immutable",
+    REVALIDATE: "public, max-age=0, must-revalidate",
+    SHORT: f"public, max-age={CACHE_SHORT_MAX_AGE}",
+}
+
+# Build manifests listing the hashed files of a build: Vite (build.manifest) and Create React App
+BUILD_MANIFESTS = (".vite/manifest.json", "manifest.json", "asset-manifest.json")
+
+# Entry points and files whose name stays the same across deploys; they must never be cached long
+REVALIDATE_NAMES = {
+    "sw.js", "service-worker.js", "serviceworker.js", "registersw.js",
+    "manifest.json", "manifest.webmanifest", "site.webmanifest", "asset-manifest.json",
+    "robots.txt", "sitemap.xml",
+}
+REVALIDATE_EXTENSIONS = (".html", ".htm", ".webmanifest")
+
+# main.3f2a1b9c.js, main.3f2a1b9c.chunk.css (CRA / webpack: hex) and index-BX3kz_9a.js (Vite: base64url)
+HEX_HASH = re.compile(r"[.-]([0-9a-f]{8,32})(?:\.chunk)?\.[A-Za-z0-9]+$")
+VITE_HASH = re.compile(r"-([A-Za-z0-9_-]{8})\.[A-Za-z0-9]+$")
+# Names such as Inter-SemiBold.woff2 or vendor-polyfill.js, which VITE_HASH matches but are no hash
+WORD = re.compile(r"[a-z]+|[A-Z]+|(?:[A-Z][a-z]+)+")
+
+
+def has_hashed_name(name: str):
+    """Whether the filename carries a content hash.
+
+    A hex hash must contain a digit; a Vite hash must not read as a word (all one case, or CamelCase).
+    """
+    base = posixpath.basename(name)
+    match = HEX_HASH.search(base)
+    if match and any(c.isdigit() for c in match.group(1)):
+        return True
+    match = VITE_HASH.search(base)
+    return bool(match) and not WORD.fullmatch(match.group(1))
+
+
+def manifest_hashed_files(name: str, data: bytes):
+    """Paths a Vite or CRA build manifest lists as emitted (hashed) files; empty for anything else"""
+    if name not in BUILD_MANIFESTS:
+        return set()
+    try:
+        manifest = json.loads(data)
+    except ValueError:
+        return set()
+    if not isinstance(manifest, dict):
+        return set()
+    files = set()
+    if isinstance(manifest.get("files"), dict):
+        # CRA: {"files": {"main.js": "/static/js/main.3f2a1b9c.js", ...}}
+        files.update(v for v in manifest["files"].values() if isinstance(v, str))
+    else:
+        # Vite: {"src/main.jsx": {"file": "assets/index-BX3kz_9a.js", "css": [...], "assets": [...]}, ...}
+        for chunk in manifest.values():
+            if not isinstance(chunk, dict):
+                continue
+            if isinstance(chunk.get("file"), str):
+                files.add(chunk["file"])
+            for key in ("css", "assets"):
+                files.update(v for v in chunk.get(key) or [] if isinstance(v, str))
+    # Manifests may list the HTML entry and use absolute or ./-relative paths
+    return {
+        path[2:] if path.startswith("./") else path.lstrip("/") for path in files
+        if not path.lower().endswith(REVALIDATE_EXTENSIONS)
+    }
+
+
+def classify(name: str, hashed_files=()):
+    """IMMUTABLE, REVALIDATE or SHORT for a file of the build output"""
+    base = posixpath.basename(name).lower()
+    if base in REVALIDATE_NAMES or base.endswith(REVALIDATE_EXTENSIONS):
+        return REVALIDATE
+    if name in hashed_files or has_hashed_name(name):
+        return IMMUTABLE
+    return SHORT
+
+
+def cache_control_for(name: str, hashed_files=()):
+    return CACHE_CONTROL[classify(name, hashed_files)]
@@ -0,0 +1,133 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+from app.metrics import (
+    docker_requests, docker_request_seconds, s3_requests, s3_request_seconds, client_init_seconds
+)
+from app.log import get_logger
+
+load_dotenv()
+
+
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+# Any S3-compatible endpoint (MinIO, the benchmark stub, ...); unset means AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+# Seconds before creating the Docker client is retried after the daemon could not be reached
+DOCKER_RETRY_SECONDS = float(os.getenv("DOCKER_RETRY_SECONDS", "10"))
+DOCKER_CLIENT_TIMEOUT = float(os.getenv("DOCKER_CLIENT_TIMEOUT", "60"))
+
+log = get_logger("clients")
+
+# docker and boto3 are imported on first use: together they are most of the API's import time.
+# Each client has its own lock, so an unreachable Docker daemon never holds up S3
+_docker_lock = threading.Lock()
+_s3_lock = threading.Lock()
+_docker_client = None
+_docker_error = None
+_docker_failed_at = None
+_s3_client = None
+
+
+def docker_operation_label(request):
+    """Low-cardinality label such as 'POST /containers/{id}/wait' for a Docker API request"""
+    parts = [p for p in urlparse(request.url).path.split("/") if p]
+    if parts and re.match(r"v\d+(\.\d+)?$", parts[0]):
+        parts = parts[1:]
+    if len(parts) >= 2 and parts[0] in ("containers", "images", "exec", "networks", "volumes") \
+            and parts[1] not in ("create", "json", "prune", "load", "search"):
+        parts[1] = "{id}"
+    return f"{request.method} /{'/'.join(parts)}"
+
+def record_docker_response(response, *args, **kwargs):
+    operation = docker_operation_label(response.request)
+    docker_request_seconds.observe(response.elapsed.total_seconds(), operation=operation)
+    docker_requests.inc(operation=operation, outcome="ok" if response.status_code < 400 else "error")
+
+def record_s3_call_start(context, **kwargs):
+    context["hoster_started_at"] = time.perf_counter()
+
+def record_s3_call(http_response, model, context, **kwargs):
+    started_at = context.get("hoster_started_at")
+    if started_at is not None:
+        s3_request_seconds.observe(time.perf_counter() - started_at, operation=model.name)
+    outcome = "ok" if http_response is not None and http_response.status_code < 400 else "error"
+    s3_requests.inc(operation=model.name, outcome=outcome)
+
+
+def get_docker_client():
+    """Shared, instrumented Docker client, created on first use; None while the daemon is unreachable.
+
+    Creating the client talks to the daemon, so call this off the event loop (see docker_client_async)
+    until it has succeeded once.
+    """
+    global _docker_client, _docker_error, _docker_failed_at
+    if _docker_client is not None:
+        return _docker_client
+    with _docker_lock:
+        if _docker_client is not None:
+            return _docker_client
+        if _docker_failed_at is not None and time.monotonic() - _docker_failed_at < DOCKER_RETRY_SECONDS:
+            return None
+        started_at = time.perf_counter()
+        try:
+            import docker
+            client = docker.from_env(timeout=DOCKER_CLIENT_TIMEOUT)
+            client.api.hooks["response"].append(record_docker_response)
+        except Exception as e:
+            _docker_error, _docker_failed_at = str(e), time.monotonic()
+            log.warning("Docker not available", error=str(e))
+            return None
+        finally:
+            client_init_seconds.set(round(time.perf_counter() - started_at, 4), client="docker")
+        _docker_client, _docker_error, _docker_failed_at = client, None, None
+        log.info("Docker client initialized", duration_ms=round((time.perf_counter() - started_at) * 1000, 1))
+        return client
+
+async def docker_client_async():
+    """get_docker_client without blocking the event loop on the first connection"""
+    if _docker_client is not None:
+        return _docker_client
+    return await asyncio.to_thread(get_docker_client)
+
+def docker_status():
+    """(initialized, last error) without trying to connect"""
+    return _docker_client is not None, _docker_error
+
+def set_docker_client(client):
+    """Use client instead of connecting to the local daemon (benchmarks, tests)"""
+    global _docker_client, _docker_error, _docker_failed_at
+    with _docker_lock:
+        _docker_client, _docker_error, _docker_failed_at = client, None, None
+
+
+def get_s3_client():
+    """Shared, instrumented S3 client (boto3 clients are thread-safe)"""
+    global _s3_client
+    if _s3_client is not None:
+        return _s3_client
+    with _s3_lock:
+        if _s3_client is None:
+            started_at = time.perf_counter()
+            import boto3
+            from botocore.config import Config as BotoConfig
+            client = boto3.client(
+                "s3",
+                aws_access_key_id=AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                region_name=AWS_REGION,
+                endpoint_url=S3_ENDPOINT_URL,
+                config=BotoConfig(s3={"addressing_style": "path"}) if S3_ENDPOINT_URL else None,
+            )
+            client.meta.events.register("before-call.s3", record_s3_call_start)
+            client.meta.events.register("after-call.s3", record_s3_call)
+            _s3_client = client
+            client_init_seconds.set(round(time.perf_counter() - started_at, 4), client="s3")
+            log.info("S3 client initialized", duration_ms=round((time.perf_counter() - started_at) * 1000, 1))
+    return _s3_client
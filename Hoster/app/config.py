@@ -10,6 +10,6 @@ oauth.register(
     client_secret=config('GITHUB_CLIENT_SECRET'),
     access_token_url='https://github.com/login/oauth/access_token',
     authorize_url='https://github.com/login/oauth/authorize',
-    api_base_url='https://api.github.com/',
+    api_base_url=config('GITHUB_API_URL', default='https://api.github.com').rstrip('/') + '/',
     client_kwargs={'scope': 'repo'}
 )
\ No newline at end of file
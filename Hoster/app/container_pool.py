@@ -0,0 +1,293 @@
+import io
+import os
+import time
+import shlex
+import socket
+import tarfile
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+from app.clients import get_docker_client
+from app.metrics import registry, pool_acquisitions, pool_start_seconds
+from app.log import get_logger
+
+load_dotenv()
+
+
+# Idle containers kept ready per kind; 0 turns pre-warming off (containers are still started the same way)
+CONTAINER_POOL_SIZE = int(os.getenv("CONTAINER_POOL_SIZE", "2"))
+CONTAINER_POOL_BACKEND_SIZE = int(os.getenv("CONTAINER_POOL_BACKEND_SIZE", "1"))
+# Pull images at startup and create containers from the digest the tag pointed to then
+CONTAINER_POOL_PULL = os.getenv("CONTAINER_POOL_PULL", "true").lower() in ("1", "true", "yes")
+CONTAINER_POOL_RETRY_SECONDS = float(os.getenv("CONTAINER_POOL_RETRY_SECONDS", "10"))
+POOL_LABEL = "hoster.pool"
+OWNER_LABEL = "hoster.pool.owner"
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+RUN_DIR = "hoster"
+
+# Idle containers sleep until their job arrives. "ready" is copied in after run.sh, so once it exists the script is
+# complete; run() then sends WAKE_SIGNAL, which cuts the sleep short. The slow poll only covers a lost signal.
+WAKE_SIGNAL = "SIGUSR1"
+WAIT_POLL_SECONDS = 2
+WAIT_COMMAND = ["sh", "-c", (
+    "trap 'kill $sleeper 2>/dev/null' USR1; "
+    f"while [ ! -f /{RUN_DIR}/ready ]; do sleep {WAIT_POLL_SECONDS} & sleeper=$!; wait $sleeper; done; "
+    f"exec sh /{RUN_DIR}/run.sh"
+)]
+
+log = get_logger("container_pool")
+
+
+def job_archive(script: str, env=None):
+    """Tar placing run.sh, then the ready marker, under /hoster"""
+    exports = "".join(f"export {name}={shlex.quote(str(value))}\n" for name, value in (env or {}).items())
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, data in ((f"{RUN_DIR}/run.sh", (exports + script).encode("utf-8")), (f"{RUN_DIR}/ready", b"")):
+            info = tarfile.TarInfo(name)
+            info.size, info.mode, info.mtime = len(data), 0o755, time.time()
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def directory_tar(path: str, arcname: str):
+    """Tar of a directory on disk placed at arcname"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        tar.add(path, arcname=arcname)
+    return buffer.getvalue()
+
+
+class Lease:
+    """A started container handed out by the pool, waiting for its job"""
+
+    def __init__(self, kind: str, container, meta: dict, hit: bool, requested_at: float):
+        self.kind = kind
+        self.container = container
+        self.meta = meta
+        self.hit = hit
+        self.requested_at = requested_at
+
+    @property
+    def result(self):
+        return "hit" if self.hit else "miss"
+
+
+class ContainerPool:
+    """Idle, already started containers per kind, ready to take a source tarball and a script.
+
+    A kind is an image plus the options its containers are created with;
+    options() returns (create kwargs, meta) and may allocate per-container
+    resources such as a host port. Containers are used once: after the job
+    they are discarded, and replacements are created in the background.
+    """
+
+    def __init__(self):
+        self._kinds = {}
+        self._idle = {}
+        self._pinned = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._stats = {}
+
+    def register(self, kind: str, image: str, size: int, options):
+        self._kinds[kind] = {"image": image, "size": max(0, size), "options": options}
+        self._idle.setdefault(kind, deque())
+        self._stats.setdefault(kind, {"hits": 0, "misses": 0, "created": 0, "discarded": 0, "failed": 0})
+
+    def resize(self, kind: str, size: int):
+        self._kinds[kind]["size"] = max(0, size)
+        self._wakeup.set()
+
+    def image_ref(self, kind: str):
+        image = self._kinds[kind]["image"]
+        return self._pinned.get(image) or image
+
+    def _pin(self, client, image: str):
+        """Pull image and remember the digest it resolved to, so later tag moves do not change running pools"""
+        try:
+            found = client.images.pull(image) if CONTAINER_POOL_PULL else client.images.get(image)
+        except Exception as e:
+            log.warning("Could not pull image", image=image, error=str(e))
+            try:
+                found = client.images.get(image)
+            except Exception:
+                # Not retried; containers are created from the tag
+                self._pinned[image] = None
+                return
+        digests = found.attrs.get("RepoDigests") or []
+        self._pinned[image] = digests[0] if digests else found.id
+        log.info("Pinned image", image=image, ref=self._pinned[image])
+
+    def _create(self, kind: str, **extra):
+        client = get_docker_client()
+        if client is None:
+            raise RuntimeError("Docker not available")
+        spec = self._kinds[kind]
+        kwargs, meta = spec["options"]()
+        kwargs.update(extra)
+        kwargs.setdefault("labels", {}).update({POOL_LABEL: kind, OWNER_LABEL: OWNER})
+        container = client.containers.create(self.image_ref(kind), command=WAIT_COMMAND, **kwargs)
+        try:
+            container.start()
+        except Exception:
+            container.remove(force=True)
+            raise
+        with self._lock:
+            self._stats[kind]["created"] += 1
+        return container, meta
+
+    def acquire(self, kind: str, **extra):
+        """A started container of kind: an idle one when available, else a new one.
+
+        Extra create kwargs (e.g. bind mounts) cannot be applied to idle containers and always create a new one.
+        """
+        requested_at = time.perf_counter()
+        while not extra:
+            with self._lock:
+                if not self._idle[kind]:
+                    break
+                container, meta = self._idle[kind].popleft()
+            self._wakeup.set()
+            try:
+                container.reload()
+                if container.status == "running":
+                    pool_acquisitions.inc(kind=kind, result="hit")
+                    with self._lock:
+                        self._stats[kind]["hits"] += 1
+                    return Lease(kind, container, meta, True, requested_at)
+            except Exception:
+                pass
+            self.discard(container, kind)
+        container, meta = self._create(kind, **extra)
+        pool_acquisitions.inc(kind=kind, result="miss")
+        with self._lock:
+            self._stats[kind]["misses"] += 1
+        return Lease(kind, container, meta, False, requested_at)
+
+    def run(self, lease: Lease, script: str, env=None, source_tar: bytes = None):
+        """Copy the source (a tar extracted at /) and then the script into the container, which starts it"""
+        if source_tar is not None and not lease.container.put_archive("/", source_tar):
+            raise RuntimeError("Could not copy the source into the container")
+        if not lease.container.put_archive("/", job_archive(script, env)):
+            raise RuntimeError("Could not copy the job script into the container")
+        try:
+            lease.container.kill(signal=WAKE_SIGNAL)
+        except Exception:
+            # The container finds the job at its next poll
+            pass
+        pool_start_seconds.observe(time.perf_counter() - lease.requested_at, kind=lease.kind, result=lease.result)
+
+    def discard(self, container, kind: str = None):
+        """Remove a used or broken container in the background"""
+        def remove():
+            try:
+                container.remove(force=True)
+            except Exception:
+                pass
+        if kind in self._stats:
+            with self._lock:
+                self._stats[kind]["discarded"] += 1
+        threading.Thread(target=remove, daemon=True).start()
+
+    def _fill(self):
+        client = get_docker_client()
+        if client is None:
+            return False
+        for image in {spec["image"] for spec in self._kinds.values()} - set(self._pinned):
+            self._pin(client, image)
+        for kind, spec in self._kinds.items():
+            while not self._stopping and len(self._idle[kind]) < spec["size"]:
+                try:
+                    entry = self._create(kind)
+                except Exception as e:
+                    with self._lock:
+                        self._stats[kind]["failed"] += 1
+                    log.warning("Could not pre-create container", kind=kind, error=str(e))
+                    return False
+                with self._lock:
+                    self._idle[kind].append(entry)
+        return True
+
+    def remove_orphans(self):
+        """Remove pool containers, idle or in use, left behind by processes on this host that are gone.
+
+        Nothing can stop them through the API anymore. Returns how many were removed.
+        """
+        client = get_docker_client()
+        if client is None:
+            return 0
+        host = socket.gethostname()
+        removed = 0
+        try:
+            for container in client.containers.list(all=True, filters={"label": POOL_LABEL}):
+                owner_host, _, pid = (container.labels.get(OWNER_LABEL) or "").partition(":")
+                if owner_host != host or not pid.isdigit() or pid == str(os.getpid()):
+                    continue
+                try:
+                    os.kill(int(pid), 0)
+                    continue
+                except ProcessLookupError:
+                    pass
+                except PermissionError:
+                    continue
+                container.remove(force=True)
+                removed += 1
+        except Exception as e:
+            log.warning("Could not remove leftover pool containers", error=str(e))
+        return removed
+
+    def _loop(self):
+        self.remove_orphans()
+        while not self._stopping:
+            filled = self._fill()
+            self._wakeup.wait(None if filled else CONTAINER_POOL_RETRY_SECONDS)
+            self._wakeup.clear()
+
+    def start(self):
+        """Pull, pin and pre-create in a background thread; returns immediately"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="container-pool", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        with self._lock:
+            idle = [container for entries in self._idle.values() for container, _ in entries]
+            for entries in self._idle.values():
+                entries.clear()
+        for container in idle:
+            try:
+                container.remove(force=True)
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock:
+            kinds = {}
+            for kind, spec in self._kinds.items():
+                stats = dict(self._stats[kind])
+                total = stats["hits"] + stats["misses"]
+                kinds[kind] = {
+                    "image": spec["image"],
+                    "pinned": self._pinned.get(spec["image"]),
+                    "size": spec["size"],
+                    "idle": len(self._idle[kind]),
+                    "hit_rate": round(stats["hits"] / total, 3) if total else None,
+                    **stats,
+                }
+        return {"kinds": kinds}
+
+
+container_pool = ContainerPool()
+
+registry.gauge(
+    "hoster_pool_idle",
+    "Idle pre-started containers per pool kind",
+    ("kind",),
+    callback=lambda: {(kind,): stats["idle"] for kind, stats in container_pool.stats()["kinds"].items()},
+)
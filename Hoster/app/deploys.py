@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import time
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from app.artifacts import content_type_for, S3_UPLOAD_CONCURRENCY
+from app.cache_policy import CACHE_CONTROL, REVALIDATE
+from app.log import get_logger
+
+load_dotenv()
+
+
+# Versions kept per deploy target besides the live one; older ones are deleted after each deploy
+DEPLOY_RETAIN_VERSIONS = int(os.getenv("DEPLOY_RETAIN_VERSIONS", "5"))
+VERSIONS_DIR = "_v"
+# Copies of the entry points as they must appear at the live prefix, kept inside each version
+POINTER_DIR = "_pointer"
+VERSION_META = "_version.json"
+LIVE_MANIFEST = "_live.json"
+# Fetched by crawlers at fixed URLs, so they are served from the live prefix like the HTML documents
+ROOT_NAMES = ("robots.txt", "sitemap.xml")
+
+log = get_logger("deploys")
+
+BASE_TAG = re.compile(rb"<base[\s>]", re.IGNORECASE)
+URL_ATTR = re.compile(rb"""(\s(?:src|href|poster|srcset)\s*=\s*)(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+URL_SCHEME = re.compile(rb"^[a-z][a-z0-9+.-]*:", re.IGNORECASE)
+
+
+def new_version(sha: str):
+    """Sortable, unique version id: UTC time of the deploy plus the commit"""
+    return f"{time.strftime('%Y%m%d%H%M%S', time.gmtime())}-{(sha or 'local')[:12]}"
+
+
+def version_prefix(s3_prefix: str, version: str):
+    return f"{s3_prefix}/{VERSIONS_DIR}/{version}"
+
+
+def versioned_url(url: bytes, base_path: bytes, entry_names):
+    """url pointed into the version directory when it is relative and names one of the version's files.
+
+    Fragments, absolute URLs, directories and the entry points themselves stay at the live prefix.
+    """
+    url = url.strip()
+    if not url or url.startswith((b"/", b"#", b"?", b"..")) or URL_SCHEME.match(url):
+        return url
+    if url.startswith(b"./"):
+        url = url[2:]
+    path = url.split(b"#", 1)[0].split(b"?", 1)[0]
+    if not path or path.endswith(b"/") or path.decode("utf-8", errors="replace") in entry_names:
+        return url
+    return base_path + url
+
+
+def pointer_html(html: bytes, base_path: str, entry_names=()):
+    """The entry HTML served from the live prefix, with relative asset URLs rewritten into the version directory.
+
+    Only src, href, poster and srcset attributes are rewritten; URLs built by scripts or in inline styles
+    resolve against the live prefix, which holds a copy of the live version's files. A document with its
+    own <base> is left as it is.
+    """
+    if BASE_TAG.search(html):
+        return html
+    base = base_path.encode("utf-8")
+    entry_names = set(entry_names)
+
+    def rewrite(match):
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        quote = b'"' if match.group(2) is not None else b"'"
+        if match.group(1).strip().lower().startswith(b"srcset"):
+            candidates = []
+            for candidate in value.split(b","):
+                url, _, descriptor = candidate.strip().partition(b" ")
+                candidates.append(b" ".join(filter(None, [versioned_url(url, base, entry_names), descriptor.strip()])))
+            value = b", ".join(candidates)
+        else:
+            value = versioned_url(value, base, entry_names)
+        return match.group(1) + quote + value + quote
+
+    return URL_ATTR.sub(rewrite, html)
+
+
+def entry_points(local_folder: str):
+    """{name: (bytes, content_type)} of the files of a local build that make up the live pointer"""
+    files = {}
+    for name in sorted(os.listdir(local_folder)):
+        path = os.path.join(local_folder, name)
+        if os.path.isfile(path) and (name.lower().endswith((".html", ".htm")) or name in ROOT_NAMES):
+            with open(path, "rb") as f:
+                files[name] = (f.read(), content_type_for(name))
+    return files
+
+
+def delete_prefix(s3, bucket: str, prefix: str):
+    """Delete every object under prefix; returns how many were deleted"""
+    deleted = 0
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        keys = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+        for start in range(0, len(keys), 1000):
+            s3.delete_objects(Bucket=bucket, Delete={"Objects": keys[start:start + 1000]})
+        deleted += len(keys)
+    return deleted
+
+
+class DeployStore:
+    """Versioned deploys under one S3 prefix.
+
+    Every deploy is uploaded to {prefix}/_v/{version}/ and never modified
+    afterwards. Going live copies the version's files to {prefix}/, then the
+    entry points (the HTML documents, robots.txt, sitemap.xml) from
+    _v/{version}/_pointer/, then writes _live.json naming the version. In
+    the HTML copies, relative URLs of the version's files point into the
+    version directory, so the assets a document names are loaded from the
+    version it belongs to. URLs that scripts build against the document find
+    the copies at {prefix}/; those of the previous version stay there for one
+    more switch, so open pages can still load their lazy chunks. Switching
+    versions, for a deploy or a rollback, is all server-side copies.
+    """
+
+    def __init__(self, s3, bucket: str, base_url: str = ""):
+        self.s3 = s3
+        self.bucket = bucket
+        self.base_path = urlparse(base_url or "/").path or "/"
+        if not self.base_path.endswith("/"):
+            self.base_path += "/"
+
+    def _get_json(self, key: str):
+        try:
+            return json.loads(self.s3.get_object(Bucket=self.bucket, Key=key)["Body"].read())
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    def _put_json(self, key: str, data: dict):
+        self.s3.put_object(
+            Bucket=self.bucket, Key=key, Body=json.dumps(data, indent=2).encode("utf-8"),
+            ContentType="application/json", CacheControl=CACHE_CONTROL[REVALIDATE]
+        )
+
+    def version_files(self, target: str):
+        """Names of the build files stored under a version prefix, without the pointers and metadata"""
+        names = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{target}/"):
+            for item in page.get("Contents", []):
+                name = item["Key"][len(target) + 1:]
+                if name != VERSION_META and not name.startswith(f"{POINTER_DIR}/"):
+                    names.append(name)
+        return names
+
+    def _copy(self, pairs):
+        """Server-side copies of (source key, destination key) pairs, S3_UPLOAD_CONCURRENCY at a time"""
+        def copy(pair):
+            self.s3.copy_object(
+                Bucket=self.bucket, Key=pair[1],
+                CopySource={"Bucket": self.bucket, "Key": pair[0]}, MetadataDirective="COPY"
+            )
+        with ThreadPoolExecutor(max_workers=S3_UPLOAD_CONCURRENCY, thread_name_prefix="s3-copy") as pool:
+            list(pool.map(copy, pairs))
+
+    def publish(self, s3_prefix: str, version: str, entry_points, meta: dict):
+        """Store the pointers and metadata of an uploaded version, then make it live.
+
+        entry_points maps names to (bytes, content_type); the version's own files must already be uploaded.
+        """
+        target = version_prefix(s3_prefix, version)
+        base_path = f"{self.base_path}{target}/"
+        for name, (data, content_type) in entry_points.items():
+            if content_type == "text/html":
+                data = pointer_html(data, base_path, entry_points)
+            self.s3.put_object(
+                Bucket=self.bucket, Key=f"{target}/{POINTER_DIR}/{name}", Body=data,
+                ContentType=content_type, CacheControl=CACHE_CONTROL[REVALIDATE]
+            )
+        self._put_json(f"{target}/{VERSION_META}", {
+            **meta, "version": version, "entry_points": sorted(entry_points), "created_at": time.time()
+        })
+        live = self.switch(s3_prefix, version)
+        self.prune(s3_prefix)
+        return live
+
+    def switch(self, s3_prefix: str, version: str):
+        """Point the live prefix at a stored version; returns the new live manifest"""
+        target = version_prefix(s3_prefix, version)
+        meta = self._get_json(f"{target}/{VERSION_META}")
+        if meta is None:
+            raise KeyError(version)
+        previous = self.live(s3_prefix) or {}
+        names = set(meta.get("entry_points", []))
+        files = sorted(set(self.version_files(target)) - names)
+        # The files first, so the new HTML never goes live before what its scripts load
+        self._copy([(f"{target}/{name}", f"{s3_prefix}/{name}") for name in files])
+        self._copy([(f"{target}/{POINTER_DIR}/{name}", f"{s3_prefix}/{name}") for name in sorted(names)])
+        # Entry points the previous version had and this one lacks would keep serving the old version
+        for name in set(previous.get("entry_points", [])) - names:
+            self.s3.delete_object(Bucket=self.bucket, Key=f"{s3_prefix}/{name}")
+        # Files of the version before the previous one are no longer loaded by any open page
+        kept = set(previous.get("files", [])) - set(files)
+        stale = set(previous.get("kept_files", [])) - set(files) - kept
+        for start in range(0, len(stale), 1000):
+            keys = [{"Key": f"{s3_prefix}/{name}"} for name in sorted(stale)[start:start + 1000]]
+            self.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": keys})
+        live = {
+            "version": version,
+            "commit_sha": meta.get("commit_sha"),
+            "digest": meta.get("digest"),
+            "cache_key": meta.get("cache_key"),
+            "entry_points": meta.get("entry_points", []),
+            "files": files,
+            "kept_files": sorted(kept),
+            "root": f"{target}/",
+            "switched_at": time.time(),
+            "previous_version": previous.get("version"),
+        }
+        self._put_json(f"{s3_prefix}/{LIVE_MANIFEST}", live)
+        log.info("Deploy switched", s3_prefix=s3_prefix, version=version, previous=live["previous_version"])
+        return live
+
+    def live(self, s3_prefix: str):
+        return self._get_json(f"{s3_prefix}/{LIVE_MANIFEST}")
+
+    def versions(self, s3_prefix: str):
+        """Stored versions, newest first, with their metadata"""
+        names = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{s3_prefix}/{VERSIONS_DIR}/", Delimiter="/"):
+            names += [p["Prefix"].rstrip("/").rsplit("/", 1)[-1] for p in page.get("CommonPrefixes", [])]
+        versions = []
+        for name in sorted(names, reverse=True):
+            meta = self._get_json(f"{version_prefix(s3_prefix, name)}/{VERSION_META}")
+            # Without metadata the upload never completed; such a version cannot go live
+            versions.append({**(meta or {}), "version": name, "complete": meta is not None})
+        return versions
+
+    def prune(self, s3_prefix: str, keep: int = None):
+        """Delete versions beyond the newest keep (never the live one); returns the deleted version ids"""
+        keep = DEPLOY_RETAIN_VERSIONS if keep is None else keep
+        live_version = (self.live(s3_prefix) or {}).get("version")
+        stale = [v["version"] for v in self.versions(s3_prefix)[keep:] if v["version"] != live_version]
+        for version in stale:
+            delete_prefix(self.s3, self.bucket, f"{version_prefix(s3_prefix, version)}/")
+        if stale:
+            log.info("Pruned deploy versions", s3_prefix=s3_prefix, versions=stale)
+        return stale
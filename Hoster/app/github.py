@@ -0,0 +1,519 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from dotenv import load_dotenv
+
+from app.metrics import github_requests, github_request_seconds, github_endpoint_label, github_cache_responses
+
+load_dotenv()
+
+
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GITHUB_MAX_CONNECTIONS = int(os.getenv("GITHUB_MAX_CONNECTIONS", "50"))
+REPOS_CACHE_TTL = float(os.getenv("REPOS_CACHE_TTL", "60"))
+REPOS_CACHE_MAX_STALE = float(os.getenv("REPOS_CACHE_MAX_STALE", "3600"))
+REPOS_CACHE_MAX_USERS = int(os.getenv("REPOS_CACHE_MAX_USERS", "1000"))
+REPOS_MAX_PAGES = int(os.getenv("REPOS_MAX_PAGES", "50"))
+REPOS_PAGE_CONCURRENCY = int(os.getenv("REPOS_PAGE_CONCURRENCY", "8"))
+REPOS_PER_PAGE = 100
+# Pacing: short bursts are free, sustained use is spread over the rest of the rate-limit window
+GITHUB_BURST = float(os.getenv("GITHUB_BURST", "200"))
+GITHUB_QUOTA_RESERVE = int(os.getenv("GITHUB_QUOTA_RESERVE", "100"))
+# Sustained rate allows spending what is left in 1/factor of the remaining window;
+# since the rate shrinks with the quota, the reserve is never reached before the reset
+GITHUB_PACING_FACTOR = float(os.getenv("GITHUB_PACING_FACTOR", "4"))
+# Below this many remaining calls, cached responses are served without revalidating
+GITHUB_LOW_QUOTA = int(os.getenv("GITHUB_LOW_QUOTA", "500"))
+GITHUB_LOW_QUOTA_MAX_STALE = float(os.getenv("GITHUB_LOW_QUOTA_MAX_STALE", "1800"))
+# Longest a request may be held back before failing with 429 instead. Blocking
+# (requests) calls sleep in the worker thread they run in, so they get a shorter leash.
+GITHUB_MAX_WAIT = float(os.getenv("GITHUB_MAX_WAIT", "5"))
+GITHUB_SYNC_MAX_WAIT = float(os.getenv("GITHUB_SYNC_MAX_WAIT", "1"))
+GITHUB_SECONDARY_BACKOFF = float(os.getenv("GITHUB_SECONDARY_BACKOFF", "60"))
+GITHUB_ETAG_CACHE_SIZE = int(os.getenv("GITHUB_ETAG_CACHE_SIZE", "5000"))
+GITHUB_ETAG_CACHE_MAX_BYTES = int(os.getenv("GITHUB_ETAG_CACHE_MAX_BYTES", str(512 * 1024)))
+
+
+class GitHubError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class GitHubRateLimited(GitHubError):
+    def __init__(self, retry_after: float, message: str = None):
+        retry_after = max(int(retry_after + 0.999), 1)
+        super().__init__(429, message or f"GitHub rate limit reached, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def token_key(token):
+    """Stable, non-reversible identifier of a token for per-user bookkeeping"""
+    return hashlib.sha256(access_token_of(token).encode("utf-8")).hexdigest()[:32]
+
+
+def token_key_from_headers(headers):
+    authorization = (headers or {}).get("Authorization") or ""
+    _, _, token = authorization.partition(" ")
+    return token_key(token) if token else None
+
+
+def is_rate_limited(status_code: int, headers, body_text: str = ""):
+    if status_code == 429:
+        return True
+    if status_code != 403:
+        return False
+    return (
+        headers.get("x-ratelimit-remaining") == "0"
+        or "retry-after" in headers
+        or "rate limit" in body_text.lower()
+    )
+
+
+class TokenQuota:
+    """What GitHub told us about one token's quota, plus a token bucket pacing its use"""
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.resource = None
+        self.updated_at = None
+        self.blocked_until = 0.0
+        self.secondary_hits = 0
+        self.tokens = GITHUB_BURST
+        self.refilled_at = time.monotonic()
+        self.waited_seconds = 0.0
+        self.rejected = 0
+
+    def refill_rate(self):
+        """Sustained calls per second allowed for this token"""
+        if self.remaining is None or self.reset_at is None:
+            return GITHUB_PACING_FACTOR * 5000 / 3600
+        window = max(self.reset_at - time.time(), 1.0)
+        return GITHUB_PACING_FACTOR * max(self.remaining - GITHUB_QUOTA_RESERVE, 0) / window
+
+    def low(self):
+        return self.remaining is not None and self.remaining <= GITHUB_LOW_QUOTA
+
+    def to_dict(self):
+        now = time.time()
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "resource": self.resource,
+            "reset_at": self.reset_at,
+            "reset_in_seconds": round(max(self.reset_at - now, 0), 1) if self.reset_at else None,
+            "low_quota": self.low(),
+            "blocked_for_seconds": round(max(self.blocked_until - now, 0), 1),
+            "secondary_limit_hits": self.secondary_hits,
+            "pacing_tokens": round(self.tokens, 2),
+            "pacing_rate_per_second": round(self.refill_rate(), 3),
+            "total_wait_seconds": round(self.waited_seconds, 3),
+            "rejected": self.rejected,
+            "updated_at": self.updated_at,
+        }
+
+
+class RateLimitScheduler:
+    """Per-token quota tracking and pacing for every call made to the GitHub API"""
+
+    def __init__(self, max_tokens: int = 10000):
+        self.max_tokens = max_tokens
+        self._quotas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _quota(self, key):
+        quota = self._quotas.get(key)
+        if quota is None:
+            quota = self._quotas[key] = TokenQuota()
+            while len(self._quotas) > self.max_tokens:
+                self._quotas.popitem(last=False)
+        self._quotas.move_to_end(key)
+        return quota
+
+    def reserve(self, key, max_wait: float = GITHUB_MAX_WAIT):
+        """Take one call from the bucket; returns the seconds to wait before making it"""
+        if key is None:
+            return 0.0
+        now = time.time()
+        with self._lock:
+            quota = self._quota(key)
+            if quota.blocked_until > now:
+                delay = quota.blocked_until - now
+            else:
+                monotonic = time.monotonic()
+                quota.tokens = min(GITHUB_BURST, quota.tokens + (monotonic - quota.refilled_at) * quota.refill_rate())
+                quota.refilled_at = monotonic
+                if quota.tokens >= 1:
+                    quota.tokens -= 1
+                    return 0.0
+                rate = quota.refill_rate()
+                delay = (1 - quota.tokens) / rate if rate > 0 else float("inf")
+                if quota.reset_at:
+                    delay = min(delay, max(quota.reset_at - now, 0) + 1)
+            if delay > max_wait:
+                quota.rejected += 1
+                raise GitHubRateLimited(delay)
+            quota.tokens -= 1
+            quota.waited_seconds += delay
+            return delay
+
+    def update(self, key, status_code: int, headers, body_text: str = ""):
+        """Record quota headers from a response; raises GitHubRateLimited when the call was throttled"""
+        if key is None:
+            return
+        headers = {k.lower(): v for k, v in headers.items()}
+        with self._lock:
+            quota = self._quota(key)
+            if "x-ratelimit-remaining" in headers:
+                try:
+                    quota.limit = int(headers.get("x-ratelimit-limit", quota.limit or 0))
+                    quota.remaining = int(headers["x-ratelimit-remaining"])
+                    quota.reset_at = float(headers.get("x-ratelimit-reset", quota.reset_at or 0)) or None
+                    quota.resource = headers.get("x-ratelimit-resource", quota.resource)
+                    quota.updated_at = time.time()
+                except ValueError:
+                    pass
+            if not is_rate_limited(status_code, headers, body_text):
+                return
+            if "retry-after" in headers:
+                try:
+                    delay = float(headers["retry-after"])
+                except ValueError:
+                    delay = GITHUB_SECONDARY_BACKOFF
+            elif quota.remaining == 0 and quota.reset_at:
+                delay = max(quota.reset_at - time.time(), 1)
+            else:
+                # Secondary limit without a hint: back off exponentially
+                quota.secondary_hits += 1
+                delay = GITHUB_SECONDARY_BACKOFF * 2 ** min(quota.secondary_hits - 1, 4)
+            quota.blocked_until = max(quota.blocked_until, time.time() + delay)
+            quota.tokens = 0
+        raise GitHubRateLimited(delay)
+
+    def is_low(self, key):
+        with self._lock:
+            quota = self._quotas.get(key)
+            return bool(quota and (quota.low() or quota.blocked_until > time.time()))
+
+    def state(self, key):
+        with self._lock:
+            quota = self._quotas.get(key)
+            return quota.to_dict() if quota else None
+
+
+rate_limiter = RateLimitScheduler()
+
+
+class ConditionalCache:
+    """Last 200 response per (token, URL) with its ETag, for conditional requests.
+
+    GitHub does not count 304 Not Modified answers against the rate limit.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, response):
+        etag = response.headers.get("ETag")
+        if not etag or len(response.content) > GITHUB_ETAG_CACHE_MAX_BYTES:
+            return
+        with self._lock:
+            self._entries[key] = {
+                "etag": etag,
+                "content": response.content,
+                "headers": dict(response.headers),
+                "encoding": response.encoding,
+                "stored_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _response_from_cache(entry, request_url, request=None):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = entry["content"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.encoding = entry["encoding"]
+    response.url = request_url
+    response.request = request
+    return response
+
+
+class GitHubSession(requests.Session):
+    """requests.Session that paces calls per token, revalidates with ETags and
+    falls back to cached bodies when the token's quota runs low.
+
+    Calls block, pacing included; async code runs them through asyncio.to_thread.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.conditional_cache = ConditionalCache(GITHUB_ETAG_CACHE_SIZE)
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        headers = dict(headers or {})
+        key = token_key_from_headers(headers)
+        cache_key = None
+        cached = None
+        if method.upper() == "GET" and key:
+            prepared_url = requests.Request("GET", url, params=params).prepare().url
+            cache_key = (key, prepared_url, headers.get("Accept", ""))
+            cached = self.conditional_cache.get(cache_key)
+            if cached and rate_limiter.is_low(key) and time.time() - cached["stored_at"] < GITHUB_LOW_QUOTA_MAX_STALE:
+                github_cache_responses.inc(result="served_stale")
+                return _response_from_cache(cached, prepared_url)
+            if cached:
+                headers["If-None-Match"] = cached["etag"]
+
+        delay = rate_limiter.reserve(key, GITHUB_SYNC_MAX_WAIT)
+        if delay:
+            time.sleep(delay)
+        response = super().request(method, url, params=params, headers=headers, **kwargs)
+        body_text = response.text[:500] if response.status_code in (403, 429) else ""
+        try:
+            rate_limiter.update(key, response.status_code, response.headers, body_text)
+        except GitHubRateLimited:
+            if cached:
+                github_cache_responses.inc(result="served_stale")
+                return _response_from_cache(cached, response.url, response.request)
+            raise
+
+        if cache_key:
+            if response.status_code == 304 and cached:
+                github_cache_responses.inc(result="not_modified")
+                return _response_from_cache(cached, response.url, response.request)
+            if response.status_code == 200:
+                self.conditional_cache.put(cache_key, response)
+        return response
+
+
+def _record(url, status_code, elapsed):
+    endpoint = github_endpoint_label(urlparse(str(url)).path)
+    github_requests.inc(endpoint=endpoint, status=status_code)
+    github_request_seconds.observe(elapsed, endpoint=endpoint, status=status_code)
+
+
+def _record_sync_response(response, *args, **kwargs):
+    _record(response.request.url, response.status_code, response.elapsed.total_seconds())
+
+
+async def _mark_request_start(request):
+    request.extensions["hoster_started_at"] = time.perf_counter()
+
+
+async def _record_async_response(response):
+    started_at = response.request.extensions.get("hoster_started_at")
+    if started_at is not None:
+        _record(response.request.url, response.status_code, time.perf_counter() - started_at)
+
+
+# Blocking session for the synchronous call sites, pooled and instrumented like the async client
+github_session = GitHubSession()
+github_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=GITHUB_MAX_CONNECTIONS))
+github_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=GITHUB_MAX_CONNECTIONS))
+github_session.hooks["response"].append(_record_sync_response)
+
+_client = None
+
+
+def get_client():
+    """Shared keep-alive connection pool to the GitHub API"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=GITHUB_API_URL,
+            limits=httpx.Limits(
+                max_connections=GITHUB_MAX_CONNECTIONS,
+                max_keepalive_connections=GITHUB_MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(30, connect=10),
+            headers={"Accept": "application/vnd.github+json"},
+            event_hooks={"request": [_mark_request_start], "response": [_record_async_response]},
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def access_token_of(token):
+    return token["access_token"] if isinstance(token, dict) else token
+
+
+async def github_get(token, path: str, params=None, etag=None):
+    """GET an API path with the user's token, optionally as a conditional request"""
+    headers = {"Authorization": f"token {access_token_of(token)}"}
+    if etag:
+        headers["If-None-Match"] = etag
+    key = token_key(token)
+    delay = rate_limiter.reserve(key)
+    if delay:
+        await asyncio.sleep(delay)
+    response = await get_client().get(path, params=params, headers=headers)
+    body_text = response.text[:500] if response.status_code in (403, 429) else ""
+    rate_limiter.update(key, response.status_code, response.headers, body_text)
+    return response
+
+
+async def fetch_rate_limit(token):
+    """Ask GitHub for the token's current quota; /rate_limit itself is not counted"""
+    response = await github_get(token, "/rate_limit")
+    if response.status_code != 200:
+        raise GitHubError(response.status_code, f"GitHub returned {response.status_code} for /rate_limit")
+    data = response.json()
+    core = data.get("resources", {}).get("core")
+    if core:
+        rate_limiter.update(token_key(token), 200, {
+            "X-RateLimit-Limit": str(core["limit"]),
+            "X-RateLimit-Remaining": str(core["remaining"]),
+            "X-RateLimit-Reset": str(core["reset"]),
+            "X-RateLimit-Resource": "core",
+        })
+    return data
+
+
+def last_page_from_link(link_header):
+    """Number of the rel="last" page in a GitHub Link header, if any"""
+    if not link_header:
+        return None
+    for part in link_header.split(","):
+        if 'rel="last"' in part:
+            match = re.search(r"[?&]page=(\d+)", part)
+            if match:
+                return int(match.group(1))
+    return None
+
+
+def _repo_summary(repo):
+    return {
+        "name": repo['name'],
+        "full_name": repo['full_name'],
+        "owner": repo['owner']['login'],
+        "description": repo.get('description', ''),
+        "clone_url": repo['clone_url'],
+        "updated_at": repo['updated_at'],
+        "private": repo.get('private', False),
+        "language": repo.get('language', 'Unknown')
+    }
+
+
+async def _fetch_repos_page(token, page: int, cached_page):
+    params = {"page": page, "per_page": REPOS_PER_PAGE, "sort": "updated", "type": "all"}
+    response = await github_get(token, "/user/repos", params=params, etag=cached_page and cached_page["etag"])
+    if response.status_code == 304 and cached_page:
+        return {**cached_page, "link": response.headers.get("link", cached_page.get("link"))}
+    if response.status_code != 200:
+        raise GitHubError(response.status_code, f"GitHub returned {response.status_code} listing repositories")
+    return {
+        "etag": response.headers.get("etag"),
+        "link": response.headers.get("link"),
+        "repos": [_repo_summary(repo) for repo in response.json()],
+    }
+
+
+async def fetch_all_repos(token, cached_pages=None):
+    """Fetch every page of /user/repos, revalidating previously seen pages with ETags.
+
+    Page 1 tells us the total page count through its Link header; the remaining
+    pages are then fetched concurrently.
+    """
+    cached_pages = cached_pages or {}
+    first = await _fetch_repos_page(token, 1, cached_pages.get(1))
+    last_page = min(last_page_from_link(first.get("link")) or 1, REPOS_MAX_PAGES)
+
+    semaphore = asyncio.Semaphore(REPOS_PAGE_CONCURRENCY)
+
+    async def fetch(page):
+        async with semaphore:
+            return await _fetch_repos_page(token, page, cached_pages.get(page))
+
+    rest = await asyncio.gather(*[fetch(page) for page in range(2, last_page + 1)])
+    pages = {1: first}
+    for page, data in enumerate(rest, start=2):
+        pages[page] = data
+    return pages
+
+
+class RepoListCache:
+    """Per-user repository list, served stale-while-revalidate"""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._refreshing = {}
+
+    @staticmethod
+    def _user_key(token):
+        return hashlib.sha256(access_token_of(token).encode("utf-8")).hexdigest()
+
+    async def _refresh(self, key, token):
+        entry = self._entries.get(key)
+        pages = await fetch_all_repos(token, entry and entry["pages"])
+        repos = [repo for page in sorted(pages) for repo in pages[page]["repos"]]
+        self._entries[key] = {"pages": pages, "repos": repos, "fetched_at": time.time()}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+        return self._entries[key]
+
+    def _start_refresh(self, key, token):
+        task = self._refreshing.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(self._refresh(key, token))
+            task.add_done_callback(lambda t: self._refreshing.pop(key, None) if self._refreshing.get(key) is t else None)
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._refreshing[key] = task
+        return task
+
+    async def get(self, token, force_refresh: bool = False):
+        """Return (repos, cache_info) for the token's user"""
+        key = self._user_key(token)
+        entry = self._entries.get(key)
+        age = time.time() - entry["fetched_at"] if entry else None
+
+        if entry and rate_limiter.is_low(token_key(token)):
+            # Nearly out of quota: keep serving what we have, however old
+            self._entries.move_to_end(key)
+            return entry["repos"], {"cached": True, "age_seconds": round(age, 1), "refreshing": False, "low_quota": True}
+
+        if entry and not force_refresh and age <= REPOS_CACHE_MAX_STALE:
+            self._entries.move_to_end(key)
+            refreshing = age > REPOS_CACHE_TTL
+            if refreshing:
+                self._start_refresh(key, token)
+            return entry["repos"], {"cached": True, "age_seconds": round(age, 1), "refreshing": refreshing}
+
+        entry = await asyncio.shield(self._start_refresh(key, token))
+        return entry["repos"], {"cached": False, "age_seconds": 0.0, "refreshing": False}
+
+    def invalidate(self, token):
+        self._entries.pop(self._user_key(token), None)
+
+
+repo_list_cache = RepoListCache(REPOS_CACHE_MAX_USERS)
@@ -0,0 +1,128 @@
+import os
+import time
+import shutil
+import asyncio
+from dotenv import load_dotenv
+
+from app.clients import get_docker_client, docker_status, get_s3_client
+from app.metrics import dependency_up, startup_seconds
+
+load_dotenv()
+
+
+HEALTH_PROBE_TTL = float(os.getenv("HEALTH_PROBE_TTL", "10"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))
+# Dependencies that must be up for /api/health/ready to answer 200; S3 is optional (local sites)
+READINESS_REQUIRED = [name.strip() for name in os.getenv("READINESS_REQUIRED", "docker,storage").split(",") if name.strip()]
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
+BUILDS_DIR = "./builds"
+
+OK = "ok"
+DOWN = "down"
+NOT_CONFIGURED = "not_configured"
+
+
+class NotConfigured(Exception):
+    pass
+
+
+class Probe:
+    """Dependency check run in a thread, with its result cached for ttl seconds; concurrent callers share one run"""
+
+    def __init__(self, name: str, check, ttl: float = HEALTH_PROBE_TTL, timeout: float = HEALTH_PROBE_TIMEOUT):
+        self.name = name
+        self.check = check
+        self.ttl = ttl
+        self.timeout = timeout
+        self._result = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._check = None
+
+    def _fresh(self):
+        return self._result is not None and time.monotonic() - self._checked_at < self.ttl
+
+    async def result(self, refresh: bool = False):
+        if not refresh and self._fresh():
+            return self._result
+        async with self._lock:
+            if not refresh and self._fresh():
+                return self._result
+            started_at = time.perf_counter()
+            result = {"status": OK}
+            # A check that times out keeps its thread until it returns; later runs wait on that
+            # same check instead of starting another thread next to it
+            if self._check is None or self._check.done():
+                self._check = asyncio.ensure_future(asyncio.to_thread(self.check))
+                self._check.add_done_callback(lambda task: task.cancelled() or task.exception())
+            try:
+                result.update(await asyncio.wait_for(asyncio.shield(self._check), self.timeout) or {})
+            except NotConfigured as e:
+                result = {"status": NOT_CONFIGURED, "error": str(e)}
+            except asyncio.TimeoutError:
+                result = {"status": DOWN, "error": f"No answer within {self.timeout}s"}
+            except Exception as e:
+                result = {"status": DOWN, "error": str(e)}
+            result["latency_ms"] = round((time.perf_counter() - started_at) * 1000, 1)
+            result["checked_at"] = time.time()
+            self._result, self._checked_at = result, time.monotonic()
+            dependency_up.set(1 if result["status"] == OK else 0, dependency=self.name)
+            return result
+
+
+def check_docker():
+    client = get_docker_client()
+    if client is None:
+        raise RuntimeError(docker_status()[1] or "Docker daemon not reachable")
+    client.ping()
+    return {}
+
+def check_s3():
+    if not all([AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, S3_BUCKET_NAME]):
+        raise NotConfigured("S3 credentials or bucket not set")
+    get_s3_client().head_bucket(Bucket=S3_BUCKET_NAME)
+    return {"bucket": S3_BUCKET_NAME}
+
+def check_storage():
+    os.makedirs(BUILDS_DIR, exist_ok=True)
+    if not os.access(BUILDS_DIR, os.W_OK):
+        raise RuntimeError(f"{BUILDS_DIR} is not writable")
+    return {"free_bytes": shutil.disk_usage(BUILDS_DIR).free}
+
+
+probes = {
+    "docker": Probe("docker", check_docker),
+    "s3": Probe("s3", check_s3),
+    "storage": Probe("storage", check_storage),
+}
+
+
+async def readiness(refresh: bool = False):
+    """(ready, {dependency: probe result}); every dependency is probed concurrently"""
+    results = await asyncio.gather(*(probe.result(refresh) for probe in probes.values()))
+    dependencies = dict(zip(probes, results))
+    for name, result in dependencies.items():
+        result["required"] = name in READINESS_REQUIRED
+    ready = all(dependencies[name]["status"] == OK for name in READINESS_REQUIRED if name in dependencies)
+    return ready, dependencies
+
+
+class StartupTimer:
+    """Seconds spent in each startup phase, measured from when app.main began importing"""
+
+    def __init__(self):
+        self.started_at = None
+        self.phases = {}
+
+    def begin(self, started_at: float):
+        self.started_at = started_at
+
+    def mark(self, phase: str):
+        self.phases[phase] = round(time.perf_counter() - self.started_at, 4)
+        startup_seconds.set(self.phases[phase], phase=phase)
+        return self.phases[phase]
+
+
+startup = StartupTimer()
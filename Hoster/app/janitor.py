@@ -0,0 +1,382 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+from app import buildkit
+from app.admission import admission, parse_bytes
+from app.clients import get_docker_client
+from app.container_pool import container_pool, POOL_LABEL
+from app.wheel_cache import wheel_cache, WHEEL_CACHE_MAX_BYTES
+from app.build_cache import build_cache
+from app.metrics import janitor_reclaimed_bytes, janitor_removed, janitor_pass_seconds, disk_free_bytes, disk_pressure
+from app.log import get_logger
+
+load_dotenv()
+
+
+JANITOR_ENABLED = os.getenv("JANITOR_ENABLED", "true").lower() in ("1", "true", "yes")
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "600"))
+# How often disk usage is checked between passes
+JANITOR_PRESSURE_INTERVAL = float(os.getenv("JANITOR_PRESSURE_INTERVAL", "15"))
+# Nothing newer than this is ever removed, so builds and containers in use are left alone
+JANITOR_GRACE_SECONDS = float(os.getenv("JANITOR_GRACE_SECONDS", "600"))
+# Local builds: least recently used first once over the quota, and any unused for the maximum age.
+# Only builds that S3 also serves are removed; for every other site the local build is the only copy.
+JANITOR_BUILDS_MAX_BYTES = parse_bytes(os.getenv("JANITOR_BUILDS_MAX_BYTES", "10g"))
+JANITOR_BUILDS_MAX_AGE_DAYS = float(os.getenv("JANITOR_BUILDS_MAX_AGE_DAYS", "30"))
+# Leftover temporary and staging directories of crashed builds
+JANITOR_TEMP_MAX_AGE = float(os.getenv("JANITOR_TEMP_MAX_AGE", str(6 * 3600)))
+# Exited backend and pool containers are kept this long so their logs can still be read
+JANITOR_CONTAINER_MAX_AGE = float(os.getenv("JANITOR_CONTAINER_MAX_AGE", "3600"))
+JANITOR_BUILDKIT_MAX_BYTES = parse_bytes(os.getenv("JANITOR_BUILDKIT_MAX_BYTES", "5g"))
+# Above this many bytes of images, unused images older than JANITOR_IMAGES_MIN_AGE_HOURS are removed
+# too (every unused image on the daemon, not only Hoster's). 0 only removes dangling images.
+JANITOR_IMAGES_MAX_BYTES = parse_bytes(os.getenv("JANITOR_IMAGES_MAX_BYTES", "0"))
+JANITOR_IMAGES_MIN_AGE_HOURS = float(os.getenv("JANITOR_IMAGES_MIN_AGE_HOURS", "168"))
+# New builds are paused above DISK_PAUSE_PERCENT used (or below DISK_MIN_FREE free) and resume below DISK_RESUME_PERCENT
+DISK_PAUSE_PERCENT = float(os.getenv("DISK_PAUSE_PERCENT", "90"))
+DISK_RESUME_PERCENT = float(os.getenv("DISK_RESUME_PERCENT", "85"))
+DISK_MIN_FREE = parse_bytes(os.getenv("DISK_MIN_FREE", "2g"))
+BUILDS_DIR = "./builds"
+# Serving a build refreshes its directory's mtime, which survives restarts, at most this often
+BUILD_USE_RESOLUTION = 60
+# Prefix of the temporary directories builds and backends download into
+TEMP_PREFIX = "hoster-"
+
+log = get_logger("janitor")
+
+
+def tree_size(path: str):
+    """Bytes allocated on disk below path"""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        st = entry.stat(follow_symlinks=False)
+                        total += getattr(st, "st_blocks", 0) * 512 or st.st_size
+                except OSError:
+                    continue
+    return total
+
+
+def remove_tree(path: str):
+    """Delete a directory, first moving it aside so it never appears half-deleted"""
+    doomed = os.path.join(os.path.dirname(path), f".{os.path.basename(path).lstrip('.')}.deleting-{uuid.uuid4().hex[:8]}")
+    os.rename(path, doomed)
+    shutil.rmtree(doomed, ignore_errors=True)
+
+
+def finished_at(container):
+    """When a stopped container exited, as a Unix time (0 if unknown)"""
+    value = (container.attrs.get("State") or {}).get("FinishedAt") or ""
+    try:
+        # Docker reports nanoseconds, which fromisoformat does not take
+        seconds = value.rstrip("Z").partition(".")[0]
+        return datetime.fromisoformat(seconds + "+00:00").timestamp()
+    except ValueError:
+        return 0
+
+
+class Janitor:
+    """Keeps disk usage within quotas and pauses builds before the disk fills up.
+
+    Each pass removes, in order: stale temporary and staging directories,
+    exited and orphaned containers, dangling (and with a quota, unused)
+    images, BuildKit cache and Python wheels beyond their quotas, and
+    local builds by age and least recent use. Under disk pressure a pass runs at once and keeps
+    removing local builds until usage is back below DISK_RESUME_PERCENT. A local build is only
+    removed while its deploy target serves the same build from S3.
+    """
+
+    def __init__(self, builds_dir: str = BUILDS_DIR):
+        self.builds_dir = builds_dir
+        self.pressure = False
+        self.last_pass = None
+        self._last_used = {}
+        self._docker_root = None
+        self._pass_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def mark_used(self, build_dir: str):
+        """Record that a local build was served, for least-recently-used eviction"""
+        name = os.path.basename(build_dir)
+        now = time.time()
+        if now - self._last_used.get(name, 0) < BUILD_USE_RESOLUTION:
+            return
+        self._last_used[name] = now
+        try:
+            os.utime(build_dir)
+        except OSError:
+            pass
+
+    def disk(self):
+        """Usage of each filesystem holding builds, temporary files or Docker's data"""
+        if self._docker_root is None:
+            client = get_docker_client()
+            if client is not None:
+                try:
+                    self._docker_root = client.info().get("DockerRootDir") or ""
+                except Exception:
+                    pass
+        # Docker's data directory only counts when the daemon runs on this host
+        paths = [self.builds_dir, tempfile.gettempdir(), self._docker_root]
+        seen, usage = set(), []
+        for path in paths:
+            try:
+                device = os.stat(path).st_dev
+            except (OSError, TypeError, ValueError):
+                continue
+            if device in seen:
+                continue
+            seen.add(device)
+            total, used, free = shutil.disk_usage(path)
+            usage.append({
+                "path": path, "total_bytes": total, "used_bytes": used, "free_bytes": free,
+                "used_percent": round(used / total * 100, 1) if total else 0.0,
+            })
+            disk_free_bytes.set(free, path=path)
+        return usage
+
+    def bytes_over(self, usage, percent: float, min_free: int = 0):
+        """Bytes to free so every filesystem is below percent used and has min_free free"""
+        return max([0] + [
+            max(int(d["used_bytes"] - d["total_bytes"] * percent / 100), min_free - d["free_bytes"]) for d in usage
+        ])
+
+    def check_pressure(self):
+        """Pause or resume build admission from disk usage; True when pressure just started"""
+        usage = self.disk()
+        if not self.pressure and self.bytes_over(usage, DISK_PAUSE_PERCENT, DISK_MIN_FREE) > 0:
+            self.pressure = True
+            disk_pressure.set(1)
+            fullest = max(usage, key=lambda d: d["used_percent"])
+            reason = f"Disk pressure: {fullest['path']} is {fullest['used_percent']}% full"
+            admission.pause("build", reason)
+            log.error("Disk pressure, new builds paused", **fullest)
+            return True
+        if self.pressure and self.bytes_over(usage, DISK_RESUME_PERCENT, DISK_MIN_FREE) == 0:
+            self.pressure = False
+            disk_pressure.set(0)
+            admission.resume("build")
+            log.info("Disk pressure cleared, builds resumed")
+        return False
+
+    def _reclaimed(self, report, category: str, reclaimed: int, removed: int = 1):
+        report["reclaimed_bytes"][category] = report["reclaimed_bytes"].get(category, 0) + reclaimed
+        report["removed"][category] = report["removed"].get(category, 0) + removed
+        janitor_reclaimed_bytes.inc(reclaimed, category=category)
+        janitor_removed.inc(removed, category=category)
+
+    def _prune_temp(self, report):
+        """Temporary downloads and build staging directories left behind by crashed processes"""
+        cutoff = time.time() - JANITOR_TEMP_MAX_AGE
+        candidates = []
+        temp_dir = tempfile.gettempdir()
+        for name in os.listdir(temp_dir):
+            if name.startswith(TEMP_PREFIX):
+                candidates.append(os.path.join(temp_dir, name))
+        if os.path.isdir(self.builds_dir):
+            for name in os.listdir(self.builds_dir):
+                # .{build_id}.staging-*, their .old siblings and interrupted deletions
+                if name.startswith("."):
+                    candidates.append(os.path.join(self.builds_dir, name))
+        if os.path.isdir(wheel_cache.root):
+            for name in os.listdir(wheel_cache.root):
+                # .building-* wheel sets of builds that were interrupted
+                if name.startswith("."):
+                    candidates.append(os.path.join(wheel_cache.root, name))
+        for path in candidates:
+            try:
+                if os.stat(path).st_mtime > cutoff:
+                    continue
+                size = tree_size(path)
+                if os.path.isdir(path):
+                    remove_tree(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._reclaimed(report, "temp", size)
+
+    def _prune_containers(self, client, report):
+        """Exited backend and pool containers past JANITOR_CONTAINER_MAX_AGE, and orphaned pool containers"""
+        cutoff = time.time() - JANITOR_CONTAINER_MAX_AGE
+        found = {}
+        for filters in ({"label": POOL_LABEL, "status": "exited"}, {"name": "backend_", "status": "exited"},
+                        {"label": POOL_LABEL, "status": "dead"}, {"name": "backend_", "status": "dead"}):
+            for summary in client.api.containers(all=True, size=True, filters=filters):
+                found[summary["Id"]] = summary.get("SizeRw") or 0
+        for container_id, size in found.items():
+            try:
+                container = client.containers.get(container_id)
+                if finished_at(container) > cutoff:
+                    continue
+                container.remove(force=True)
+            except Exception as e:
+                report["errors"].append(f"container {container_id[:12]}: {e}")
+                continue
+            self._reclaimed(report, "containers", size)
+        orphans = container_pool.remove_orphans()
+        if orphans:
+            self._reclaimed(report, "containers", 0, orphans)
+
+    def _prune_images(self, client, report):
+        result = client.images.prune(filters={"dangling": True})
+        if result.get("ImagesDeleted"):
+            self._reclaimed(report, "images", result.get("SpaceReclaimed") or 0, len(result["ImagesDeleted"]))
+        if JANITOR_IMAGES_MAX_BYTES and (client.df().get("LayersSize") or 0) > JANITOR_IMAGES_MAX_BYTES:
+            # Images used by any container, such as the pool's, are never removed by the daemon
+            result = client.images.prune(filters={"dangling": False, "until": f"{int(JANITOR_IMAGES_MIN_AGE_HOURS)}h"})
+            if result.get("ImagesDeleted"):
+                self._reclaimed(report, "images", result.get("SpaceReclaimed") or 0, len(result["ImagesDeleted"]))
+
+    def _prune_wheels(self, report):
+        """Least recently used wheel sets, until the wheel cache is within its quota"""
+        if not os.path.isdir(wheel_cache.root):
+            return
+        total = tree_size(wheel_cache.root)
+        if total <= WHEEL_CACHE_MAX_BYTES:
+            return
+        now = time.time()
+        for last_used, name, path in wheel_cache.sets():
+            if total <= WHEEL_CACHE_MAX_BYTES:
+                break
+            # A set is mounted into backends while they install from it
+            if now - last_used < JANITOR_GRACE_SECONDS:
+                continue
+            size = tree_size(path)
+            try:
+                remove_tree(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self._reclaimed(report, "wheels", size)
+
+    def _needed(self):
+        """Bytes still to free to end disk pressure; 0 without pressure"""
+        return self.bytes_over(self.disk(), DISK_RESUME_PERCENT, DISK_MIN_FREE) if self.pressure else 0
+
+    def _prune_buildkit(self, report):
+        keep = JANITOR_BUILDKIT_MAX_BYTES // 2 if self._needed() else JANITOR_BUILDKIT_MAX_BYTES
+        reclaimed = buildkit.prune_cache(keep)
+        if reclaimed:
+            self._reclaimed(report, "build_cache", reclaimed)
+
+    def _prune_builds(self, report):
+        """Local builds unused for JANITOR_BUILDS_MAX_AGE_DAYS, then least recently used ones over the quota or the space needed"""
+        if not os.path.isdir(self.builds_dir):
+            return
+        needed = self._needed()
+        now = time.time()
+        builds = []
+        for name in os.listdir(self.builds_dir):
+            path = os.path.join(self.builds_dir, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            last_used = max(self._last_used.get(name, 0), os.stat(path).st_mtime)
+            builds.append((last_used, name, path, tree_size(path)))
+        builds.sort()
+        total = sum(size for *_, size in builds)
+        freed = 0
+        max_age = JANITOR_BUILDS_MAX_AGE_DAYS * 86400
+        for last_used, name, path, size in builds:
+            idle = now - last_used
+            if idle < JANITOR_GRACE_SECONDS:
+                continue
+            if not build_cache.deployed_from(path):
+                # The only copy of a live site
+                continue
+            if not (max_age and idle > max_age) and total <= JANITOR_BUILDS_MAX_BYTES and freed >= needed:
+                continue
+            try:
+                remove_tree(path)
+            except FileNotFoundError:
+                continue
+            self._last_used.pop(name, None)
+            total -= size
+            freed += size
+            self._reclaimed(report, "builds", size)
+            log.info("Removed local build", build_id=name, bytes=size, idle_days=round(idle / 86400, 1))
+
+    def run_pass(self, reason: str = "scheduled"):
+        """One cleanup pass over every category; returns its report"""
+        with self._pass_lock:
+            started_at = time.perf_counter()
+            report = {"reason": reason, "started_at": time.time(), "reclaimed_bytes": {}, "removed": {}, "errors": []}
+            usage = self.disk()
+            report["disk_before"] = usage
+            client = get_docker_client()
+            steps = [("temp", self._prune_temp)]
+            if client is not None:
+                steps += [("containers", lambda r: self._prune_containers(client, r)),
+                          ("images", lambda r: self._prune_images(client, r))]
+            if buildkit.available() and JANITOR_BUILDKIT_MAX_BYTES:
+                steps.append(("build_cache", self._prune_buildkit))
+            if WHEEL_CACHE_MAX_BYTES:
+                steps.append(("wheels", self._prune_wheels))
+            steps.append(("builds", self._prune_builds))
+            for category, step in steps:
+                try:
+                    step(report)
+                except Exception as e:
+                    report["errors"].append(f"{category}: {e}")
+                    log.warning("Cleanup step failed", category=category, error=str(e))
+            report["disk_after"] = self.disk()
+            report["reclaimed_total_bytes"] = sum(report["reclaimed_bytes"].values())
+            elapsed = time.perf_counter() - started_at
+            report["duration_ms"] = round(elapsed * 1000, 1)
+            janitor_pass_seconds.observe(elapsed)
+            self.last_pass = report
+            log.info("Cleanup pass", reason=reason, reclaimed_bytes=report["reclaimed_total_bytes"],
+                     removed=report["removed"], errors=len(report["errors"]), duration_ms=report["duration_ms"])
+            return report
+
+    def _loop(self):
+        next_pass = time.monotonic() + min(JANITOR_INTERVAL, 60)
+        while not self._stopping:
+            try:
+                started = self.check_pressure()
+                if started or time.monotonic() >= next_pass:
+                    self.run_pass("pressure" if started else "scheduled")
+                    next_pass = time.monotonic() + JANITOR_INTERVAL
+                    self.check_pressure()
+            except Exception as e:
+                log.warning("Janitor failed", error=str(e))
+            self._wakeup.wait(JANITOR_PRESSURE_INTERVAL)
+
+    def start(self):
+        if JANITOR_ENABLED and self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="janitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+
+    def stats(self):
+        return {
+            "enabled": JANITOR_ENABLED,
+            "pressure": self.pressure,
+            "builds_paused": admission.paused("build"),
+            "disk": self.disk(),
+            "last_pass": self.last_pass,
+        }
+
+
+janitor = Janitor()
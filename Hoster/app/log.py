@@ -0,0 +1,161 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REDACTED = "[REDACTED]"
+SECRET_KEY_PATTERN = re.compile(r"token|secret|password|passwd|authorization|cookie|session|credential|api_key|access_key", re.I)
+# Group 1 is kept so the redacted output still shows what kind of secret it was
+SECRET_VALUE_PATTERNS = [
+    re.compile(r"\b(gh[pousr]_)[A-Za-z0-9]{20,}"),
+    re.compile(r"\b(github_pat_)[A-Za-z0-9_]{20,}"),
+    re.compile(r"\b()(?:AKIA|ASIA)[A-Z0-9]{16}\b"),
+    re.compile(r"(?i)\b((?:token|bearer)\s+)[A-Za-z0-9._\-]{16,}"),
+    re.compile(r"(?i)(['\"]?access_token['\"]?\s*[:=]\s*['\"]?)[^'\",\s}]+"),
+]
+
+
+def redact_text(text: str):
+    for pattern in SECRET_VALUE_PATTERNS:
+        text = pattern.sub(r"\g<1>" + REDACTED, text)
+    return text
+
+
+def redact(value, key: str = ""):
+    """Mask secrets by field name and by well-known token shapes"""
+    if key and SECRET_KEY_PATTERN.search(key):
+        return REDACTED
+    if isinstance(value, dict):
+        return {k: redact(v, str(k)) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+
+def _format_value(value):
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str) and value and not any(c in value for c in ' ="'):
+        return value
+    return json.dumps(value, default=str)
+
+
+class StructuredFormatter(logging.Formatter):
+    """Renders a message plus its key/value fields as logfmt-style text or JSON"""
+
+    def __init__(self, fmt_type: str):
+        super().__init__()
+        self.fmt_type = fmt_type
+
+    def format(self, record):
+        fields = getattr(record, "fields", None) or {}
+        message = record.getMessage()
+        exc_text = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        if self.fmt_type == "json":
+            payload = {
+                "ts": round(record.created, 3),
+                "level": record.levelname.lower(),
+                "logger": record.name,
+                "msg": message,
+                **fields,
+            }
+            if exc_text:
+                payload["exc"] = exc_text
+            return json.dumps(payload, default=str)
+
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        parts = [f"{timestamp} {record.levelname:<7} {record.name}: {message}"]
+        for key, value in fields.items():
+            parts.append(f"{key}={_format_value(value)}")
+        line = " ".join(parts)
+        if exc_text:
+            line += "\n" + exc_text
+        return line
+
+
+class RedactingQueueHandler(logging.handlers.QueueHandler):
+    """Non-blocking handler: redacts on the caller, formats and writes on the listener thread"""
+
+    def prepare(self, record):
+        record.msg = redact_text(record.getMessage())
+        record.args = None
+        if getattr(record, "fields", None):
+            record.fields = redact(record.fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = redact_text(logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Dropping a log line is better than stalling a request
+            pass
+
+
+class StructuredLogger:
+    """Thin wrapper so call sites can pass structured fields as keyword arguments"""
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _log(self, level, message, fields, exc_info=False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, message, extra={"fields": fields}, exc_info=exc_info)
+
+    def debug(self, message, **fields):
+        self._log(logging.DEBUG, message, fields)
+
+    def info(self, message, **fields):
+        self._log(logging.INFO, message, fields)
+
+    def warning(self, message, **fields):
+        self._log(logging.WARNING, message, fields)
+
+    def error(self, message, **fields):
+        self._log(logging.ERROR, message, fields)
+
+    def exception(self, message, **fields):
+        self._log(logging.ERROR, message, fields, exc_info=True)
+
+
+_listener = None
+
+
+def setup_logging():
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(StructuredFormatter(LOG_FORMAT))
+
+    root = logging.getLogger("hoster")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(RedactingQueueHandler(log_queue))
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_logger(name: str):
+    setup_logging()
+    return StructuredLogger(logging.getLogger(f"hoster.{name}"))
@@ -1,8 +1,26 @@
-from fastapi import FastAPI
+import time
+IMPORT_STARTED_AT = time.perf_counter()
+
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.sessions import SessionMiddleware
 from app.routes.User.User import user_routes 
 from app.routes.Project.Project import project_router
+from app.routes.Webhook.Webhook import webhook_router
+from app.proxy import BackendProxyMiddleware, close_upstream_client
+from app.static_site import StaticSiteMiddleware
+from app.github import close_client as close_github_client
+from app.sessions import ServerSessionMiddleware
+from app.metrics import registry, MetricsMiddleware
+from app.health import startup, readiness
+from app.container_pool import container_pool
+from app.janitor import janitor
+from app.log import get_logger
+
+log = get_logger("main")
+startup.begin(IMPORT_STARTED_AT)
+startup.mark("imports")
 
 app = FastAPI()
 
@@ -15,17 +33,72 @@ app.add_middleware(
 )
 
 app.add_middleware(
-    SessionMiddleware,
-    secret_key="your-secret-key-here",
+    ServerSessionMiddleware,
     https_only=False 
 )
+
+app.add_middleware(MetricsMiddleware)
+
+# Local builds at /sites/{owner}/{repo}/, the fallback when nothing is deployed to S3
+app.add_middleware(StaticSiteMiddleware)
+
+# Outermost so proxied backend traffic skips CORS/session handling entirely
+app.add_middleware(BackendProxyMiddleware)
+
 app.include_router(user_routes, prefix="/api/user")
 app.include_router(project_router, prefix="/api/project")
+app.include_router(webhook_router, prefix="/api/webhooks")
+
+@app.on_event("startup")
+async def startup_complete():
+    # Pulls, pins and pre-creates in the background; requests never wait for it
+    container_pool.start()
+    janitor.start()
+    log.info("Startup complete", **{f"{phase}_seconds": seconds for phase, seconds in startup.phases.items()},
+             ready_seconds=startup.mark("ready"))
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_upstream_client()
+    await close_github_client()
+    await asyncio.to_thread(container_pool.stop)
+    janitor.stop()
 
 @app.get("/")
 async def root():
     return {"message": "GitHub Hoster API", "version": "1.0.0"}
 
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/health")
-async def health():
-    return {"status": "healthy"}
\ No newline at end of file
+async def health(request: Request, refresh: bool = False):
+    """Liveness plus each dependency's last probe result; always 200 while the process is up"""
+    # Skipping the probe cache costs a round trip to every dependency, so only signed-in users may
+    if refresh and not request.session.get('token'):
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    ready, dependencies = await readiness(refresh)
+    return {
+        "status": "healthy" if ready else "degraded",
+        "live": True,
+        "ready": ready,
+        "dependencies": dependencies,
+        "startup": startup.phases,
+    }
+
+@app.get("/api/health/live")
+async def health_live():
+    """Liveness: answers as long as the event loop does; never touches a dependency"""
+    return {"status": "alive"}
+
+@app.get("/api/health/ready")
+async def health_ready(request: Request, refresh: bool = False):
+    """Readiness: 503 until every dependency in READINESS_REQUIRED probes ok"""
+    if refresh and not request.session.get('token'):
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    ready, dependencies = await readiness(refresh)
+    return JSONResponse(
+        {"ready": ready, "dependencies": dependencies},
+        status_code=200 if ready else 503
+    )
\ No newline at end of file
@@ -0,0 +1,363 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}_total{_label_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge whose value is either set directly or read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = self.header()
+        if self.callback:
+            # Callbacks return {label tuple: value}; computed only when scraped
+            values = self.callback()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in values.items():
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            snapshot = {key: (list(s[0]), s[1], s[2]) for key, s in self._values.items()}
+        for key, (counts, total, count) in snapshot.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # A failing gauge callback must not take the whole scrape down
+                continue
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+build_phase_seconds = registry.histogram(
+    "hoster_build_phase_seconds",
+    "Duration of each build phase",
+    ("phase",),
+)
+builds = registry.counter(
+    "hoster_builds",
+    "Build requests by outcome (success, failed, cache_hit, coalesced)",
+    ("outcome",),
+)
+github_request_seconds = registry.histogram(
+    "hoster_github_request_seconds",
+    "GitHub API request latency",
+    ("endpoint", "status"),
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+github_requests = registry.counter(
+    "hoster_github_requests",
+    "GitHub API requests by endpoint and status",
+    ("endpoint", "status"),
+)
+github_cache_responses = registry.counter(
+    "hoster_github_cache_responses",
+    "GitHub responses answered from the conditional-request cache (not_modified, served_stale)",
+    ("result",),
+)
+s3_requests = registry.counter(
+    "hoster_s3_requests",
+    "S3 API requests by operation and outcome",
+    ("operation", "outcome"),
+)
+s3_bytes = registry.counter(
+    "hoster_s3_bytes",
+    "Bytes sent to S3",
+    ("operation",),
+)
+s3_request_seconds = registry.histogram(
+    "hoster_s3_request_seconds",
+    "S3 API request latency",
+    ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+docker_requests = registry.counter(
+    "hoster_docker_requests",
+    "Docker API calls by operation and outcome",
+    ("operation", "outcome"),
+)
+docker_request_seconds = registry.histogram(
+    "hoster_docker_request_seconds",
+    "Docker API call latency",
+    ("operation",),
+)
+static_responses = registry.counter(
+    "hoster_static_responses",
+    "Local static site responses (memory, read, stream, not_modified, partial, spa_fallback, not_found, ...)",
+    ("result",),
+)
+pool_acquisitions = registry.counter(
+    "hoster_pool_acquisitions",
+    "Containers handed out by the container pool, by kind and result (hit: pre-started, miss: created on demand)",
+    ("kind", "result"),
+)
+pool_start_seconds = registry.histogram(
+    "hoster_pool_start_seconds",
+    "Seconds from asking the container pool for a container until its job script was delivered",
+    ("kind", "result"),
+)
+backend_ready_seconds = registry.histogram(
+    "hoster_backend_ready_seconds",
+    "Seconds from a backend's start script being delivered until it answered its readiness probe (ready) or gave up (failed)",
+    ("backend_type", "result"),
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+wheel_cache_requests = registry.counter(
+    "hoster_wheel_cache_requests",
+    "Python backend starts by whether a complete wheel set existed for their requirements (hit) or not (miss)",
+    ("result",),
+)
+pip_install_seconds = registry.histogram(
+    "hoster_pip_install_seconds",
+    "Duration of Python backend dependency installs, from cached wheels (hit) or from the index (miss)",
+    ("result",),
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200),
+)
+janitor_reclaimed_bytes = registry.counter(
+    "hoster_janitor_reclaimed_bytes",
+    "Disk space reclaimed by the janitor per category (builds, temp, containers, images, build_cache, wheels)",
+    ("category",),
+)
+janitor_removed = registry.counter(
+    "hoster_janitor_removed",
+    "Items removed by the janitor per category",
+    ("category",),
+)
+janitor_pass_seconds = registry.histogram(
+    "hoster_janitor_pass_seconds",
+    "Duration of janitor cleanup passes",
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300),
+)
+disk_free_bytes = registry.gauge(
+    "hoster_disk_free_bytes",
+    "Free space on the filesystems holding builds, temporary files and Docker's data",
+    ("path",),
+)
+disk_pressure = registry.gauge(
+    "hoster_disk_pressure",
+    "1 while builds are paused because a filesystem is nearly full",
+)
+client_init_seconds = registry.gauge(
+    "hoster_client_init_seconds",
+    "Seconds spent creating each lazily initialized client (docker, s3), including its import",
+    ("client",),
+)
+dependency_up = registry.gauge(
+    "hoster_dependency_up",
+    "Result of the last readiness probe of each dependency (1 ok, 0 down or not configured)",
+    ("dependency",),
+)
+startup_seconds = registry.gauge(
+    "hoster_startup_seconds",
+    "Seconds from the start of app.main's import to each startup phase (imports, ready)",
+    ("phase",),
+)
+http_request_seconds = registry.histogram(
+    "hoster_http_request_seconds",
+    "API request latency by route template",
+    ("method", "route", "status"),
+)
+
+
+def github_endpoint_label(path: str):
+    """Collapse a GitHub API path to a low-cardinality template for metric labels"""
+    parts = [p for p in path.split("?")[0].split("/") if p]
+    if len(parts) >= 3 and parts[0] == "repos":
+        # repos/{owner}/{repo}/<resource>/...
+        tail = parts[3:]
+        if not tail:
+            return "/repos/{owner}/{repo}"
+        resource = tail[0]
+        if resource == "git" and len(tail) > 1:
+            resource = f"git/{tail[1]}"
+        return "/repos/{owner}/{repo}/" + resource
+    return "/" + "/".join(parts[:2])
+
+
+@contextmanager
+def track(histogram, counter, **labels):
+    """Time a block into histogram and count it in counter with an outcome label"""
+    started_at = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started_at, **labels)
+        counter.inc(outcome=outcome, **labels)
+
+
+def route_template(scope):
+    """Route template of the matched endpoint, e.g. /api/project/build-status/{owner}/{repo}"""
+    route = scope.get("route")
+    if not hasattr(route, "path"):
+        return "unmatched"
+    path = scope["path"]
+    regex = getattr(route, "path_regex", None)
+    if regex is None or regex.match(path):
+        return route.path
+    # Routes of included routers only know their path relative to the router prefix
+    for index, char in enumerate(path):
+        if char == "/" and index and regex.match(path[index:]):
+            return path[:index] + route.path
+    return route.path
+
+
+class MetricsMiddleware:
+    """Records API latency per route template; unmatched paths share a single label"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started_at = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_seconds.observe(
+                time.perf_counter() - started_at,
+                method=scope["method"],
+                route=route_template(scope),
+                status=status["code"],
+            )
@@ -0,0 +1,252 @@
+import os
+import re
+import threading
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+PROXY_DOMAIN = os.getenv("PROXY_DOMAIN", "").strip(".").lower()
+PROXY_PATH_PREFIX = os.getenv("PROXY_PATH_PREFIX", "").rstrip("/")
+PROXY_MAX_CONNECTIONS = int(os.getenv("PROXY_MAX_CONNECTIONS", "200"))
+PROXY_MAX_KEEPALIVE = int(os.getenv("PROXY_MAX_KEEPALIVE", "50"))
+PROXY_KEEPALIVE_EXPIRY = float(os.getenv("PROXY_KEEPALIVE_EXPIRY", "30"))
+PROXY_CONNECT_TIMEOUT = float(os.getenv("PROXY_CONNECT_TIMEOUT", "5"))
+PROXY_READ_TIMEOUT = float(os.getenv("PROXY_READ_TIMEOUT", "300"))
+
+# Paths served by the API itself are never treated as /{owner}/{repo}/ routes
+RESERVED_PREFIXES = ("/api/", "/docs", "/redoc", "/openapi.json")
+
+HOP_BY_HOP_HEADERS = {
+    b"connection",
+    b"keep-alive",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"te",
+    b"trailer",
+    b"transfer-encoding",
+    b"upgrade",
+    b"host",
+}
+
+
+def hostname_for(owner: str, repo: str):
+    """Hostname a backend is reachable on when PROXY_DOMAIN is configured"""
+    if not PROXY_DOMAIN:
+        return None
+    label = re.sub(r"[^a-z0-9-]", "-", f"{repo}--{owner}".lower()).strip("-")
+    return f"{label}.{PROXY_DOMAIN}"
+
+
+def path_prefix_for(owner: str, repo: str):
+    return f"{PROXY_PATH_PREFIX}/{owner}/{repo}/"
+
+
+class RouteTable:
+    """Live mapping of hostnames and /{owner}/{repo}/ prefixes to backend upstreams"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_repo = {}
+        self._by_host = {}
+
+    def register(self, owner: str, repo: str, upstream: str):
+        route = {
+            "owner": owner,
+            "repo": repo,
+            "upstream": upstream.rstrip("/"),
+            "path_prefix": path_prefix_for(owner, repo),
+            "hostname": hostname_for(owner, repo),
+        }
+        with self._lock:
+            self._by_repo[(owner.lower(), repo.lower())] = route
+            if route["hostname"]:
+                self._by_host[route["hostname"]] = route
+        return route
+
+    def unregister(self, owner: str, repo: str):
+        with self._lock:
+            route = self._by_repo.pop((owner.lower(), repo.lower()), None)
+            if route and route["hostname"]:
+                self._by_host.pop(route["hostname"], None)
+        return route
+
+    def lookup_repo(self, owner: str, repo: str):
+        return self._by_repo.get((owner.lower(), repo.lower()))
+
+    def lookup_host(self, host: str):
+        return self._by_host.get(host)
+
+    def routes(self):
+        with self._lock:
+            return list(self._by_repo.values())
+
+
+route_table = RouteTable()
+
+_upstream_client = None
+
+
+def get_upstream_client():
+    """Shared keep-alive connection pool to backend containers"""
+    global _upstream_client
+    if _upstream_client is None:
+        _upstream_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=PROXY_MAX_CONNECTIONS,
+                max_keepalive_connections=PROXY_MAX_KEEPALIVE,
+                keepalive_expiry=PROXY_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(PROXY_READ_TIMEOUT, connect=PROXY_CONNECT_TIMEOUT),
+            follow_redirects=False,
+        )
+    return _upstream_client
+
+
+async def close_upstream_client():
+    global _upstream_client
+    if _upstream_client is not None:
+        await _upstream_client.aclose()
+        _upstream_client = None
+
+
+def _header(scope, name: bytes):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def resolve_route(scope):
+    """Return (route, upstream_path, prefix) for a request, or None if the API should handle it.
+
+    prefix is the path prefix the request was routed by, None when it was routed by hostname.
+    """
+    host = (_header(scope, b"host") or "").split(":")[0].lower()
+    raw_path = scope.get("raw_path")
+    path = raw_path.decode("latin-1") if raw_path else scope["path"]
+
+    if PROXY_DOMAIN and host.endswith("." + PROXY_DOMAIN):
+        route = route_table.lookup_host(host)
+        if route:
+            return route, path, None
+
+    if PROXY_PATH_PREFIX:
+        if not path.startswith(PROXY_PATH_PREFIX + "/"):
+            return None
+        path = path[len(PROXY_PATH_PREFIX):]
+    elif path.startswith(RESERVED_PREFIXES) or path == "/api":
+        return None
+
+    parts = path.lstrip("/").split("/", 2)
+    if len(parts) < 2 or not parts[0] or not parts[1]:
+        return None
+
+    route = route_table.lookup_repo(parts[0], parts[1])
+    if not route:
+        return None
+    if len(parts) == 2:
+        # /{owner}/{repo} without a trailing slash: redirect so relative URLs resolve
+        return route, None, None
+    return route, "/" + parts[2], route["path_prefix"].rstrip("/")
+
+
+async def _send_simple(send, status: int, body: bytes, headers=None):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode())] + (headers or []),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def proxy_request(scope, receive, send, route, upstream_path: str, prefix: str = None):
+    """Forward one HTTP request to the upstream, streaming both bodies; prefix becomes X-Forwarded-Prefix"""
+    client = get_upstream_client()
+
+    url = route["upstream"] + upstream_path
+    if scope.get("query_string"):
+        url += "?" + scope["query_string"].decode("latin-1")
+
+    # A client's own X-Forwarded-Prefix is never passed on
+    headers = [(k, v) for k, v in scope["headers"]
+               if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() != b"x-forwarded-prefix"]
+    client_addr = scope.get("client")
+    if client_addr:
+        forwarded_for = _header(scope, b"x-forwarded-for")
+        forwarded_for = f"{forwarded_for}, {client_addr[0]}" if forwarded_for else client_addr[0]
+        headers = [(k, v) for k, v in headers if k.lower() != b"x-forwarded-for"]
+        headers.append((b"x-forwarded-for", forwarded_for.encode("latin-1")))
+    headers.append((b"x-forwarded-proto", scope.get("scheme", "http").encode()))
+    headers.append((b"x-forwarded-host", (_header(scope, b"host") or "").encode("latin-1")))
+    if prefix:
+        headers.append((b"x-forwarded-prefix", prefix.encode("latin-1")))
+
+    has_body = _header(scope, b"content-length") not in (None, "0") or _header(scope, b"transfer-encoding")
+
+    async def request_body():
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            if chunk:
+                yield chunk
+            if not message.get("more_body", False):
+                return
+
+    upstream_request = client.build_request(
+        scope["method"],
+        url,
+        headers=headers,
+        content=request_body() if has_body else None,
+    )
+
+    try:
+        upstream_response = await client.send(upstream_request, stream=True)
+    except httpx.TimeoutException:
+        await _send_simple(send, 504, b"Upstream backend timed out")
+        return
+    except httpx.RequestError as e:
+        await _send_simple(send, 502, f"Upstream backend unavailable: {e}".encode())
+        return
+
+    try:
+        response_headers = [
+            (k, v) for k, v in upstream_response.headers.raw
+            if k.lower() not in HOP_BY_HOP_HEADERS
+        ]
+        await send({
+            "type": "http.response.start",
+            "status": upstream_response.status_code,
+            "headers": response_headers,
+        })
+        async for chunk in upstream_response.aiter_raw():
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        await upstream_response.aclose()
+
+
+class BackendProxyMiddleware:
+    """Routes requests for registered backends to their containers before they reach the API"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            resolved = resolve_route(scope)
+            if resolved:
+                route, upstream_path, prefix = resolved
+                if upstream_path is None:
+                    location = scope["path"] + "/"
+                    if scope.get("query_string"):
+                        location += "?" + scope["query_string"].decode("latin-1")
+                    await _send_simple(send, 307, b"", [(b"location", location.encode("latin-1"))])
+                    return
+                await proxy_request(scope, receive, send, route, upstream_path, prefix)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,135 @@
+import os
+import time
+import asyncio
+import httpx
+from dotenv import load_dotenv
+
+from app.proxy import get_upstream_client
+from app.metrics import backend_ready_seconds
+from app.log import get_logger
+
+load_dotenv()
+
+
+# Probe backends after they start and report starting/ready/failed; off reports no readiness at all
+BACKEND_READINESS = os.getenv("BACKEND_READINESS", "true").lower() in ("1", "true", "yes")
+# Path requested once the port accepts connections; any answer below 500 counts as ready. Empty: TCP only
+BACKEND_READY_PATH = os.getenv("BACKEND_READY_PATH", "/")
+# Dependency installs run first, so this is generous
+BACKEND_READY_TIMEOUT = float(os.getenv("BACKEND_READY_TIMEOUT", "300"))
+BACKEND_READY_INITIAL_DELAY = float(os.getenv("BACKEND_READY_INITIAL_DELAY", "0.2"))
+BACKEND_READY_MAX_DELAY = float(os.getenv("BACKEND_READY_MAX_DELAY", "5"))
+BACKEND_READY_PROBE_TIMEOUT = float(os.getenv("BACKEND_READY_PROBE_TIMEOUT", "2"))
+# TCP-only probes: how long an accepted connection must stay open (or answer) to count as reaching the app
+BACKEND_READY_TCP_SETTLE = float(os.getenv("BACKEND_READY_TCP_SETTLE", "0.3"))
+
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+log = get_logger("readiness")
+
+# Strong references so probes are not garbage collected mid-flight
+probe_tasks = set()
+
+
+class Readiness:
+    """Startup state of one backend, measured from when its start script was delivered"""
+
+    def __init__(self, backend_type: str):
+        self.backend_type = backend_type
+        self.state = STARTING
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.ready_seconds = None
+        self._elapsed = None
+        self.attempts = 0
+        self.error = None
+        self._settled = asyncio.Event()
+
+    def settle(self, state: str, error: str = None):
+        if self.state != STARTING:
+            return
+        self.state = state
+        self.error = error
+        self._elapsed = round(time.perf_counter() - self._started, 3)
+        if state == READY:
+            self.ready_seconds = self._elapsed
+        backend_ready_seconds.observe(self._elapsed, backend_type=self.backend_type, result=state)
+        self._settled.set()
+
+    async def wait(self, timeout: float = None):
+        """Wait until the backend is ready or failed, at most timeout seconds; returns the state"""
+        try:
+            await asyncio.wait_for(self._settled.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.state
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "ready_seconds": self.ready_seconds,
+            "elapsed_seconds": round(time.perf_counter() - self._started, 3) if self._elapsed is None else self._elapsed,
+            "attempts": self.attempts,
+            "error": self.error,
+        }
+
+
+async def check(host: str, port: int, path: str = BACKEND_READY_PATH):
+    """One probe: TCP connect, then a GET of path when set; raises on failure"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), BACKEND_READY_PROBE_TIMEOUT)
+    try:
+        if not path:
+            # Docker's userland proxy accepts the connection before the app listens, then closes it at once
+            try:
+                data = await asyncio.wait_for(reader.read(1), BACKEND_READY_TCP_SETTLE)
+            except asyncio.TimeoutError:
+                return
+            if not data:
+                raise ConnectionResetError("Connection closed right after it was accepted")
+            return
+    finally:
+        writer.close()
+    response = await get_upstream_client().get(f"http://{host}:{port}{path}", timeout=BACKEND_READY_PROBE_TIMEOUT)
+    if response.status_code >= 500:
+        raise RuntimeError(f"{path} answered {response.status_code}")
+
+
+async def probe(readiness: Readiness, host: str, port: int, alive, **context):
+    """Probe with exponential backoff until the backend answers, alive() turns false or the timeout runs out"""
+    deadline = time.monotonic() + BACKEND_READY_TIMEOUT
+    delay = BACKEND_READY_INITIAL_DELAY
+    last_error = None
+    while True:
+        if not alive():
+            readiness.settle(FAILED, "Backend exited before it was ready")
+            break
+        readiness.attempts += 1
+        try:
+            await check(host, port)
+            readiness.settle(READY)
+            break
+        except (OSError, asyncio.TimeoutError, httpx.HTTPError, RuntimeError) as e:
+            last_error = str(e) or type(e).__name__
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            readiness.settle(FAILED, f"Not ready after {BACKEND_READY_TIMEOUT:g}s: {last_error}")
+            break
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, BACKEND_READY_MAX_DELAY)
+    if readiness.state == READY:
+        log.info("Backend ready", **context, port=port, ready_seconds=readiness.ready_seconds, attempts=readiness.attempts)
+    else:
+        log.warning("Backend not ready", **context, port=port, error=readiness.error, attempts=readiness.attempts)
+
+
+def start_probe(backend_type: str, host: str, port: int, alive, **context):
+    """Begin probing a just started backend in the background; None when readiness probing is off"""
+    if not BACKEND_READINESS:
+        return None
+    readiness = Readiness(backend_type)
+    task = asyncio.create_task(probe(readiness, host, port, alive, **context))
+    probe_tasks.add(task)
+    task.add_done_callback(probe_tasks.discard)
+    return readiness
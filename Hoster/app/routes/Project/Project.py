@@ -1,50 +1,151 @@
 from fastapi import Request, APIRouter, Response
 from fastapi.responses import RedirectResponse, JSONResponse
-import requests
-import docker
 import os
 import shutil
 import zipfile
 import tempfile
 import json
 import base64
-import boto3
 import threading
+import socket
 import time
+import asyncio
+import re
 from dotenv import load_dotenv
 
-from app.config import oauth
+from app.proxy import route_table, hostname_for, path_prefix_for
+from app.admission import admission, container_limits, AdmissionTimeout
+from app.build_jobs import build_coalescer
+from app.build_cache import build_cache, build_cache_key
+from app.github import (
+    repo_list_cache, GitHubError, GitHubRateLimited, github_session, GITHUB_API_URL,
+    rate_limiter, token_key, fetch_rate_limit
+)
+from app.build_history import BuildTrace, build_history
+from app.webhooks import deployments
+from app.source_archive import SourceArchive
+from app.artifacts import ArtifactPipeline, S3Uploader, upload_directory
+from app import buildkit
+from app.static_site import site_path_for
+from app.deploys import DeployStore, new_version, version_prefix, entry_points, delete_prefix
+from app.metrics import registry, builds
+from app.clients import get_docker_client, docker_client_async, get_s3_client
+from app.health import probes
+from app.build_queue import get_job_queue, LEASED, FINISHED
+from app.janitor import janitor, TEMP_PREFIX
+from app.wheel_cache import wheel_cache
+from app.readiness import start_probe, READY, FAILED, BACKEND_READY_TIMEOUT, BACKEND_READY_PROBE_TIMEOUT
+from app.container_pool import container_pool, directory_tar, CONTAINER_POOL_SIZE, CONTAINER_POOL_BACKEND_SIZE
+from app.log import get_logger
 
 load_dotenv()
 
 
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
-S3_BASE_URL = os.getenv("S3_BASE_URL", f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 S3_BASE_URL = os.getenv("S3_BASE_URL", f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/")
+# Backends are published on this host interface only; public traffic goes through app.proxy
+BACKEND_BIND_HOST = os.getenv("BACKEND_BIND_HOST", "127.0.0.1")
+BUILDER_IMAGE = os.getenv("BUILDER_IMAGE", "node:20-alpine")
+# "archive" copies the project from the downloaded zip straight into the build container;
+# "bind" writes it to a temporary directory and bind-mounts that at /source
+BUILD_SOURCE_MODE = os.getenv("BUILD_SOURCE_MODE", "archive").lower()
+# "container" runs the build script in a throwaway container; "buildkit" builds a generated
+# Dockerfile with docker buildx so dependency layers and the npm cache survive between builds
+BUILD_BACKEND = os.getenv("BUILD_BACKEND", "container").lower()
+# "local" builds in this process; "queue" hands builds to `python -m app.worker` processes through app.build_queue
+BUILD_EXECUTOR = os.getenv("BUILD_EXECUTOR", "local").lower()
+BUILD_JOB_TIMEOUT = float(os.getenv("BUILD_JOB_TIMEOUT", "3600"))
+BUILD_QUEUE_POLL_SECONDS = float(os.getenv("BUILD_QUEUE_POLL_SECONDS", "0.5"))
+# Bump when the build script or output handling changes so cached builds are not reused
+BUILD_SETTINGS_VERSION = "4"
 
 project_router = APIRouter()
+log = get_logger("project")
 
 
-docker_client = None
-try:
-    docker_client = docker.from_env()
-    print("Docker client initialized successfully")
-except Exception as e:
-    print(f"Docker not available: {e}")
+running_backend_containers = {}
+# Replacement backends started by restart_backend, routed to only once they are ready
+starting_backends = {}
+# Strong references so background watchers of running backends are not garbage collected mid-flight
+backend_tasks = set()
 
+registry.gauge(
+    "hoster_backend_containers",
+    "Backend containers currently running",
+    callback=lambda: {(): len(running_backend_containers)},
+)
 
-running_backend_containers = {}
+if BUILD_EXECUTOR == "queue":
+    registry.gauge(
+        "hoster_build_queue_jobs",
+        "Build jobs waiting for a worker or leased to one",
+        ("state",),
+        callback=lambda: {(state,): count for state, count in get_job_queue().stats().items()},
+    )
+    registry.gauge(
+        "hoster_build_worker_capacity",
+        "Concurrent builds the workers with a recent heartbeat accept, and how many they are running",
+        ("kind",),
+        callback=lambda: {
+            (kind,): sum(worker.get(kind, 0) for worker in get_job_queue().workers()) for kind in ("capacity", "running")
+        },
+    )
+
+def backend_upstream_host():
+    return "127.0.0.1" if BACKEND_BIND_HOST in ("", "0.0.0.0") else BACKEND_BIND_HOST
+
+def register_backend(container_key, container_info):
+    """Track a running backend and publish it in the proxy route table"""
+    running_backend_containers[container_key] = container_info
+    route_table.register(
+        container_info["owner"],
+        container_info["repo"],
+        f"http://{backend_upstream_host()}:{container_info['port']}"
+    )
+
+def unregister_backend(container_key):
+    container_info = running_backend_containers.pop(container_key, None)
+    if container_info:
+        route_table.unregister(container_info["owner"], container_info["repo"])
+        admission.release(container_info.get("admission_ticket"))
+    return container_info
 
 def cleanup_container(container_id):
     """Clean up container from tracking after it stops"""
-    if container_id in running_backend_containers:
-        del running_backend_containers[container_id]
+    for container_key, container_info in list(running_backend_containers.items()):
+        if container_info["container_id"] == container_id:
+            unregister_backend(container_key)
+    for container_key, container_info in list(starting_backends.items()):
+        if container_info["container_id"] == container_id:
+            starting_backends.pop(container_key, None)
+            admission.release(container_info.get("admission_ticket"))
+
+def is_tracked(container_key, container_id):
+    """True while container_id is the routed backend of container_key or its replacement being started"""
+    return any(
+        tracked.get(container_key, {}).get("container_id") == container_id
+        for tracked in (running_backend_containers, starting_backends)
+    )
+
+def rate_limited_response(e: GitHubRateLimited):
+    return JSONResponse({
+        "success": False,
+        "error": str(e),
+        "retry_after": e.retry_after
+    }, status_code=429, headers={"Retry-After": str(e.retry_after)})
+
+def readiness_of(container_info):
+    readiness = container_info.get("readiness")
+    return readiness.to_dict() if readiness else None
+
+def backend_proxy_url(request: Request, owner: str, repo: str):
+    """Public URL of a backend behind the built-in reverse proxy"""
+    hostname = hostname_for(owner, repo)
+    if hostname:
+        return f"{request.url.scheme}://{hostname}/"
+    return str(request.base_url).rstrip('/') + path_prefix_for(owner, repo)
 
 @project_router.get("/repos")
 async def get_user_repos(request: Request):
@@ -53,36 +154,52 @@ async def get_user_repos(request: Request):
     if not token:
         return JSONResponse({"error": "Not authenticated"}, status_code=401)
     
+    params = request.query_params
     try:
-        resp = await oauth.github.get('user/repos', token=token, params={
-                    'page': 1,
-                    'per_page': 100,
-                    'sort': 'updated',  
-                    'type': 'all'       
-                })
-        repos = resp.json()
-        
-        
-        all_repos = []
-        for repo in repos:
-            repo_info = {
-                "name": repo['name'],
-                "full_name": repo['full_name'],
-                "owner": repo['owner']['login'],
-                "description": repo.get('description', ''),
-                "clone_url": repo['clone_url'],
-                "updated_at": repo['updated_at'],
-                "private": repo.get('private', False),
-                "language": repo.get('language', 'Unknown')
-            }
-            all_repos.append(repo_info)
-        
-        return {
-            "repos": all_repos,
-            "docker_available": docker_client is not None
-        }
+        page = max(int(params.get("page", 1)), 1)
+        per_page = max(int(params.get("per_page", 0)), 0)
+    except ValueError:
+        return JSONResponse({"error": "page and per_page must be integers"}, status_code=400)
+    
+    try:
+        repos, cache_info = await repo_list_cache.get(
+            token,
+            force_refresh=params.get("refresh", "").lower() in ("1", "true", "yes")
+        )
+    except GitHubRateLimited as e:
+        return rate_limited_response(e)
+    except GitHubError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code if e.status_code in (401, 403) else 502)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
+    
+    language = params.get("language")
+    if language:
+        repos = [r for r in repos if (r["language"] or "").lower() == language.lower()]
+    
+    private = params.get("private")
+    if private is not None:
+        want_private = private.lower() in ("1", "true", "yes")
+        repos = [r for r in repos if bool(r["private"]) == want_private]
+    
+    updated_since = params.get("updated_since")
+    if updated_since:
+        # GitHub timestamps are ISO-8601 UTC, so string comparison orders them correctly
+        repos = [r for r in repos if r["updated_at"] >= updated_since]
+    
+    total = len(repos)
+    if per_page:
+        repos = repos[(page - 1) * per_page:page * per_page]
+    
+    return {
+        "repos": repos,
+        "total": total,
+        "page": page if per_page else 1,
+        "per_page": per_page or total,
+        "total_pages": (total + per_page - 1) // per_page if per_page else 1,
+        "cache": cache_info,
+        "docker_available": (await probes["docker"].result())["status"] == "ok"
+    }
 
 @project_router.get("/check-react/{owner}/{repo}")
 async def check_if_react_project(request: Request, owner: str, repo: str):
@@ -105,8 +222,8 @@ async def check_if_react_project(request: Request, owner: str, repo: str):
         
         
         try:
-            contents_url = f'https://api.github.com/repos/{owner}/{repo}/contents'
-            contents_response = requests.get(contents_url, headers=headers)
+            contents_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/contents'
+            contents_response = await asyncio.to_thread(github_session.get, contents_url, headers=headers)
             
             if contents_response.status_code == 200:
                 contents = contents_response.json()
@@ -124,8 +241,10 @@ async def check_if_react_project(request: Request, owner: str, repo: str):
                                 "package_json_path": is_react_subfolder["package_json_path"],
                                 "details": is_react_subfolder["details"]
                             }
+        except GitHubRateLimited:
+            raise
         except Exception as e:
-            print(f"Error checking subdirectories: {str(e)}")
+            log.warning("Error checking subdirectories", owner=owner, repo=repo, error=str(e))
         
         return {
             "is_react": False,
@@ -134,6 +253,8 @@ async def check_if_react_project(request: Request, owner: str, repo: str):
             "details": "No React project found in root or subdirectories"
         }
         
+    except GitHubRateLimited as e:
+        return rate_limited_response(e)
     except Exception as e:
         return JSONResponse({
             "error": str(e),
@@ -143,11 +264,11 @@ async def check_if_react_project(request: Request, owner: str, repo: str):
 async def check_react_in_directory(headers, owner: str, repo: str, directory_path: str):
     try:
         if directory_path:
-            package_json_url = f'https://api.github.com/repos/{owner}/{repo}/contents/{directory_path}/package.json'
+            package_json_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/contents/{directory_path}/package.json'
         else:
-            package_json_url = f'https://api.github.com/repos/{owner}/{repo}/contents/package.json'
+            package_json_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/contents/package.json'
         
-        response = requests.get(package_json_url, headers=headers)
+        response = await asyncio.to_thread(github_session.get, package_json_url, headers=headers)
         
         if response.status_code == 200:
             content = response.json()
@@ -194,6 +315,8 @@ async def check_react_in_directory(headers, owner: str, repo: str, directory_pat
             "package_json_path": None,
             "details": "No package.json found or invalid format"
         }
+    except GitHubRateLimited:
+        raise
     except Exception as e:
         return {
             "is_react": False,
@@ -223,8 +346,8 @@ async def check_if_backend_project(request: Request, owner: str, repo: str):
         
         
         try:
-            contents_url = f'https://api.github.com/repos/{owner}/{repo}/contents'
-            contents_response = requests.get(contents_url, headers=headers)
+            contents_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/contents'
+            contents_response = await asyncio.to_thread(github_session.get, contents_url, headers=headers)
             
             if contents_response.status_code == 200:
                 contents = contents_response.json()
@@ -241,8 +364,10 @@ async def check_if_backend_project(request: Request, owner: str, repo: str):
                                 "backend_type": backend_check_sub["backend_type"],
                                 "details": backend_check_sub["details"]
                             }
+        except GitHubRateLimited:
+            raise
         except Exception as e:
-            print(f"Error checking subdirectories: {str(e)}")
+            log.warning("Error checking subdirectories", owner=owner, repo=repo, error=str(e))
         
         return {
             "is_backend": False,
@@ -251,6 +376,8 @@ async def check_if_backend_project(request: Request, owner: str, repo: str):
             "details": "No backend project found in root or subdirectories"
         }
         
+    except GitHubRateLimited as e:
+        return rate_limited_response(e)
     except Exception as e:
         return JSONResponse({
             "error": str(e),
@@ -268,11 +395,11 @@ async def check_backend_in_directory(headers, owner: str, repo: str, directory_p
         
         
         if directory_path:
-            package_json_url = f'https://api.github.com/repos/{owner}/{repo}/contents/{directory_path}/package.json'
+            package_json_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/contents/{directory_path}/package.json'
         else:
-            package_json_url = f'https://api.github.com/repos/{owner}/{repo}/contents/package.json'
+            package_json_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/contents/package.json'
         
-        response = requests.get(package_json_url, headers=headers)
+        response = await asyncio.to_thread(github_session.get, package_json_url, headers=headers)
         if response.status_code == 200:
             content = response.json()
             if content.get("encoding") == "base64":
@@ -324,11 +451,11 @@ async def check_backend_in_directory(headers, owner: str, repo: str, directory_p
         python_files = ['requirements.txt', 'app.py', 'main.py', 'server.py', 'wsgi.py', 'asgi.py']
         for python_file in python_files:
             if directory_path:
-                file_url = f'https://api.github.com/repos/{owner}/{repo}/contents/{directory_path}/{python_file}'
+                file_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/contents/{directory_path}/{python_file}'
             else:
-                file_url = f'https://api.github.com/repos/{owner}/{repo}/contents/{python_file}'
+                file_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/contents/{python_file}'
             
-            response = requests.get(file_url, headers=headers)
+            response = await asyncio.to_thread(github_session.get, file_url, headers=headers)
             if response.status_code == 200:
                 
                 framework = "Unknown"
@@ -364,6 +491,8 @@ async def check_backend_in_directory(headers, owner: str, repo: str, directory_p
         
         return backend_info
         
+    except GitHubRateLimited:
+        raise
     except Exception as e:
         return {
             "is_backend": False,
@@ -379,8 +508,8 @@ async def get_repo_structure(request: Request, owner: str, repo: str):
     
     try:
         headers = {'Authorization': f'token {token["access_token"]}'}
-        contents_url = f'https://api.github.com/repos/{owner}/{repo}/contents'
-        contents_response = requests.get(contents_url, headers=headers)
+        contents_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/contents'
+        contents_response = await asyncio.to_thread(github_session.get, contents_url, headers=headers)
         
         if contents_response.status_code != 200:
             return JSONResponse({
@@ -456,6 +585,8 @@ async def get_repo_structure(request: Request, owner: str, repo: str):
             "total_backend_projects": len(structure["backend_projects"])
         }
         
+    except GitHubRateLimited as e:
+        return rate_limited_response(e)
     except Exception as e:
         return JSONResponse({
             "error": str(e)
@@ -477,32 +608,19 @@ async def delete_s3_hosted_project(request: Request, owner: str, repo: str):
     s3_prefix = f"projects/{owner}/{repo}"
     
     try:
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION,
-        )
+        s3 = get_s3_client()
         
-        response = s3.list_objects_v2(
-            Bucket=S3_BUCKET_NAME,
-            Prefix=s3_prefix
-        )
+        # Every retained version sits below the prefix too, so this can be well over one listing page
+        deleted_count = await asyncio.to_thread(delete_prefix, s3, S3_BUCKET_NAME, f"{s3_prefix}/")
         
-        if 'Contents' in response:
-            objects_to_delete = [{'Key': item['Key']} for item in response['Contents']]
-            
-            s3.delete_objects(
-                Bucket=S3_BUCKET_NAME,
-                Delete={
-                    'Objects': objects_to_delete
-                }
-            )
+        if deleted_count:
+            build_cache.forget_target(s3_prefix)
+            deployments.forget_frontend(owner, repo)
             
             return {
                 "success": True,
-                "message": f"Deleted {len(objects_to_delete)} files from S3 for {owner}/{repo}",
-                "deleted_count": len(objects_to_delete)
+                "message": f"Deleted {deleted_count} files from S3 for {owner}/{repo}",
+                "deleted_count": deleted_count
             }
         else:
             return {
@@ -523,14 +641,19 @@ async def build_react_project(request: Request, owner: str, repo: str):
     if not token:
         return JSONResponse({"error": "Not authenticated"}, status_code=401)
     
-    if not docker_client:
+    # With a build queue the workers need Docker, not this process
+    if BUILD_EXECUTOR == "local" and not await docker_client_async():
         return JSONResponse({
             "success": False,
             "error": "Docker Desktop needs to be installed and running"
         }, status_code=400)
     
+    if request.query_params.get("all", "").lower() in ("1", "true", "yes"):
+        return await build_all_react_projects(request, token, owner, repo)
    
     react_check = await check_if_react_project(request, owner, repo)
+    if isinstance(react_check, Response):
+        return react_check
     if not react_check["is_react"]:
         return JSONResponse({
             "success": False,
@@ -538,131 +661,649 @@ async def build_react_project(request: Request, owner: str, repo: str):
         }, status_code=400)
     
     project_path = react_check.get("project_path", "")
+    headers = {'Authorization': f'token {token["access_token"]}'}
     
     try:
-        headers = {'Authorization': f'token {token["access_token"]}'}
-        zip_url = f'https://api.github.com/repos/{owner}/{repo}/zipball'
-        
-        response = requests.get(zip_url, headers=headers)
+        ref = request.query_params.get("ref") or "HEAD"
+        sha = await asyncio.to_thread(resolve_commit_sha, headers, owner, repo, ref)
+        if not sha:
+            return JSONResponse({"success": False, "error": "Failed to resolve repository commit"}, status_code=400)
+        
+        force = request.query_params.get("force", "").lower() in ("1", "true", "yes")
+        payload, status_code = await start_build(headers, owner, repo, project_path, sha, force=force, ref=ref)
+    except GitHubRateLimited as e:
+        return rate_limited_response(e)
+    except Exception as e:
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+    
+    if status_code != 200:
+        return JSONResponse(payload, status_code=status_code)
+    deployments.remember_frontend(owner, repo, project_path, token)
+    return payload
+
+def detect_react_projects(archive: SourceArchive):
+    """Project paths (the root and top-level directories) whose package.json depends on React"""
+    paths = []
+    for path in ["", *archive.directories()]:
+        package_json = archive.read(path, "package.json")
+        if package_json is None:
+            continue
+        try:
+            package_data = json.loads(package_json)
+        except ValueError:
+            continue
+        if 'react' in package_data.get('dependencies', {}) or 'react' in package_data.get('devDependencies', {}):
+            paths.append(path)
+    return paths
+
+async def build_all_react_projects(request: Request, token, owner: str, repo: str):
+    """Build every React project of a monorepo from one download, each deployed to its own prefix"""
+    started_at = time.perf_counter()
+    headers = {'Authorization': f'token {token["access_token"]}'}
+    force = request.query_params.get("force", "").lower() in ("1", "true", "yes")
+    
+    try:
+        ref = request.query_params.get("ref") or "HEAD"
+        sha = await asyncio.to_thread(resolve_commit_sha, headers, owner, repo, ref)
+        if not sha:
+            return JSONResponse({"success": False, "error": "Failed to resolve repository commit"}, status_code=400)
+        
+        trace = BuildTrace()
+        archive, error = await asyncio.to_thread(fetch_source_archive, headers, owner, repo, sha, trace)
+    except GitHubRateLimited as e:
+        return rate_limited_response(e)
+    if error:
+        payload, status_code = error
+        return JSONResponse(payload, status_code=status_code)
+    
+    requested = request.query_params.get("paths")
+    if requested:
+        project_paths = [p.strip().strip("/") for p in requested.split(",") if p.strip()]
+    else:
+        project_paths = detect_react_projects(archive)
+    if not project_paths:
+        return JSONResponse({
+            "success": False,
+            "error": "No React projects found in root or subdirectories"
+        }, status_code=400)
+    
+    # Builds run concurrently; admission.slot("build") inside each pipeline enforces the limits
+    results = await asyncio.gather(*[
+        start_build(headers, owner, repo, project_path, sha, force=force, per_project=True, archive=archive, ref=ref)
+        for project_path in project_paths
+    ], return_exceptions=True)
+    
+    projects = []
+    for project_path, result in zip(project_paths, results):
+        if isinstance(result, GitHubRateLimited):
+            payload, status_code = {"success": False, "error": str(result), "retry_after": result.retry_after}, 429
+        elif isinstance(result, Exception):
+            payload, status_code = {"success": False, "error": str(result)}, 500
+        else:
+            payload, status_code = result
+        if status_code == 200:
+            deployments.remember_frontend(owner, repo, project_path, token, per_project=True)
+        projects.append({
+            "project_path": project_path,
+            "status_code": status_code,
+            "success": status_code == 200,
+            "build_id": payload.get("build_id"),
+            "s3_url": payload.get("s3_url"),
+            "site_url": payload.get("site_url"),
+            "file_count": payload.get("file_count", 0),
+            "cache_hit": payload.get("cache_hit", False),
+            "coalesced": payload.get("coalesced", False),
+            "duration_ms": payload.get("duration_ms"),
+            "error": payload.get("error")
+        })
+    
+    succeeded = sum(1 for p in projects if p["success"])
+    if succeeded == len(projects):
+        status_code = 200
+    elif succeeded:
+        status_code = 207
+    else:
+        status_code = max(p["status_code"] for p in projects)
+    
+    return JSONResponse({
+        "success": succeeded == len(projects),
+        "commit_sha": sha,
+        "built": succeeded,
+        "failed": len(projects) - succeeded,
+        "download": trace.to_dict(),
+        "duration_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        "projects": projects
+    }, status_code=status_code)
+
+def resolve_commit_sha(headers, owner: str, repo: str, ref: str = "HEAD"):
+    """Resolve a branch, tag or HEAD to the commit SHA that will be built"""
+    response = github_session.get(
+        f'{GITHUB_API_URL}/repos/{owner}/{repo}/commits/{ref}',
+        headers={**headers, 'Accept': 'application/vnd.github.sha'}
+    )
+    if response.status_code != 200:
+        return None
+    return response.text.strip()
+
+subtree_sha_cache = {}
+
+def resolve_subtree_sha(headers, owner: str, repo: str, sha: str, project_path: str):
+    """Git tree SHA of project_path at a commit, i.e. a content hash of the whole subtree"""
+    cache_key = (owner, repo, sha, project_path or "")
+    if cache_key in subtree_sha_cache:
+        return subtree_sha_cache[cache_key]
+    
+    response = github_session.get(f'{GITHUB_API_URL}/repos/{owner}/{repo}/git/commits/{sha}', headers=headers)
+    if response.status_code != 200:
+        return None
+    tree_sha = response.json()["tree"]["sha"]
+    
+    for part in [p for p in (project_path or "").split("/") if p]:
+        response = github_session.get(f'{GITHUB_API_URL}/repos/{owner}/{repo}/git/trees/{tree_sha}', headers=headers)
         if response.status_code != 200:
-            return JSONResponse({"success": False, "error": "Failed to download repository"}, status_code=400)
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            zip_path = os.path.join(temp_dir, f"{repo}.zip")
-            extract_path = os.path.join(temp_dir, "extracted")
-            build_output = os.path.join(temp_dir, "build_output")
-            os.makedirs(build_output)
-            
-            with open(zip_path, 'wb') as f:
-                f.write(response.content)
-            
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_path)
-            
-            extracted_folders = os.listdir(extract_path)
-            if not extracted_folders:
-                return JSONResponse({"success": False, "error": "No files extracted"}, status_code=400)
-            
-            repo_base_path = os.path.join(extract_path, extracted_folders[0])
-            
-            if project_path:
-                repo_path = os.path.join(repo_base_path, project_path)
-                print(f"React project found in subdirectory: {project_path}")
+            return None
+        match = next((
+            entry for entry in response.json().get("tree", [])
+            if entry["path"] == part and entry["type"] == "tree"
+        ), None)
+        if not match:
+            return None
+        tree_sha = match["sha"]
+    
+    if len(subtree_sha_cache) > 1000:
+        subtree_sha_cache.clear()
+    subtree_sha_cache[cache_key] = tree_sha
+    return tree_sha
+
+def build_settings():
+    """Everything besides the source tree that affects build output"""
+    return {
+        "image": BUILDER_IMAGE,
+        "backend": BUILD_BACKEND,
+        "version": BUILD_SETTINGS_VERSION,
+    }
+
+async def serve_cached_build(entry, state: str, owner: str, repo: str, cache_key: str, trace: BuildTrace,
+                             s3_prefix: str):
+    """Answer a build request from a previous build of identical source, deploying it to s3_prefix if needed"""
+    s3_urls = entry.get("s3_files", [])
+    file_count = entry.get("file_count", 0)
+    
+    version = None
+    if state == "local":
+        # The deploy target moved on but the local artifacts are intact: switch back to a retained
+        # version holding this build, or redeploy them as a new version
+        with trace.span("configure_spa_routing"):
+            await configure_s3_for_spa_routing()
+        with trace.span("upload") as upload_stats:
+            live = await asyncio.to_thread(switch_to_retained, s3_prefix, entry.get("digest"))
+            if live:
+                upload_stats["switched"] = True
             else:
-                repo_path = repo_base_path
-                print("React project found in root directory")
-            
-            if not os.path.exists(repo_path):
-                return JSONResponse({
-                    "success": False,
-                    "error": f"Project path not found: {project_path}"
-                }, status_code=400)
-            
-         
-            validation = await validate_react_project(repo_path)
-            if not validation["valid"]:
-                return JSONResponse({
-                    "success": False,
-                    "error": validation["error"],
-                    "details": validation.get("details", ""),
-                    "suggestion": validation.get("suggestion", "")
-                }, status_code=400)
-            
-            print(f"Project validation passed: {validation['project_type']}")
-            
-            await fix_node_compatibility_issues(repo_path)
-            
-            build_result = await build_react_in_docker(repo_path, build_output, owner, repo)
-            
-            if build_result["success"]:
-                server_build_dir = f"./builds/{owner}_{repo}"
-                os.makedirs(server_build_dir, exist_ok=True)
-                
-                s3_source_folder = None
-                
-                if os.path.exists(build_output) and os.listdir(build_output):
-                    if os.path.exists(os.path.join(build_output, "index.html")):
-                        print(f"Found index.html in build_output directory")
-                        s3_source_folder = build_output
-                    else:
-                        possible_build_dirs = [
-                            os.path.join(build_output, "build"),  
-                            os.path.join(build_output, "dist"),   
-                        ]
-                        
-                        for build_dir in possible_build_dirs:
-                            if os.path.exists(build_dir) and os.path.isdir(build_dir):
-                                if os.path.exists(os.path.join(build_dir, "index.html")):
-                                    print(f"Found build directory: {build_dir}")
-                                    s3_source_folder = build_dir
-                                    break
-                    
-                    if not s3_source_folder:
-                        print("No specific build folder found, using build_output directly")
-                        s3_source_folder = build_output
-                    
-                    print(f"Copying from {s3_source_folder} to {server_build_dir}")
-                    shutil.copytree(s3_source_folder, server_build_dir, dirs_exist_ok=True)
-                    
-                    static_folder = os.path.join(s3_source_folder, "static")
-                    if os.path.exists(static_folder) and os.path.isdir(static_folder):
-                        print(f"Ensuring static folder is copied properly")
-                        static_server_dir = os.path.join(server_build_dir, "static")
-                        os.makedirs(static_server_dir, exist_ok=True)
-                        shutil.copytree(static_folder, static_server_dir, dirs_exist_ok=True)
-                
-                s3_prefix = f"projects/{owner}/{repo}"
-                print(f"Starting S3 upload from {s3_source_folder} to {s3_prefix}")
-                
-                
-                await configure_s3_for_spa_routing()
-                
-                s3_urls = upload_folder_to_s3(s3_source_folder, s3_prefix)
-                s3_base_url = f"{S3_BASE_URL}projects/{owner}/{repo}/" if S3_BASE_URL else None
-                
-                print(f"S3 upload complete, got {len(s3_urls)} files")
-                return {
-                    "success": True,
-                    "message": f"Project {owner}/{repo} built successfully",
-                    "build_path": server_build_dir,
-                    "build_id": f"{owner}_{repo}",
-                    "logs": build_result["logs"],
-                    "s3_url": s3_base_url,
-                    "s3_files": s3_urls[:5] if s3_urls else [],
-                    "file_count": len(s3_urls) if s3_urls else 0
-                }
+                uploaded = await asyncio.to_thread(upload_folder_to_s3, entry["build_path"], s3_prefix, upload_stats, {
+                    "commit_sha": entry.get("commit_sha"), "digest": entry.get("digest"), "cache_key": cache_key
+                })
+                if uploaded:
+                    s3_urls = uploaded[:5]
+                    file_count = len(uploaded)
+            version = live["version"] if live else upload_stats.get("version")
+        if version:
+            build_cache.mark_deployed(cache_key, s3_prefix)
+    
+    return {
+        "success": True,
+        "message": f"Project {owner}/{repo} is unchanged, reused previous build",
+        "build_path": entry["build_path"],
+        "build_id": entry["build_id"],
+        "logs": [],
+        "s3_url": f"{S3_BASE_URL}{s3_prefix}/" if S3_BASE_URL else None,
+        "s3_files": s3_urls,
+        "file_count": file_count,
+        "cache_hit": True,
+        "cache_state": state,
+        "version": version,
+        "cached_commit_sha": entry.get("commit_sha")
+    }
+
+def deploy_target(owner: str, repo: str, project_path: str, per_project: bool = False):
+    """(build_id, s3_prefix) a build is deployed to; per_project gives each project of a monorepo its own"""
+    path = (project_path or "").strip("/")
+    if per_project and path:
+        return f"{owner}_{repo}__{path.replace('/', '_')}", f"projects/{owner}/{repo}/{path}"
+    return f"{owner}_{repo}", f"projects/{owner}/{repo}"
+
+async def start_build(headers, owner: str, repo: str, project_path: str, sha: str, force: bool = False,
+                      per_project: bool = False, archive: SourceArchive = None, ref: str = "HEAD"):
+    """Build a commit, reusing an identical previous build or one already in flight.
+
+    archive is an already downloaded zipball of sha, shared between the builds of a monorepo.
+    ref is what sha was resolved from; a queued build is only superseded by a newer commit of the same ref.
+    """
+    started_at = time.perf_counter()
+    build_id, s3_prefix = deploy_target(owner, repo, project_path, per_project)
+    
+    cache_key = None
+    trace = BuildTrace()
+    with trace.span("resolve_tree"):
+        tree_sha = await asyncio.to_thread(resolve_subtree_sha, headers, owner, repo, sha, project_path)
+    if tree_sha:
+        cache_key = build_cache_key(tree_sha, build_settings())
+        if not force:
+            entry, state = build_cache.lookup(cache_key, s3_prefix)
+            if entry:
+                payload = await serve_cached_build(entry, state, owner, repo, cache_key, trace, s3_prefix)
+                builds.inc(outcome="cache_hit")
+                build_history.record(owner, repo, project_path, sha, "cache_hit", 200, trace)
+                payload["commit_sha"] = sha
+                payload["site_url"] = site_path_for(owner, repo, project_path if per_project else "")
+                payload["coalesced"] = False
+                payload["duration_ms"] = round((time.perf_counter() - started_at) * 1000, 1)
+                return payload, 200
+    
+    async def pipeline(job):
+        try:
+            if BUILD_EXECUTOR == "queue":
+                payload, status_code = await run_remote_build(
+                    headers, owner, repo, project_path, sha, job, trace, cache_key, tree_sha, per_project
+                )
             else:
-                return JSONResponse({
-                    "success": False,
-                    "error": build_result["error"],
-                    "logs": build_result["logs"]
-                }, status_code=400)
-                
+                payload, status_code = await run_build_pipeline(
+                    headers, owner, repo, project_path, sha, job, trace, cache_key, tree_sha, per_project, archive
+                )
+        except Exception as e:
+            build_history.record(owner, repo, project_path, sha, "failed", 500, trace, str(e))
+            raise
+        build_history.record(
+            owner, repo, project_path, sha,
+            "success" if status_code == 200 else "failed", status_code, trace, payload.get("error")
+        )
+        return payload, status_code
+    
+    (payload, status_code), job, coalesced = await build_coalescer.run(
+        owner, repo, sha, project_path, pipeline, target=s3_prefix, ref=ref
+    )
+    if coalesced:
+        builds.inc(outcome="coalesced")
+    else:
+        builds.inc(outcome="success" if status_code == 200 else "failed")
+    payload = {
+        **payload,
+        "commit_sha": job.sha,
+        "coalesced": coalesced,
+        "duration_ms": round((time.perf_counter() - started_at) * 1000, 1)
+    }
+    if job.sha != sha:
+        payload["superseded_commit_sha"] = sha
+    return payload, status_code
+
+def fetch_source_archive(headers, owner: str, repo: str, sha: str, trace: BuildTrace):
+    """Download and open the zipball of a commit; returns (archive, None) or (None, (payload, status_code))"""
+    zip_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/zipball/{sha}'
+    
+    with trace.span("download") as download_stats:
+        response = github_session.get(zip_url, headers=headers)
+        download_stats["bytes"] = len(response.content)
+    if response.status_code != 200:
+        return None, ({"success": False, "error": "Failed to download repository"}, 400)
+    
+    with trace.span("extract") as extract_stats:
+        try:
+            archive = SourceArchive(response.content)
+        except zipfile.BadZipFile:
+            return None, ({"success": False, "error": "Downloaded archive is not a valid zip file"}, 400)
+        extract_stats.update(archive.stats())
+    if archive.is_empty():
+        return None, ({"success": False, "error": "No files extracted"}, 400)
+    return archive, None
+
+async def run_build_pipeline(headers, owner: str, repo: str, project_path: str, sha: str, job,
+                             trace: BuildTrace, cache_key=None, tree_sha=None, per_project: bool = False,
+                             archive: SourceArchive = None):
+    """Download, build and deploy one commit; returns (payload, status_code)"""
+    if archive is None:
+        archive, error = await asyncio.to_thread(fetch_source_archive, headers, owner, repo, sha, trace)
+        if error:
+            return error
+    
+    if project_path and not archive.has_dir(project_path):
+        return {
+            "success": False,
+            "error": f"Project path not found: {project_path}"
+        }, 400
+    
+    package_json = archive.read(project_path, "package.json")
+    with trace.span("validate"):
+        validation = validate_package_json(package_json)
+    if not validation["valid"]:
+        return {
+            "success": False,
+            "error": validation["error"],
+            "details": validation.get("details", ""),
+            "suggestion": validation.get("suggestion", "")
+        }, 400
+    
+    log.info("Project validation passed", owner=owner, repo=repo, project_path=project_path,
+             project_type=validation['project_type'])
+    
+    with trace.span("fix_compat"):
+        overrides = node_compatibility_fixes(package_json)
+    
+    with tempfile.TemporaryDirectory(prefix=TEMP_PREFIX) as temp_dir:
+        source_tar = None
+        repo_path = os.path.join(temp_dir, "source")
+        if BUILD_BACKEND == "buildkit":
+            with trace.span("package_source") as package_stats:
+                dependency_files = [
+                    name for name in ("package.json", *buildkit.LOCKFILES, ".npmrc")
+                    if name in overrides or archive.read(project_path, name) is not None
+                ]
+                source_tar = archive.to_tar(
+                    project_path, "", {**overrides, **buildkit.context_files(BUILDER_IMAGE, dependency_files)}
+                )
+                package_stats["bytes"] = len(source_tar)
+        elif BUILD_SOURCE_MODE == "bind":
+            with trace.span("write_source"):
+                archive.extract(project_path, repo_path, overrides)
+        else:
+            with trace.span("package_source") as package_stats:
+                source_tar = archive.to_tar(project_path, "app", overrides)
+                package_stats["bytes"] = len(source_tar)
+        
+        build_id, s3_prefix = deploy_target(owner, repo, project_path, per_project)
+        server_build_dir = f"./builds/{build_id}"
+        os.makedirs("./builds", exist_ok=True)
+        version = new_version(sha)
+        artifacts = ArtifactPipeline(server_build_dir, s3_uploader(version_prefix(s3_prefix, version)))
+        try:
+            async with admission.slot("build") as ticket:
+                job.state = "running"
+                trace.add("queue_wait", ticket.wait_seconds)
+                with trace.span("container"):
+                    if BUILD_BACKEND == "buildkit":
+                        build_result = await build_react_with_buildkit(source_tar, trace, artifacts)
+                    else:
+                        build_result = await build_react_in_docker(repo_path, owner, repo, trace, source_tar, artifacts)
+        except AdmissionTimeout as e:
+            artifacts.discard()
+            trace.add("queue_wait", e.waited)
+            return {
+                "success": False,
+                "error": str(e),
+                "queue": admission.stats()["kinds"]["build"]
+            }, 503
+    
+    if not build_result["success"]:
+        artifacts.discard()
+        return {
+            "success": False,
+            "error": build_result["error"],
+            "timings": trace.to_dict(),
+            "logs": build_result["logs"]
+        }, 400
+    
+    with trace.span("configure_spa_routing"):
+        await configure_s3_for_spa_routing()
+    
+    if not await asyncio.to_thread(job.current):
+        # A newer build took over while this one ran; an older commit must not replace it
+        artifacts.discard()
+        return {"success": False, "error": "Build was withdrawn before it could be published"}, 409
+    
+    # Assets are already uploading; this waits for them, uploads the entry points and swaps the local store
+    with trace.span("publish") as publish_stats:
+        output = await asyncio.to_thread(artifacts.finish)
+        publish_stats.update(files=output["files"], uploaded=len(output["uploaded"]), failed=len(output["failed"]))
+        live = None
+        if output["uploaded"] and not output["failed"] and await asyncio.to_thread(job.current):
+            # Only a complete upload goes live; otherwise the previous version keeps serving
+            live = await asyncio.to_thread(publish_version, s3_prefix, version, server_build_dir, {
+                "commit_sha": sha, "digest": output["digest"], "cache_key": cache_key, "project_path": project_path
+            })
+        publish_stats["switched"] = live is not None
+    s3_urls = output["uploaded"]
+    s3_base_url = f"{S3_BASE_URL}{s3_prefix}/" if S3_BASE_URL else None
+    
+    log.info("Build deployed", owner=owner, repo=repo, sha=sha, project_path=project_path,
+             files=len(s3_urls), s3_prefix=s3_prefix, version=version if live else None, digest=output["digest"],
+             queue_wait_seconds=round(ticket.wait_seconds, 3))
+    
+    payload = {
+        "success": True,
+        "message": f"Project {owner}/{repo} built successfully",
+        "project_path": project_path,
+        "build_path": server_build_dir,
+        "build_id": build_id,
+        "queue_wait_seconds": round(ticket.wait_seconds, 3),
+        "timings": trace.to_dict(),
+        "logs": build_result["logs"],
+        "s3_url": s3_base_url,
+        "s3_files": s3_urls[:5] if s3_urls else [],
+        "file_count": len(s3_urls) if s3_urls else 0,
+        "digest": output["digest"],
+        "version": version if live else None,
+        "site_url": site_path_for(owner, repo, project_path if per_project else ""),
+        "cache_hit": False
+    }
+    if cache_key:
+        build_cache.store(cache_key, s3_prefix, build_cache_entry(owner, repo, sha, tree_sha, s3_prefix, payload))
+    return payload, 200
+
+def build_cache_entry(owner: str, repo: str, sha: str, tree_sha, s3_prefix: str, payload: dict):
+    """Build cache entry for the payload of a successful build"""
+    return {
+        "owner": owner,
+        "repo": repo,
+        "project_path": payload["project_path"],
+        "commit_sha": sha,
+        "tree_sha": tree_sha,
+        "build_id": payload["build_id"],
+        "build_path": payload["build_path"],
+        "s3_prefix": s3_prefix,
+        "s3_url": payload["s3_url"],
+        "s3_files": payload["s3_files"],
+        "file_count": payload["file_count"],
+        "digest": payload["digest"],
+        "deployed": payload["version"] is not None
+    }
+
+async def run_remote_build(headers, owner: str, repo: str, project_path: str, sha: str, job, trace: BuildTrace,
+                           cache_key=None, tree_sha=None, per_project: bool = False):
+    """Hand a build to a worker through the build queue and wait for its result; returns (payload, status_code)"""
+    queue = get_job_queue()
+    job_id = await asyncio.to_thread(queue.submit, {
+        "owner": owner,
+        "repo": repo,
+        "project_path": project_path,
+        "sha": sha,
+        "per_project": per_project,
+        "cache_key": cache_key,
+        "tree_sha": tree_sha,
+        # Workers download the source as the requesting user
+        "authorization": headers["Authorization"]
+    })
+    deadline = time.monotonic() + BUILD_JOB_TIMEOUT
+    record = None
+    with trace.span("remote_build", job_id=job_id) as remote_stats:
+        try:
+            while time.monotonic() < deadline:
+                record = await asyncio.to_thread(queue.get, job_id)
+                if record is None or record["state"] in FINISHED:
+                    break
+                if record["state"] == LEASED:
+                    job.state = "running"
+                await asyncio.sleep(BUILD_QUEUE_POLL_SECONDS)
+        finally:
+            # On every way out, including supersession and timeouts: deleting the job drops the user's
+            # credentials and revokes the lease, so a worker still building it does not publish
+            await asyncio.to_thread(queue.remove, job_id)
+        result = (record or {}).get("result")
+        remote_stats.update(worker=(record or {}).get("worker"), attempts=(record or {}).get("attempts"))
+        if result:
+            trace.graft(result.get("trace", []))
+    
+    if not result:
+        return {
+            "success": False,
+            "error": f"No build worker finished the build within {BUILD_JOB_TIMEOUT:.0f}s",
+            "job_id": job_id
+        }, 504
+    
+    if result.get("retry_after"):
+        raise GitHubRateLimited(result["retry_after"], result["payload"].get("error"))
+    payload, status_code = result["payload"], result["status_code"]
+    if "timings" in payload:
+        payload["timings"] = trace.to_dict()
+    payload["worker"] = record["worker"]
+    if status_code == 200 and cache_key:
+        # Deployed builds are served from the cache here; the build directory is the worker's, not ours
+        s3_prefix = deploy_target(owner, repo, project_path, per_project)[1]
+        build_cache.store(cache_key, s3_prefix, build_cache_entry(owner, repo, sha, tree_sha, s3_prefix, payload),
+                          local=False)
+    return payload, status_code
+
+@project_router.get("/build-queue")
+async def get_build_queue(request: Request):
+    """List builds currently in flight and how many requests are attached to each"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    builds = build_coalescer.in_flight()
+    return {"builds": builds, "total_in_flight": len(builds)}
+
+@project_router.get("/workers")
+async def get_build_workers(request: Request):
+    """Build workers with a recent heartbeat and the jobs waiting for them"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    if BUILD_EXECUTOR != "queue":
+        return {"executor": BUILD_EXECUTOR, "workers": [], "queue": None}
+    queue = get_job_queue()
+    workers = await asyncio.to_thread(queue.workers)
+    return {
+        "executor": BUILD_EXECUTOR,
+        "workers": workers,
+        "capacity": sum(worker.get("capacity", 0) for worker in workers),
+        "running": sum(worker.get("running", 0) for worker in workers),
+        "queue": await asyncio.to_thread(queue.stats)
+    }
+
+@project_router.get("/janitor")
+async def get_janitor(request: Request):
+    """Disk usage, disk pressure and the report of the last cleanup pass"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    return await asyncio.to_thread(janitor.stats)
+
+@project_router.post("/janitor/run")
+async def run_janitor(request: Request):
+    """Run a cleanup pass now and return its report"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    report = await asyncio.to_thread(janitor.run_pass, "manual")
+    await asyncio.to_thread(janitor.check_pressure)
+    return report
+
+@project_router.get("/wheel-cache")
+async def get_wheel_cache(request: Request):
+    """Wheel sets cached for Python backends, cache hit rate and install durations"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    return await asyncio.to_thread(wheel_cache.stats)
+
+@project_router.get("/container-pool")
+async def get_container_pool(request: Request):
+    """Idle pre-started containers per kind, pinned images and pool hit rates"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    return container_pool.stats()
+
+@project_router.get("/build-history/{owner}/{repo}")
+async def get_build_history(request: Request, owner: str, repo: str, limit: int = 20, project_path: str = None):
+    """Recent builds of a repository with their per-phase timing breakdown"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+
+    history = build_history.recent(owner, repo, max(1, min(limit, 100)), project_path)
+    return {"owner": owner, "repo": repo, "builds": history, "count": len(history)}
+
+@project_router.get("/deploys/{owner}/{repo}")
+async def list_deploys(request: Request, owner: str, repo: str, project_path: str = None):
+    """Retained deploy versions of a repository (or of one project of a monorepo) and which one is live"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    store = deploy_store()
+    if not store:
+        return JSONResponse({"error": "S3 not configured", "configured": False}, status_code=400)
+    
+    _, s3_prefix = deploy_target(owner, repo, project_path, per_project=bool(project_path))
+    try:
+        live, versions = await asyncio.gather(
+            asyncio.to_thread(store.live, s3_prefix), asyncio.to_thread(store.versions, s3_prefix)
+        )
     except Exception as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    
+    live_version = (live or {}).get("version")
+    for stored in versions:
+        stored["live"] = stored["version"] == live_version
+    return {
+        "owner": owner,
+        "repo": repo,
+        "s3_prefix": s3_prefix,
+        "live": live,
+        "versions": versions,
+        "count": len(versions)
+    }
+
+@project_router.post("/rollback/{owner}/{repo}")
+async def rollback_deploy(request: Request, owner: str, repo: str, version: str, project_path: str = None):
+    """Point the live site at a retained version; nothing is rebuilt or re-uploaded"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    store = deploy_store()
+    if not store:
+        return JSONResponse({"error": "S3 not configured", "configured": False}, status_code=400)
+    
+    _, s3_prefix = deploy_target(owner, repo, project_path, per_project=bool(project_path))
+    try:
+        live = await asyncio.to_thread(store.switch, s3_prefix, version)
+    except KeyError:
         return JSONResponse({
             "success": False,
-            "error": str(e)
-        }, status_code=500)
+            "error": f"Version {version} is not retained for {s3_prefix}"
+        }, status_code=404)
+    except Exception as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    
+    build_cache.mark_deployed(live.get("cache_key"), s3_prefix)
+    log.info("Deploy rolled back", owner=owner, repo=repo, s3_prefix=s3_prefix,
+             version=version, previous=live["previous_version"])
+    
+    return {
+        "success": True,
+        "message": f"{s3_prefix} now serves version {version}",
+        "s3_url": f"{S3_BASE_URL}{s3_prefix}/" if S3_BASE_URL else None,
+        "live": live
+    }
 
 @project_router.get("/builds")
 async def list_builds(request: Request):
@@ -678,8 +1319,9 @@ async def list_builds(request: Request):
     builds = []
     for build_folder in os.listdir(builds_dir):
         build_path = os.path.join(builds_dir, build_folder)
-        if os.path.isdir(build_path):
-            files = os.listdir(build_path)
+        # Dot-directories are builds still being written
+        if os.path.isdir(build_path) and not build_folder.startswith('.'):
+            files = [name for name in os.listdir(build_path) if not name.startswith('.')]
             has_index = 'index.html' in files
             builds.append({
                 "id": build_folder,
@@ -708,12 +1350,7 @@ async def get_s3_hosting_info(request: Request, owner: str, repo: str):
     s3_base_url = f"{S3_BASE_URL}projects/{owner}/{repo}/"
     
     try:
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION,
-        )
+        s3 = get_s3_client()
         
         response = s3.list_objects_v2(
             Bucket=S3_BUCKET_NAME,
@@ -777,6 +1414,7 @@ async def delete_build(request: Request, build_id: str):
     if os.path.exists(build_path):
         try:
             shutil.rmtree(build_path)
+            build_cache.forget_local(build_path)
             return {"success": True, "message": f"Build {build_id} deleted"}
         except Exception as e:
             return JSONResponse({"success": False, "error": str(e)}, status_code=500)
@@ -785,11 +1423,12 @@ async def delete_build(request: Request, build_id: str):
 
 @project_router.post("/run-backend/{owner}/{repo}")
 async def run_backend_project(request: Request, owner: str, repo: str):
-    """Run a backend project (Node.js or Python) in a Docker container"""
+    """Run a backend project (Node.js or Python) in a Docker container; wait=true answers once it is ready"""
     token = request.session.get('token')
     if not token:
         return JSONResponse({"error": "Not authenticated"}, status_code=401)
     
+    docker_client = await docker_client_async()
     if not docker_client:
         return JSONResponse({
             "success": False,
@@ -798,6 +1437,8 @@ async def run_backend_project(request: Request, owner: str, repo: str):
     
     
     backend_check = await check_if_backend_project(request, owner, repo)
+    if isinstance(backend_check, Response):
+        return backend_check
     if not backend_check["is_backend"]:
         return JSONResponse({
             "success": False,
@@ -814,120 +1455,306 @@ async def run_backend_project(request: Request, owner: str, repo: str):
         try:
             container = docker_client.containers.get(container_info["container_id"])
             if container.status == "running":
-                return {
+                return await backend_ready_response(request, owner, repo, {
                     "success": True,
                     "message": "Backend is already running",
                     "container_id": container_info["container_id"],
                     "local_url": container_info["local_url"],
+                    "proxy_url": backend_proxy_url(request, owner, repo),
                     "port": container_info["port"],
                     "backend_type": backend_type
-                }
+                })
         except:
             
-            del running_backend_containers[container_key]
+            unregister_backend(container_key)
     
     try:
-        
         headers = {'Authorization': f'token {token["access_token"]}'}
-        zip_url = f'https://api.github.com/repos/{owner}/{repo}/zipball'
-        
-        response = requests.get(zip_url, headers=headers)
-        if response.status_code != 200:
-            return JSONResponse({"success": False, "error": "Failed to download repository"}, status_code=400)
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            zip_path = os.path.join(temp_dir, f"{repo}.zip")
-            extract_path = os.path.join(temp_dir, "extracted")
-            
-            with open(zip_path, 'wb') as f:
-                f.write(response.content)
-            
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_path)
-            
-            extracted_folders = os.listdir(extract_path)
-            if not extracted_folders:
-                return JSONResponse({"success": False, "error": "No files extracted"}, status_code=400)
-            
-            repo_base_path = os.path.join(extract_path, extracted_folders[0])
-            
-            if project_path:
-                repo_path = os.path.join(repo_base_path, project_path)
-            else:
-                repo_path = repo_base_path
-            
-            if not os.path.exists(repo_path):
-                return JSONResponse({
-                    "success": False,
-                    "error": f"Project path not found: {project_path}"
-                }, status_code=400)
-            
-            
-            import socket
-            def find_free_port():
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.bind(('', 0))
-                    s.listen(1)
-                    port = s.getsockname()[1]
-                return port
-            
-            port = find_free_port()
-            
-            
-            if backend_type == "nodejs":
-                container = await run_nodejs_container(repo_path, port, owner, repo)
-            elif backend_type == "python":
-                container = await run_python_container(repo_path, port, owner, repo)
-            else:
-                return JSONResponse({
-                    "success": False,
-                    "error": f"Unsupported backend type: {backend_type}"
-                }, status_code=400)
-            
-            if container:
-                local_url = f"http://localhost:{port}"
-                
-                
-                running_backend_containers[container_key] = {
-                    "container_id": container.id,
-                    "port": port,
-                    "local_url": local_url,
-                    "backend_type": backend_type,
-                    "owner": owner,
-                    "repo": repo,
-                    "started_at": time.time()
-                }
-                
-                
-                def monitor_container():
-                    try:
-                        container.wait()
-                    except:
-                        pass
-                    finally:
-                        cleanup_container(container.id)
-                
-                threading.Thread(target=monitor_container, daemon=True).start()
-                
-                return {
-                    "success": True,
-                    "message": f"Backend {owner}/{repo} is now running",
-                    "container_id": container.id,
-                    "local_url": local_url,
-                    "port": port,
-                    "backend_type": backend_type
-                }
-            else:
-                return JSONResponse({
-                    "success": False,
-                    "error": "Failed to start container"
-                }, status_code=500)
-                
+        payload, status_code = await start_backend(headers, owner, repo, project_path, backend_type)
+    except GitHubRateLimited as e:
+        return rate_limited_response(e)
     except Exception as e:
         return JSONResponse({
             "success": False,
             "error": str(e)
         }, status_code=500)
+    
+    if status_code != 200:
+        return JSONResponse(payload, status_code=status_code)
+    deployments.remember_backend(owner, repo, project_path, backend_type, token)
+    payload["proxy_url"] = backend_proxy_url(request, owner, repo)
+    return await backend_ready_response(request, owner, repo, payload)
+
+async def backend_ready_response(request: Request, owner: str, repo: str, payload: dict):
+    """Add the backend's readiness to payload, first waiting for it to settle when the request asks to"""
+    container_info = running_backend_containers.get(f"{owner}_{repo}", {})
+    readiness = container_info.get("readiness")
+    if readiness and request.query_params.get("wait", "").lower() in ("1", "true", "yes"):
+        # The probe settles by its own deadline; the margin covers its last check
+        state = await readiness.wait(BACKEND_READY_TIMEOUT + 2 * BACKEND_READY_PROBE_TIMEOUT)
+        if state == READY and payload["message"].endswith("is starting"):
+            payload["message"] = f"Backend {owner}/{repo} is now running"
+        elif state == FAILED:
+            return JSONResponse({
+                **payload,
+                "success": False,
+                "error": readiness.error,
+                "readiness": readiness.to_dict()
+            }, status_code=502)
+    payload["readiness"] = readiness_of(container_info)
+    return payload
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('', 0))
+        s.listen(1)
+        port = s.getsockname()[1]
+    return port
+
+BACKEND_IMAGES = {"nodejs": "node:18-alpine", "python": "python:3.11-alpine"}
+
+def backend_container_options():
+    """Backends publish one host port, so each pooled backend container reserves its own"""
+    port = find_free_port()
+    return {
+        "ports": {f"{port}/tcp": (BACKEND_BIND_HOST, port)},
+        "working_dir": "/app",
+        **container_limits("backend")
+    }, {"port": port}
+
+container_pool.register(
+    "build", BUILDER_IMAGE, CONTAINER_POOL_SIZE if BUILD_BACKEND == "container" and BUILD_EXECUTOR == "local" else 0,
+    lambda: ({"working_dir": "/app", **container_limits("build")}, {})
+)
+for backend_type, image in BACKEND_IMAGES.items():
+    container_pool.register(f"backend-{backend_type}", image, CONTAINER_POOL_BACKEND_SIZE, backend_container_options)
+
+async def start_backend(headers, owner: str, repo: str, project_path: str, backend_type: str, ref: str = None,
+                        replacing: bool = False):
+    """Download a commit (default branch when ref is None) and start its backend; returns (payload, status_code)
+
+    With replacing, the new backend is kept in starting_backends instead of being routed to; restart_backend swaps it in.
+    """
+    container_key = f"{owner}_{repo}"
+    zip_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/zipball'
+    if ref:
+        zip_url += f'/{ref}'
+    
+    response = await asyncio.to_thread(github_session.get, zip_url, headers=headers)
+    if response.status_code != 200:
+        return {"success": False, "error": "Failed to download repository"}, 400
+    
+    with tempfile.TemporaryDirectory(prefix=TEMP_PREFIX) as temp_dir:
+        zip_path = os.path.join(temp_dir, f"{repo}.zip")
+        extract_path = os.path.join(temp_dir, "extracted")
+        
+        with open(zip_path, 'wb') as f:
+            f.write(response.content)
+        
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(extract_path)
+        
+        extracted_folders = os.listdir(extract_path)
+        if not extracted_folders:
+            return {"success": False, "error": "No files extracted"}, 400
+        
+        repo_base_path = os.path.join(extract_path, extracted_folders[0])
+        
+        if project_path:
+            repo_path = os.path.join(repo_base_path, project_path)
+        else:
+            repo_path = repo_base_path
+        
+        if not os.path.exists(repo_path):
+            return {
+                "success": False,
+                "error": f"Project path not found: {project_path}"
+            }, 400
+        
+        if backend_type not in ("nodejs", "python"):
+            return {
+                "success": False,
+                "error": f"Unsupported backend type: {backend_type}"
+            }, 400
+        
+        ticket = None
+        if not replacing:
+            # A replacement runs on the slot of the backend it replaces; restart_backend hands it over
+            try:
+                ticket = await admission.acquire("backend")
+            except AdmissionTimeout as e:
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "queue": admission.stats()["kinds"]["backend"]
+                }, 503
+        
+        wheels = None
+        if backend_type == "nodejs":
+            container, port = await run_nodejs_container(repo_path, owner, repo)
+        else:
+            requirements_path = os.path.join(repo_path, "requirements.txt")
+            if os.path.exists(requirements_path):
+                with open(requirements_path, 'rb') as f:
+                    requirements = f.read()
+                image = container_pool.image_ref("backend-python")
+                wheels = wheel_cache.lookup(requirements, image)
+                if wheels and wheels["result"] == "miss":
+                    # This start installs from the index; the next one finds the set
+                    wheel_cache.build_in_background(wheels["key"], requirements, image)
+            container, port = await run_python_container(repo_path, owner, repo, wheels)
+        
+        if not container:
+            admission.release(ticket)
+            return {
+                "success": False,
+                "error": "Failed to start container"
+            }, 500
+        
+        local_url = f"http://localhost:{port}"
+        container_id = container.id
+        # Probing starts at the next await, after the backend is registered below
+        readiness = start_probe(
+            backend_type, backend_upstream_host(), port,
+            lambda: is_tracked(container_key, container_id),
+            owner=owner, repo=repo
+        )
+        
+        container_info = {
+            "container_id": container.id,
+            "port": port,
+            "local_url": local_url,
+            "backend_type": backend_type,
+            "project_path": project_path,
+            "owner": owner,
+            "repo": repo,
+            "started_at": time.time(),
+            "admission_ticket": ticket,
+            "readiness": readiness,
+            "wheels": wheels
+        }
+        if replacing:
+            starting_backends[container_key] = container_info
+        else:
+            register_backend(container_key, container_info)
+        
+        
+        def monitor_container():
+            try:
+                container.wait()
+            except:
+                pass
+            finally:
+                cleanup_container(container.id)
+        
+        threading.Thread(target=monitor_container, daemon=True).start()
+        if wheels:
+            task = asyncio.create_task(watch_pip_install(container_key, container, wheels))
+            backend_tasks.add(task)
+            task.add_done_callback(backend_tasks.discard)
+        
+        return {
+            "success": True,
+            "message": f"Backend {owner}/{repo} is starting" if readiness else f"Backend {owner}/{repo} is now running",
+            "container_id": container.id,
+            "local_url": local_url,
+            "port": port,
+            "backend_type": backend_type,
+            "readiness": readiness.to_dict() if readiness else None,
+            "wheels": wheels,
+            "queue_wait_seconds": round(ticket.wait_seconds, 3) if ticket else 0.0
+        }, 200
+
+async def watch_pip_install(container_key: str, container, wheels: dict):
+    """Poll a Python backend's logs until its dependency install has finished and record how long it took"""
+    delay = 1
+    while is_tracked(container_key, container.id):
+        await asyncio.sleep(delay)
+        try:
+            logs = (await asyncio.to_thread(container.logs)).decode('utf-8', errors='replace')
+        except Exception:
+            return
+        _, phases = split_phase_markers(logs)
+        if "pip_install" in phases:
+            wheels["install_seconds"] = round(phases["pip_install"], 3)
+            wheel_cache.observe_install(wheels["result"], phases["pip_install"])
+            log.info("Python dependencies installed", container_key=container_key, wheel_cache=wheels["result"],
+                     install_seconds=wheels["install_seconds"])
+            return
+        delay = min(delay * 2, 10)
+
+def remove_backend_container(container_id: str):
+    container = get_docker_client().containers.get(container_id)
+    container.stop(timeout=10)
+    container.remove()
+
+def stop_backend(container_key: str):
+    """Stop and remove a tracked backend container"""
+    container_info = running_backend_containers[container_key]
+    try:
+        remove_backend_container(container_info["container_id"])
+    finally:
+        unregister_backend(container_key)
+
+async def restart_backend(headers, owner: str, repo: str, project_path: str, backend_type: str, ref: str = None):
+    """Replace a running backend with one started from ref.
+
+    The new backend starts next to the old one and takes over its route once it is ready; only then is the
+    old one stopped. If the new one fails, the old one keeps serving.
+    """
+    container_key = f"{owner}_{repo}"
+    if container_key not in running_backend_containers:
+        return await start_backend(headers, owner, repo, project_path, backend_type, ref)
+    
+    payload, status_code = await start_backend(headers, owner, repo, project_path, backend_type, ref, replacing=True)
+    if status_code != 200:
+        return payload, status_code
+    new_info = starting_backends.get(container_key)
+    readiness = new_info["readiness"] if new_info else None
+    if readiness:
+        # The probe settles by its own deadline; the margin covers its last check
+        await readiness.wait(BACKEND_READY_TIMEOUT + 2 * BACKEND_READY_PROBE_TIMEOUT)
+    # An exited replacement has already been dropped from starting_backends by its monitor
+    alive = new_info is not None and starting_backends.get(container_key) is new_info
+    if not alive or (readiness and readiness.state != READY):
+        if alive:
+            starting_backends.pop(container_key)
+            try:
+                await asyncio.to_thread(remove_backend_container, new_info["container_id"])
+            except Exception:
+                pass
+        log.warning("Replacement backend not ready, keeping the running one", owner=owner, repo=repo,
+                    error=readiness.error if readiness else None)
+        return {
+            **payload,
+            "success": False,
+            "error": (readiness.error if readiness else None) or "New backend exited before it was ready",
+            "readiness": readiness.to_dict() if readiness else None
+        }, 502
+    
+    # Swap the route, then retire the old backend; its monitor finds nothing left to clean up
+    old_info = running_backend_containers.get(container_key)
+    if old_info:
+        new_info["admission_ticket"], old_info["admission_ticket"] = old_info.get("admission_ticket"), None
+    else:
+        # The old backend exited meanwhile and gave its slot back
+        try:
+            new_info["admission_ticket"] = await admission.acquire("backend")
+        except AdmissionTimeout:
+            pass
+    starting_backends.pop(container_key, None)
+    register_backend(container_key, new_info)
+    if old_info:
+        try:
+            await asyncio.to_thread(remove_backend_container, old_info["container_id"])
+        except Exception as e:
+            log.warning("Could not stop replaced backend", owner=owner, repo=repo,
+                        container_id=old_info["container_id"], error=str(e))
+    return {
+        **payload,
+        "message": f"Backend {owner}/{repo} is now running",
+        "readiness": readiness.to_dict() if readiness else None
+    }, 200
 
 @project_router.get("/backend-status")
 async def get_running_backends(request: Request):
@@ -938,8 +1765,9 @@ async def get_running_backends(request: Request):
     
     running_backends = []
     containers_to_remove = []
+    docker_client = await docker_client_async()
     
-    for container_key, container_info in running_backend_containers.items():
+    for container_key, container_info in list(running_backend_containers.items()):
         try:
             container = docker_client.containers.get(container_info["container_id"])
             running_backends.append({
@@ -947,9 +1775,12 @@ async def get_running_backends(request: Request):
                 "repo": container_info["repo"],
                 "container_id": container_info["container_id"],
                 "local_url": container_info["local_url"],
+                "proxy_url": backend_proxy_url(request, container_info["owner"], container_info["repo"]),
                 "port": container_info["port"],
                 "backend_type": container_info["backend_type"],
                 "status": container.status,
+                "readiness": readiness_of(container_info),
+                "wheels": container_info.get("wheels"),
                 "started_at": container_info["started_at"],
                 "uptime": time.time() - container_info["started_at"]
             })
@@ -959,13 +1790,55 @@ async def get_running_backends(request: Request):
     
     
     for key in containers_to_remove:
-        del running_backend_containers[key]
+        unregister_backend(key)
     
     return {
         "running_backends": running_backends,
         "total_running": len(running_backends)
     }
 
+@project_router.get("/admission")
+async def get_admission_status(request: Request):
+    """Report build/backend capacity, queue depth and queue wait times"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    return admission.stats()
+
+@project_router.get("/github-quota")
+async def get_github_quota(request: Request):
+    """GitHub API quota of the current user as seen by the request scheduler"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    if request.query_params.get("refresh", "").lower() in ("1", "true", "yes"):
+        try:
+            await fetch_rate_limit(token)
+        except GitHubRateLimited as e:
+            return rate_limited_response(e)
+        except GitHubError as e:
+            return JSONResponse({"error": str(e)}, status_code=502)
+    
+    return {"quota": rate_limiter.state(token_key(token))}
+
+@project_router.get("/routes")
+async def get_proxy_routes(request: Request):
+    """List the proxy routes currently published for running backends"""
+    token = request.session.get('token')
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+    
+    routes = []
+    for route in route_table.routes():
+        routes.append({
+            **route,
+            "proxy_url": backend_proxy_url(request, route["owner"], route["repo"])
+        })
+    
+    return {"routes": routes, "total_routes": len(routes)}
+
 @project_router.delete("/stop-backend/{owner}/{repo}")
 async def stop_backend_project(request: Request, owner: str, repo: str):
     """Stop a running backend container"""
@@ -982,12 +1855,8 @@ async def stop_backend_project(request: Request, owner: str, repo: str):
         }, status_code=404)
     
     try:
-        container_info = running_backend_containers[container_key]
-        container = docker_client.containers.get(container_info["container_id"])
-        container.stop(timeout=10)
-        container.remove()
-        
-        del running_backend_containers[container_key]
+        stop_backend(container_key)
+        deployments.forget_backend(owner, repo)
         
         return {
             "success": True,
@@ -1017,9 +1886,9 @@ async def get_backend_logs(request: Request, owner: str, repo: str):
     
     try:
         container_info = running_backend_containers[container_key]
-        container = docker_client.containers.get(container_info["container_id"])
+        container = get_docker_client().containers.get(container_info["container_id"])
         
-        logs = container.logs(tail=100).decode('utf-8')
+        logs, _ = split_phase_markers(container.logs(tail=100).decode('utf-8'))
         
         return {
             "success": True,
@@ -1035,108 +1904,80 @@ async def get_backend_logs(request: Request, owner: str, repo: str):
         }, status_code=500)
 
 
-def upload_folder_to_s3(local_folder, s3_prefix):
+def s3_uploader(s3_prefix: str):
+    """Concurrent uploader for s3_prefix, or None when S3 is not configured"""
+    if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY or not S3_BUCKET_NAME:
+        log.warning("S3 credentials not configured, skipping upload", s3_prefix=s3_prefix)
+        return None
+    return S3Uploader(get_s3_client(), S3_BUCKET_NAME, s3_prefix, S3_BASE_URL)
+
+def deploy_store():
     if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY or not S3_BUCKET_NAME:
-        print("S3 credentials not configured, skipping upload")
+        return None
+    return DeployStore(get_s3_client(), S3_BUCKET_NAME, S3_BASE_URL)
+
+def publish_version(s3_prefix, version, local_folder, meta):
+    """Make an uploaded version live at s3_prefix; returns the live manifest, or None if it could not switch"""
+    try:
+        return deploy_store().publish(s3_prefix, version, entry_points(local_folder), meta)
+    except Exception:
+        log.exception("Deploy switch failed", s3_prefix=s3_prefix, version=version)
+        return None
+
+def switch_to_retained(s3_prefix, digest):
+    """Re-point s3_prefix at a retained version with the given build digest; None if there is none"""
+    store = deploy_store()
+    if not store or not digest:
+        return None
+    try:
+        for stored in store.versions(s3_prefix):
+            if stored["complete"] and stored.get("digest") == digest:
+                return store.switch(s3_prefix, stored["version"])
+    except Exception:
+        log.exception("Deploy switch failed", s3_prefix=s3_prefix)
+    return None
+
+def upload_folder_to_s3(local_folder, s3_prefix, stats=None, meta=None):
+    """Upload a local build as a new version of s3_prefix and make it live"""
+    meta = meta or {}
+    version = new_version(meta.get("commit_sha"))
+    uploader = s3_uploader(version_prefix(s3_prefix, version))
+    if not uploader:
         return []
         
     try:
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION,
+        started_at = time.perf_counter()
+        upload_directory(uploader, local_folder)
+        if stats is not None:
+            stats.update(files=len(uploader.uploaded), bytes=uploader.bytes, failed=len(uploader.failed))
+        log.info(
+            "S3 upload finished",
+            bucket=uploader.bucket,
+            s3_prefix=s3_prefix,
+            version=version,
+            uploaded=len(uploader.uploaded),
+            bytes=uploader.bytes,
+            duration_ms=round((time.perf_counter() - started_at) * 1000, 1),
+            failed=uploader.failed[:10]
         )
-        bucket = S3_BUCKET_NAME
-        
-        print(f"Uploading from {local_folder} to S3 bucket {bucket} with prefix {s3_prefix}")
-        total_files = sum(len(files) for _, _, files in os.walk(local_folder))
-        print(f"Found {total_files} files to upload")
-        
-        uploaded_files = []
-        file_count = 0
-        
-        for root, dirs, files in os.walk(local_folder):
-            for file in files:
-                local_path = os.path.join(root, file)
-                relative_path = os.path.relpath(local_path, local_folder)
-                s3_key = f"{s3_prefix}/{relative_path}".replace("\\", "/")
-                
-                content_type = "application/octet-stream"  
-                lower_file = file.lower()
-                
-                if lower_file.endswith((".html", ".htm")):
-                    content_type = "text/html"
-                elif lower_file.endswith(".css"):
-                    content_type = "text/css"
-                elif lower_file.endswith(".js"):
-                    content_type = "application/javascript"
-                elif lower_file.endswith(".json"):
-                    content_type = "application/json"
-                
-                elif lower_file.endswith(".png"):
-                    content_type = "image/png"
-                elif lower_file.endswith((".jpg", ".jpeg")):
-                    content_type = "image/jpeg"
-                elif lower_file.endswith(".gif"):
-                    content_type = "image/gif"
-                elif lower_file.endswith(".svg"):
-                    content_type = "image/svg+xml"
-                elif lower_file.endswith(".webp"):
-                    content_type = "image/webp"
-                elif lower_file.endswith(".ico"):
-                    content_type = "image/x-icon"
-                
-                elif lower_file.endswith(".woff"):
-                    content_type = "font/woff"
-                elif lower_file.endswith(".woff2"):
-                    content_type = "font/woff2"
-                elif lower_file.endswith(".ttf"):
-                    content_type = "font/ttf"
-                elif lower_file.endswith(".otf"):
-                    content_type = "font/otf"
-                
-                print(f"Uploading {relative_path} as {content_type}")
-                
-                try:
-                    extra_args = {
-                        "ContentType": content_type
-                    }
-                    
-                    if lower_file.endswith((".js", ".css", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".woff", ".woff2")):
-                        extra_args["CacheControl"] = "public, max-age=31536000"  
-                    elif lower_file.endswith(".html"):
-                        extra_args["CacheControl"] = "public, max-age=0, must-revalidate"  
-                    
-                    s3.upload_file(
-                        local_path, 
-                        bucket, 
-                        s3_key, 
-                        ExtraArgs=extra_args
-                    )
-                    file_count += 1
-                    uploaded_files.append(f"{S3_BASE_URL}{s3_key}")
-                except Exception as e:
-                    print(f"Failed to upload {relative_path}: {str(e)}")
-                
-        print(f"Successfully uploaded {file_count} of {total_files} files to S3")
-        return uploaded_files
+        if uploader.failed or not publish_version(s3_prefix, version, local_folder, meta):
+            return []
+        if stats is not None:
+            stats["version"] = version
+        return uploader.uploaded
     except Exception as e:
-        print(f"S3 upload error: {str(e)}")
+        log.exception("S3 upload error", s3_prefix=s3_prefix)
         return []
 
 async def is_react_project(request: Request, owner: str, repo: str):
     react_check = await check_if_react_project(request, owner, repo)
     return react_check.get("is_react", False)
 
-async def fix_node_compatibility_issues(repo_path):
-    package_json_path = os.path.join(repo_path, "package.json")
-    if not os.path.exists(package_json_path):
-        return False
-    
+def node_compatibility_fixes(package_json: bytes):
+    """Files to add or replace in the project so it installs and builds on the builder image"""
+    overrides = {}
     try:
-        with open(package_json_path, 'r', encoding='utf-8') as f:
-            package_data = json.load(f)
+        package_data = json.loads(package_json)
         
         dependencies = package_data.get('dependencies', {})
         dev_dependencies = package_data.get('devDependencies', {})
@@ -1151,41 +1992,29 @@ async def fix_node_compatibility_issues(repo_path):
             if 'engines' not in package_data:
                 package_data['engines'] = {}
             package_data['engines']['node'] = '>=20.0.0'
+            overrides['package.json'] = json.dumps(package_data, indent=2).encode('utf-8')
             changes_made.append("Added Node.js engine requirement")
         
         
         if 'npmrc' not in package_data:
-            npmrc_path = os.path.join(repo_path, '.npmrc')
-            with open(npmrc_path, 'w') as f:
-                f.write("legacy-peer-deps=true\n")
-                f.write("fund=false\n")
+            overrides['.npmrc'] = b"legacy-peer-deps=true\nfund=false\n"
             changes_made.append("Created .npmrc for compatibility")
         
         if changes_made:
-            with open(package_json_path, 'w', encoding='utf-8') as f:
-                json.dump(package_data, f, indent=2)
-            
-            print(f"✅ Fixed Node compatibility - Changes: {changes_made}")
-        
-        return True
+            log.info("Fixed Node compatibility", changes=changes_made)
         
     except Exception as e:
-        print(f"Error fixing Node compatibility: {str(e)}")
-        return False
+        log.warning("Error fixing Node compatibility", error=str(e))
+    return overrides
 
 async def configure_s3_for_spa_routing():
     """Configure S3 bucket for SPA routing - crucial for React Router"""
     if not all([AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, S3_BUCKET_NAME]):
-        print("S3 credentials not configured")
+        log.warning("S3 credentials not configured")
         return False
         
     try:
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION,
-        )
+        s3 = get_s3_client()
         
         
         website_configuration = {
@@ -1198,18 +2027,21 @@ async def configure_s3_for_spa_routing():
             WebsiteConfiguration=website_configuration
         )
         
-        print("✅ Configured S3 for SPA routing (404 -> index.html)")
+        log.debug("Configured S3 for SPA routing")
         return True
         
     except Exception as e:
-        print(f"Error configuring S3 for SPA: {str(e)}")
+        log.error("Error configuring S3 for SPA routing", error=str(e))
         return False
 
 
-async def run_nodejs_container(repo_path: str, port: int, owner: str, repo: str):
-   
+async def run_nodejs_container(repo_path: str, owner: str, repo: str):
+    """Start a Node.js backend from a pooled container; returns (container, port) or (None, None)"""
+    lease = None
     try:
         abs_repo_path = os.path.abspath(repo_path)
+        lease = await asyncio.to_thread(container_pool.acquire, "backend-nodejs")
+        port = lease.meta["port"]
         
         # Detect the start command
         package_json_path = os.path.join(repo_path, "package.json")
@@ -1237,27 +2069,23 @@ async def run_nodejs_container(repo_path: str, port: int, owner: str, repo: str)
         {start_command}
         """
         
-        container = docker_client.containers.run(
-            "node:18-alpine",
-            command=["sh", "-c", run_command],
-            volumes={abs_repo_path: {'bind': '/app', 'mode': 'ro'}},
-            working_dir='/app',
-            ports={f'{port}/tcp': port},
-            environment={
-                'NODE_ENV': 'development',
-                'PORT': str(port)
-            },
-            detach=True,
-            
-            name=f"backend_{owner}_{repo}_{port}"
+        container = lease.container
+        # The source is copied in rather than bind-mounted: the download directory is temporary
+        await asyncio.to_thread(container.rename, f"backend_{owner}_{repo}_{port}")
+        await asyncio.to_thread(
+            container_pool.run, lease, run_command,
+            {'NODE_ENV': 'development', 'PORT': str(port)}, directory_tar(abs_repo_path, "app")
         )
         
-        print(f"✅ Started Node.js container {container.id} on port {port}")
-        return container
+        log.info("Started Node.js container", owner=owner, repo=repo, container_id=container.short_id, port=port,
+                 pool=lease.result)
+        return container, port
         
     except Exception as e:
-        print(f"❌ Error starting Node.js container: {str(e)}")
-        return None
+        log.error("Error starting Node.js container", owner=owner, repo=repo, error=str(e))
+        if lease:
+            container_pool.discard(lease.container, lease.kind)
+        return None, None
 # async def run_python_container(repo_path: str, port: int, owner: str, repo: str):
 #     """Run Python backend in Docker container"""
 #     try:
@@ -1329,10 +2157,19 @@ async def run_nodejs_container(repo_path: str, port: int, owner: str, repo: str)
 #     except Exception as e:
 #         print(f"❌ Error starting Python container: {str(e)}")
 #         return None
-async def run_python_container(repo_path: str, port: int, owner: str, repo: str):
-    """Run Python backend in Docker container"""
+async def run_python_container(repo_path: str, owner: str, repo: str, wheels: dict = None):
+    """Start a Python backend from a pooled container; returns (container, port) or (None, None).
+
+    On a wheel cache hit (wheels from wheel_cache.lookup) only that wheel set is mounted, read-only, and
+    dependencies are installed from it offline. The mount means a new container rather than an idle one.
+    """
+    lease = None
+    cached = bool(wheels) and wheels["result"] == "hit"
     try:
         abs_repo_path = os.path.abspath(repo_path)
+        extra = {"volumes": wheel_cache.volumes(wheels["key"])} if cached else {}
+        lease = await asyncio.to_thread(container_pool.acquire, "backend-python", **extra)
+        port = lease.meta["port"]
         
         # Detect Python entry point and framework
         start_command = "python app.py"  # Default fallback
@@ -1369,10 +2206,21 @@ async def run_python_container(repo_path: str, port: int, owner: str, repo: str)
         # Docker command to run Python app
         run_command = f"""
         set -e
+        now() {{ python -c 'import time; print(int(time.time() * 1000))'; }}
         echo "🐍 Starting Python backend..."
         echo "Installing dependencies..."
         if [ -f requirements.txt ]; then
-            pip install -r requirements.txt
+            echo "@@hoster-phase pip_install start $(now)"
+            if [ -n "$HOSTER_WHEELS" ] && [ -f "$HOSTER_WHEELS/.complete" ]; then
+                echo "Installing from cached wheels"
+                pip install --no-index --find-links "$HOSTER_WHEELS" -r requirements.txt || {{
+                    echo "Cached wheels incomplete, installing from the index"
+                    pip install -r requirements.txt
+                }}
+            else
+                pip install -r requirements.txt
+            fi
+            echo "@@hoster-phase pip_install end $(now)"
         else
             echo "No requirements.txt found, proceeding without dependencies"
         fi
@@ -1380,43 +2228,36 @@ async def run_python_container(repo_path: str, port: int, owner: str, repo: str)
         {start_command}
         """
         
-        container = docker_client.containers.run(
-            "python:3.11-alpine",
-            command=["sh", "-c", run_command],
-            volumes={abs_repo_path: {'bind': '/app', 'mode': 'ro'}},
-            working_dir='/app',
-            ports={f'{port}/tcp': port},
-            environment={
-                'PYTHONPATH': '/app',
-                'FLASK_ENV': 'development',
-                'FLASK_APP': 'app.py'
-            },
-            detach=True,
-            remove=True,
-            name=f"backend_{owner}_{repo}_{port}"
+        container = lease.container
+        await asyncio.to_thread(container.rename, f"backend_{owner}_{repo}_{port}")
+        await asyncio.to_thread(
+            container_pool.run, lease, run_command,
+            {'PYTHONPATH': '/app', 'FLASK_ENV': 'development', 'FLASK_APP': 'app.py',
+             **(wheel_cache.environment() if cached else {})},
+            directory_tar(abs_repo_path, "app")
         )
         
-        print(f"✅ Started Python container {container.id} on port {port}")
-        return container
+        log.info("Started Python container", owner=owner, repo=repo, container_id=container.short_id, port=port,
+                 pool=lease.result)
+        return container, port
         
     except Exception as e:
-        print(f"❌ Error starting Python container: {str(e)}")
-        return None
+        log.error("Error starting Python container", owner=owner, repo=repo, error=str(e))
+        if lease:
+            container_pool.discard(lease.container, lease.kind)
+        return None, None
 
-async def validate_react_project(repo_path: str):
-    """Validate React project before building"""
+def validate_package_json(package_json: bytes):
+    """Validate React project before building, from the raw package.json (None if missing)"""
     try:
-        package_json_path = os.path.join(repo_path, "package.json")
-        
-        if not os.path.exists(package_json_path):
+        if package_json is None:
             return {
                 "valid": False,
                 "error": "package.json not found",
                 "details": "This directory does not contain a package.json file"
             }
         
-        with open(package_json_path, 'r', encoding='utf-8') as f:
-            package_data = json.load(f)
+        package_data = json.loads(package_json)
         
         dependencies = package_data.get('dependencies', {})
         dev_dependencies = package_data.get('devDependencies', {})
@@ -1467,7 +2308,101 @@ async def validate_react_project(repo_path: str):
             "error": "Validation failed",
             "details": str(e)
         }
-async def build_react_in_docker(repo_path: str, build_output: str, owner: str, repo: str):
+PHASE_MARKER = "@@hoster-phase "
+
+def split_phase_markers(logs: str):
+    """Strip the build script's timing markers from its logs and return (logs, {phase: seconds})"""
+    kept, started, phases = [], {}, {}
+    for line in logs.split("\n"):
+        if not line.startswith(PHASE_MARKER):
+            kept.append(line)
+            continue
+        try:
+            phase, edge, millis = line[len(PHASE_MARKER):].split()
+            millis = int(millis)
+        except ValueError:
+            continue
+        if edge == "start":
+            started[phase] = millis
+        elif phase in started:
+            phases[phase] = (millis - started.pop(phase)) / 1000
+    return "\n".join(kept), phases
+
+def validate_build_output(build_success: bool, index_html: bytes, logs: str):
+    """Sanity-check the exported index.html; returns (build_success, logs)"""
+    if build_success:
+        try:
+            index_content = index_html.decode('utf-8')
+            
+            
+            if len(index_content.strip()) < 100:
+                build_success = False
+                logs += "\n❌ VALIDATION FAILED: index.html is too small"
+            
+            if 'id="root"' not in index_content and "id='root'" not in index_content:
+                logs += "\n⚠️  WARNING: No React root div found"
+            
+            if '<script' not in index_content:
+                build_success = False
+                logs += "\n❌ VALIDATION FAILED: No script tags found in index.html"
+                
+        except Exception as e:
+            logs += f"\n⚠️  Could not validate index.html: {str(e)}"
+    return build_success, logs
+
+async def build_react_with_buildkit(context_tar: bytes, trace: BuildTrace, artifacts: ArtifactPipeline):
+    """Build through BuildKit from a generated Dockerfile; dependency layers and the npm cache persist between builds"""
+    if not buildkit.available():
+        return {
+            "success": False,
+            "error": "Docker CLI with buildx not available",
+            "logs": [f"{buildkit.DOCKER_CLI} not found on PATH"]
+        }
+    
+    try:
+        with trace.span("buildkit") as buildkit_stats:
+            exit_code, logs, cached_steps = await asyncio.to_thread(buildkit.run_build, context_tar, artifacts.consume)
+            buildkit_stats.update(cached_steps=cached_steps, files=artifacts.stats["files"], bytes=artifacts.stats["bytes"])
+        logs, phases = split_phase_markers(logs)
+        for phase, seconds in phases.items():
+            trace.add(phase, seconds)
+        
+        build_success, logs = validate_build_output(
+            exit_code == 0 and artifacts.index_html is not None, artifacts.index_html, logs
+        )
+        return {
+            "success": build_success,
+            "error": None if build_success else f"Build failed (exit code: {exit_code})",
+            "logs": logs.split('\n'),
+            "phases": phases
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "logs": [f"BuildKit error: {str(e)}"]
+        }
+
+def collect_build_output(container, artifacts: ArtifactPipeline):
+    """Stream the build directory out of the finished container into the artifact pipeline"""
+    from docker.errors import NotFound
+    for build_dir in ("/app/build", "/app/dist"):
+        try:
+            stream, _ = container.get_archive(build_dir)
+        except NotFound:
+            continue
+        return artifacts.consume(stream)
+    return {"files": 0, "bytes": 0}
+
+async def build_react_in_docker(repo_path: str, owner: str, repo: str, trace: BuildTrace = None,
+                                source_tar: bytes = None, artifacts: ArtifactPipeline = None):
+    """Run the build container; the source is either bind-mounted from repo_path or copied in as source_tar (rooted at app/).
+
+    The build directory is streamed out of the container into artifacts.
+    """
+    trace = trace or BuildTrace()
+    docker_client = await docker_client_async()
     if not docker_client:
         return {
             "success": False,
@@ -1476,21 +2411,21 @@ async def build_react_in_docker(repo_path: str, build_output: str, owner: str, r
         }
     
     try:
-        abs_build_output = os.path.abspath(build_output)
         abs_repo_path = os.path.abspath(repo_path)
         
-        build_command = [
-            "sh", "-c", 
-            """
+        build_script = """
             set -e
             echo "🚀 Starting React build process..."
-            echo "Copying project files to writable location..."
-            cp -r /source/* /app/
+            if [ -d /source ]; then
+                echo "Copying project files to writable location..."
+                cp -a /source/. /app/
+            fi
             
             echo "📋 Analyzing project structure..."
             ls -la /app/
             
             echo "📦 Installing dependencies..."
+            echo "@@hoster-phase npm_install start $(node -p 'Date.now()')"
             npm install --verbose 2>&1 || {
                 echo "❌ npm install failed!"
                 echo "Package.json content:"
@@ -1501,6 +2436,7 @@ async def build_react_in_docker(repo_path: str, build_output: str, owner: str, r
                 npm --version
                 exit 1
             }
+            echo "@@hoster-phase npm_install end $(node -p 'Date.now()')"
             
             echo "🔍 Checking for required files..."
             if [ ! -f package.json ]; then
@@ -1519,8 +2455,10 @@ async def build_react_in_docker(repo_path: str, build_output: str, owner: str, r
             fi
             
             echo "🏗️  Building React app..."
+            echo "@@hoster-phase build start $(node -p 'Date.now()')"
             npm run build --verbose 2>&1
             BUILD_EXIT_CODE=$?
+            echo "@@hoster-phase build end $(node -p 'Date.now()')"
             
             if [ $BUILD_EXIT_CODE -ne 0 ]; then
                 echo "❌ Build failed! Debugging..."
@@ -1586,65 +2524,53 @@ async def build_react_in_docker(repo_path: str, build_output: str, owner: str, r
                 echo "⚠️  WARNING: No script tags found in index.html"
             fi
             
-            echo "📦 Copying build files to output..."
-            cp -r "$BUILD_DIR"/* /output/
-            
-            echo "✅ SUCCESS: Build completed and files copied"
-            echo "📊 Final output contents:"
-            ls -la /output/
+            echo "✅ SUCCESS: Build completed in /app/$BUILD_DIR"
             """
-        ]
-        
-        
-        container = docker_client.containers.run(
-            "node:20-alpine",  
-            command=build_command,
-            volumes={
-                abs_repo_path: {'bind': '/source', 'mode': 'ro'},    
-                abs_build_output: {'bind': '/output', 'mode': 'rw'}  
-            },
-            working_dir='/app',
-            remove=True,  
-            detach=True
-        )
-        
-        
-        result = container.wait()
-        logs = container.logs().decode('utf-8')
         
+        with trace.span("container_acquire") as acquire_stats:
+            if source_tar is None:
+                # A bind mount has to be set when the container is created, so this never comes from the pool
+                lease = await asyncio.to_thread(
+                    container_pool.acquire, "build", volumes={abs_repo_path: {'bind': '/source', 'mode': 'ro'}}
+                )
+            else:
+                lease = await asyncio.to_thread(container_pool.acquire, "build")
+            acquire_stats["pool"] = lease.result
+        container = lease.container
         
-        build_success = (
-            result['StatusCode'] == 0 and 
-            os.path.exists(build_output) and 
-            os.path.exists(os.path.join(build_output, "index.html"))
+        try:
+            if source_tar is not None:
+                # Straight into the container's writable layer, which is discarded with the container
+                with trace.span("copy_source") as copy_stats:
+                    if not await asyncio.to_thread(container.put_archive, "/", source_tar):
+                        raise RuntimeError("Could not copy the project source into the build container")
+                    copy_stats["bytes"] = len(source_tar)
+            with trace.span("container_start"):
+                await asyncio.to_thread(container_pool.run, lease, build_script)
+            with trace.span("container_wait"):
+                result = await asyncio.to_thread(container.wait)
+                logs, phases = split_phase_markers(container.logs().decode('utf-8'))
+                for phase, seconds in phases.items():
+                    trace.add(phase, seconds)
+            if result['StatusCode'] == 0 and artifacts is not None:
+                with trace.span("collect_output") as output_stats:
+                    output_stats.update(await asyncio.to_thread(collect_build_output, container, artifacts))
+        finally:
+            # Removed only after the logs were read, unlike auto-remove; the pool replaces it
+            container_pool.discard(container, lease.kind)
+        
+        
+        build_success, logs = validate_build_output(
+            result['StatusCode'] == 0 and artifacts is not None and artifacts.index_html is not None,
+            artifacts.index_html if artifacts is not None else None,
+            logs
         )
         
-        
-        if build_success:
-            index_path = os.path.join(build_output, "index.html")
-            try:
-                with open(index_path, 'r', encoding='utf-8') as f:
-                    index_content = f.read()
-                
-                
-                if len(index_content.strip()) < 100:
-                    build_success = False
-                    logs += "\n❌ VALIDATION FAILED: index.html is too small"
-                
-                if 'id="root"' not in index_content and "id='root'" not in index_content:
-                    logs += "\n⚠️  WARNING: No React root div found"
-                
-                if '<script' not in index_content:
-                    build_success = False
-                    logs += "\n❌ VALIDATION FAILED: No script tags found in index.html"
-                    
-            except Exception as e:
-                logs += f"\n⚠️  Could not validate index.html: {str(e)}"
-        
         return {
             "success": build_success,
             "error": None if build_success else f"Build failed (exit code: {result['StatusCode']})",
-            "logs": logs.split('\n')
+            "logs": logs.split('\n'),
+            "phases": phases
         }
         
     except Exception as e:
@@ -1,49 +1,43 @@
 from fastapi import Request, APIRouter
 from fastapi.responses import RedirectResponse, JSONResponse
 from app.config import oauth
+from app.github import repo_list_cache
+from app.log import get_logger
 
 user_routes = APIRouter()
+log = get_logger("user")
 
 @user_routes.get("/login")
 async def login(request: Request):
     redirect_uri = str(request.base_url).rstrip('/') + "/api/user/auth"
-    print(f"Redirect URI: {redirect_uri}")
+    log.debug("Starting GitHub OAuth", redirect_uri=redirect_uri)
     return await oauth.github.authorize_redirect(request, redirect_uri)
 
 @user_routes.get("/auth")
 async def auth(request: Request):
     try:
-        print(f"Auth request URL: {request.url}")
-        print(f"Session before auth: {dict(request.session)}")
-        
         token = await oauth.github.authorize_access_token(request)
-        print(f"Token received: {token}")
-        
         request.session['token'] = token
         
         user = await oauth.github.get('user', token=token)
         user_data = user.json()
         request.session['user_info'] = user_data
         
-        print(f"Session after auth: {dict(request.session)}")
-        print(f"User data: {user_data.get('login', 'No login')}")
+        log.info("User authenticated", login=user_data.get('login'))
         
         
         return RedirectResponse('http://localhost:5173/')
     except Exception as e:
-        print(f"Auth error: {str(e)}")
+        log.warning("Auth error", error=str(e))
        
         return RedirectResponse('http://localhost:5173/?error=auth_failed')
 
 @user_routes.get("/me")
 async def get_current_user(request: Request):
-    print(f"Session data: {dict(request.session)}")
     token = request.session.get('token')
-    print(f"Token: {token}")
     user_info = request.session.get('user_info')
     
     if not token:
-        print("No token found in session")
         return JSONResponse({"error": "Not authenticated"}, status_code=401)
     
     return {
@@ -54,6 +48,9 @@ async def get_current_user(request: Request):
 
 @user_routes.post("/logout")
 async def logout(request: Request):
-    print("Logging out user")
+    log.info("Logging out user", login=(request.session.get('user_info') or {}).get('login'))
+    token = request.session.get('token')
+    if token:
+        repo_list_cache.invalidate(token)
     request.session.clear()
     return {"success": True, "message": "Logged out"}
\ No newline at end of file
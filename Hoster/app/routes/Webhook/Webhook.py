@@ -0,0 +1,116 @@
+import asyncio
+from fastapi import Request, APIRouter
+from fastapi.responses import JSONResponse
+from app.webhooks import (
+    GITHUB_WEBHOOK_SECRET, verify_signature, changed_paths, path_affects, deliveries, deployments
+)
+from app.github import access_token_of, GitHubRateLimited
+from app.routes.Project.Project import start_build, restart_backend, running_backend_containers
+from app.log import get_logger
+
+webhook_router = APIRouter()
+log = get_logger("webhook")
+
+# Strong references so background redeploys are not garbage collected mid-flight
+redeploy_tasks = set()
+
+
+async def redeploy(token, owner: str, repo: str, sha: str, frontends, backends, delivery_keys=()):
+    headers = {'Authorization': f'token {access_token_of(token)}'}
+    # Only default branch pushes get here, and HEAD is the default branch
+    jobs = [
+        start_build(headers, owner, repo, project_path, sha, per_project=per_project, ref="HEAD")
+        for project_path, per_project in frontends.items()
+    ]
+    jobs += [
+        restart_backend(headers, owner, repo, project_path, backend_type, sha)
+        for project_path, backend_type in backends.items()
+    ]
+    labels = [f"build:{p or '.'}" for p in frontends] + [f"backend:{p or '.'}" for p in backends]
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+    failed = False
+    for label, result in zip(labels, results):
+        if isinstance(result, GitHubRateLimited):
+            failed = True
+            log.warning("Redeploy rate limited", owner=owner, repo=repo, sha=sha, target=label, retry_after=result.retry_after)
+        elif isinstance(result, Exception):
+            failed = True
+            log.error("Redeploy failed", owner=owner, repo=repo, sha=sha, target=label, error=str(result))
+        else:
+            payload, status_code = result
+            failed = failed or status_code != 200
+            log.info("Redeploy finished", owner=owner, repo=repo, sha=sha, target=label,
+                     status=status_code, cache_hit=payload.get("cache_hit", False), error=payload.get("error"))
+    if failed:
+        # Let "Redeliver" in GitHub's webhook settings retry the push
+        deliveries.forget(*delivery_keys)
+
+
+@webhook_router.post("/github")
+async def github_webhook(request: Request):
+    """Receive GitHub push events and redeploy the projects they touch"""
+    if not GITHUB_WEBHOOK_SECRET:
+        return JSONResponse({"success": False, "error": "Webhook secret not configured"}, status_code=503)
+
+    body = await request.body()
+    if not verify_signature(GITHUB_WEBHOOK_SECRET, body, request.headers.get("X-Hub-Signature-256", "")):
+        return JSONResponse({"success": False, "error": "Invalid signature"}, status_code=401)
+
+    event = request.headers.get("X-GitHub-Event", "")
+    if event == "ping":
+        return {"success": True, "message": "pong"}
+    if event != "push":
+        return JSONResponse({"success": True, "ignored": f"event {event}"}, status_code=202)
+
+    try:
+        payload = await request.json()
+        repository = payload["repository"]
+        owner = repository["owner"].get("login") or repository["owner"]["name"]
+        repo = repository["name"]
+        sha = payload["after"]
+        before = payload.get("before") or ""
+    except (KeyError, TypeError, ValueError):
+        return JSONResponse({"success": False, "error": "Malformed push payload"}, status_code=400)
+
+    delivery_id = request.headers.get("X-GitHub-Delivery")
+    # The push itself, not just its head: a force push back to an earlier commit has a new "before"
+    stream = f"{owner}/{repo}:{payload.get('ref')}".lower()
+    delivery_keys = (delivery_id, f"{stream}:{before}..{sha}".lower())
+    if not deliveries.first_time(delivery_keys[0], stream=stream, push=delivery_keys[1]):
+        return {"success": True, "duplicate": True}
+
+    default_ref = f"refs/heads/{repository.get('default_branch') or 'main'}"
+    if payload.get("deleted") or payload.get("ref") != default_ref:
+        return JSONResponse({"success": True, "ignored": f"not a push to {default_ref}"}, status_code=202)
+
+    deployment = deployments.lookup(owner, repo)
+    if not deployment:
+        return JSONResponse({"success": True, "ignored": "repository is not deployed here"}, status_code=202)
+
+    paths = changed_paths(payload)
+    frontends = {
+        p: per_project for p, per_project in deployment["frontends"].items() if path_affects(p, paths)
+    }
+    running = {
+        info.get("project_path", "") for info in running_backend_containers.values()
+        if info["owner"].lower() == owner.lower() and info["repo"].lower() == repo.lower()
+    }
+    backends = {
+        p: backend_type for p, backend_type in deployment["backends"].items()
+        if p in running and path_affects(p, paths)
+    }
+
+    if frontends or backends:
+        task = asyncio.create_task(redeploy(deployment["token"], owner, repo, sha, frontends, backends, delivery_keys))
+        redeploy_tasks.add(task)
+        task.add_done_callback(redeploy_tasks.discard)
+
+    log.info("Push received", owner=owner, repo=repo, sha=sha, delivery=delivery_id,
+             changed=len(paths) if paths is not None else "all", rebuilds=list(frontends), restarts=list(backends))
+    return JSONResponse({
+        "success": True,
+        "commit_sha": sha,
+        "changed_paths": len(paths) if paths is not None else None,
+        "rebuilds": list(frontends),
+        "restarts": list(backends)
+    }, status_code=202)
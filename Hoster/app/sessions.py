@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+from http.cookies import SimpleCookie
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+SESSION_COOKIE_NAME = os.getenv("SESSION_COOKIE_NAME", "session")
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", str(14 * 24 * 3600)))
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "./sessions.db")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+# Short so a logout in one worker is seen by the others quickly
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
+
+
+class SQLiteSessionStore:
+    """Sessions in a local SQLite file shared by all workers on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str):
+        row = self._conn().execute(
+            "SELECT data, expires_at FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if not row or row[1] < time.time():
+            return None, None
+        return row[0], row[1]
+
+    def set(self, session_id: str, data: str, expires_at: float):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+            (session_id, data, expires_at),
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, session_id: str):
+        self._conn().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+class RedisSessionStore:
+    """Sessions in any Redis-protocol server, for workers spread over several hosts"""
+
+    def __init__(self, url: str):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, session_id: str):
+        pipe = self._redis.pipeline()
+        pipe.get(f"session:{session_id}")
+        pipe.ttl(f"session:{session_id}")
+        data, ttl = pipe.execute()
+        if data is None:
+            return None, None
+        return data.decode("utf-8"), time.time() + max(ttl, 0)
+
+    def set(self, session_id: str, data: str, expires_at: float):
+        self._redis.setex(f"session:{session_id}", max(int(expires_at - time.time()), 1), data)
+
+    def delete(self, session_id: str):
+        self._redis.delete(f"session:{session_id}")
+
+
+class SessionManager:
+    """Small in-process LRU in front of a shared session store"""
+
+    def __init__(self, store, cache_size: int, cache_ttl: float, max_age: int):
+        self.store = store
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def _cache_put(self, session_id, data, expires_at):
+        with self._lock:
+            self._cache[session_id] = (data, expires_at, time.monotonic())
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def load(self, session_id: str):
+        """Return (serialized_data, expires_at) or (None, None)"""
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached and time.monotonic() - cached[2] < self.cache_ttl:
+                self._cache.move_to_end(session_id)
+                if cached[1] >= time.time():
+                    return cached[0], cached[1]
+                return None, None
+        data, expires_at = self.store.get(session_id)
+        if data is not None:
+            self._cache_put(session_id, data, expires_at)
+        return data, expires_at
+
+    def save(self, session_id: str, data: str):
+        expires_at = time.time() + self.max_age
+        self.store.set(session_id, data, expires_at)
+        self._cache_put(session_id, data, expires_at)
+        return expires_at
+
+    def delete(self, session_id: str):
+        self.store.delete(session_id)
+        with self._lock:
+            self._cache.pop(session_id, None)
+
+    def create(self, session: dict):
+        session_id = secrets.token_urlsafe(32)
+        self.save(session_id, json.dumps(session))
+        return session_id
+
+
+def create_session_store():
+    if SESSION_BACKEND == "redis":
+        return RedisSessionStore(SESSION_REDIS_URL)
+    return SQLiteSessionStore(SESSION_SQLITE_PATH)
+
+
+session_manager = SessionManager(create_session_store(), SESSION_CACHE_SIZE, SESSION_CACHE_TTL, SESSION_MAX_AGE)
+
+
+class ServerSessionMiddleware:
+    """Drop-in replacement for Starlette's SessionMiddleware that keeps session data server-side.
+
+    The cookie only carries an opaque random session ID; request.session is
+    loaded from the session manager and written back only when it changed.
+    Signing in or out (the session's token changing) issues a new ID, so an
+    ID planted before login never becomes a signed-in session.
+    """
+
+    def __init__(self, app, manager=None, cookie_name: str = SESSION_COOKIE_NAME,
+                 max_age: int = SESSION_MAX_AGE, path: str = "/", same_site: str = "lax",
+                 https_only: bool = False):
+        self.app = app
+        self.manager = manager or session_manager
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+        self.cookie_flags = f"path={path}; SameSite={same_site}; HttpOnly"
+        if https_only:
+            self.cookie_flags += "; Secure"
+
+    def _session_id_from(self, scope):
+        for key, value in scope.get("headers", []):
+            if key == b"cookie":
+                cookie = SimpleCookie()
+                try:
+                    cookie.load(value.decode("latin-1"))
+                except Exception:
+                    return None
+                if self.cookie_name in cookie:
+                    return cookie[self.cookie_name].value
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id = self._session_id_from(scope)
+        original, expires_at = (None, None)
+        if session_id:
+            original, expires_at = self.manager.load(session_id)
+        scope["session"] = json.loads(original) if original else {}
+        original_token = scope["session"].get("token")
+
+        async def send_wrapper(message):
+            nonlocal session_id
+            if message["type"] == "http.response.start":
+                session = scope["session"]
+                cookie = None
+                if session:
+                    data = json.dumps(session)
+                    # Rewrite on change, and slide the expiry once half of it is used up
+                    needs_refresh = expires_at is not None and expires_at - time.time() < self.max_age / 2
+                    if data != original or needs_refresh:
+                        if original is None:
+                            session_id = secrets.token_urlsafe(32)
+                        elif session.get("token") != original_token:
+                            self.manager.delete(session_id)
+                            session_id = secrets.token_urlsafe(32)
+                        self.manager.save(session_id, data)
+                        cookie = f"{self.cookie_name}={session_id}; {self.cookie_flags}; Max-Age={self.max_age}"
+                elif original is not None:
+                    self.manager.delete(session_id)
+                    cookie = f"{self.cookie_name}=null; {self.cookie_flags}; expires=Thu, 01 Jan 1970 00:00:00 GMT"
+                if cookie:
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,137 @@
+import io
+import os
+import stat
+import time
+import tarfile
+import zipfile
+import posixpath
+
+
+class SourceArchive:
+    """A downloaded GitHub zipball, read in memory.
+
+    GitHub wraps the repository in a single top-level folder
+    (``owner-repo-sha/``); paths passed in here are relative to the
+    repository root and the wrapper folder is handled internally.
+    """
+
+    def __init__(self, data: bytes):
+        self._zip = zipfile.ZipFile(io.BytesIO(data))
+        self._members = [m for m in self._zip.infolist() if self._safe(m.filename)]
+        roots = {m.filename.split("/", 1)[0] for m in self._members}
+        self.root = roots.pop() if len(roots) == 1 else ""
+
+    @staticmethod
+    def _safe(name: str):
+        parts = name.split("/")
+        return not name.startswith("/") and ".." not in parts and "\\" not in name
+
+    def _prefix(self, project_path: str):
+        parts = [p for p in (self.root, (project_path or "").strip("/")) if p]
+        return "/".join(parts) + "/" if parts else ""
+
+    def members(self, project_path: str = ""):
+        """Yield (relative name, ZipInfo) for every entry below project_path"""
+        prefix = self._prefix(project_path)
+        for member in self._members:
+            if member.filename.startswith(prefix) and member.filename != prefix:
+                yield member.filename[len(prefix):].rstrip("/"), member
+
+    def is_empty(self):
+        return not self._members
+
+    def directories(self, project_path: str = ""):
+        """Names of the directories directly inside project_path"""
+        names = set()
+        for name, member in self.members(project_path):
+            head, sep, _ = name.partition("/")
+            if sep or member.is_dir():
+                names.add(head)
+        return sorted(names)
+
+    def has_dir(self, project_path: str):
+        return any(True for _ in self.members(project_path))
+
+    def read(self, project_path: str, name: str):
+        """Bytes of one file inside the project, or None if it is missing"""
+        try:
+            return self._zip.read(self._prefix(project_path) + name)
+        except KeyError:
+            return None
+
+    def stats(self, project_path: str = ""):
+        files = [m for _, m in self.members(project_path) if not m.is_dir()]
+        return {"files": len(files), "bytes": sum(m.file_size for m in files)}
+
+    @staticmethod
+    def _mode(member: zipfile.ZipInfo):
+        mode = member.external_attr >> 16
+        if not mode:
+            return (stat.S_IFDIR | 0o755) if member.is_dir() else (stat.S_IFREG | 0o644)
+        return mode
+
+    def to_tar(self, project_path: str, dest: str = "", overrides=None):
+        """Tar of the project subtree placed under dest, with overrides ({name: bytes}) replacing or adding files"""
+        overrides = dict(overrides or {})
+        dest = dest.strip("/")
+        place = lambda name: f"{dest}/{name}" if dest else name
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w", format=tarfile.PAX_FORMAT) as tar:
+            if dest:
+                info = tarfile.TarInfo(dest)
+                info.type, info.mode, info.mtime = tarfile.DIRTYPE, 0o755, time.time()
+                tar.addfile(info)
+            for name, member in self.members(project_path):
+                mode = self._mode(member)
+                info = tarfile.TarInfo(place(name))
+                info.mtime = time.mktime(member.date_time + (0, 0, -1))
+                info.mode = stat.S_IMODE(mode)
+                if member.is_dir() or stat.S_ISDIR(mode):
+                    info.type = tarfile.DIRTYPE
+                    tar.addfile(info)
+                elif stat.S_ISLNK(mode):
+                    info.type = tarfile.SYMTYPE
+                    info.linkname = self._zip.read(member).decode("utf-8")
+                    tar.addfile(info)
+                elif name in overrides:
+                    data = overrides.pop(name)
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+                else:
+                    info.size = member.file_size
+                    with self._zip.open(member) as f:
+                        tar.addfile(info, f)
+            for name, data in overrides.items():
+                info = tarfile.TarInfo(place(name))
+                info.mode, info.mtime, info.size = 0o644, time.time(), len(data)
+                tar.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def extract(self, project_path: str, dest: str, overrides=None):
+        """Write the project subtree to dest on disk, applying overrides"""
+        overrides = dict(overrides or {})
+        os.makedirs(dest, exist_ok=True)
+        for name, member in self.members(project_path):
+            target = os.path.join(dest, *name.split("/"))
+            mode = self._mode(member)
+            if member.is_dir() or stat.S_ISDIR(mode):
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if stat.S_ISLNK(mode):
+                os.symlink(self._zip.read(member).decode("utf-8"), target)
+                continue
+            with open(target, "wb") as out:
+                if name in overrides:
+                    out.write(overrides.pop(name))
+                else:
+                    with self._zip.open(member) as f:
+                        while chunk := f.read(1 << 20):
+                            out.write(chunk)
+            os.chmod(target, stat.S_IMODE(mode) or 0o644)
+        for name, data in overrides.items():
+            target = os.path.join(dest, *posixpath.normpath(name).split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as out:
+                out.write(data)
+        return dest
@@ -0,0 +1,364 @@
+import os
+import json
+import stat
+import asyncio
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from dotenv import load_dotenv
+
+from app.artifacts import MANIFEST_NAME, content_type_for
+from app.cache_policy import CACHE_CONTROL, classify
+from app.metrics import static_responses
+from app.janitor import janitor
+
+load_dotenv()
+
+
+# Local builds are served at {STATIC_SITE_PREFIX}/{owner}/{repo}/, e.g. when S3 is not configured
+STATIC_SITE_ENABLED = os.getenv("STATIC_SITE_ENABLED", "true").lower() in ("1", "true", "yes")
+STATIC_SITE_PREFIX = "/" + os.getenv("STATIC_SITE_PREFIX", "/sites").strip("/")
+STATIC_CACHE_MAX_BYTES = int(os.getenv("STATIC_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Larger files are streamed from disk on every request instead of kept in memory
+STATIC_CACHE_MAX_FILE_BYTES = int(os.getenv("STATIC_CACHE_MAX_FILE_BYTES", str(256 * 1024)))
+STATIC_CHUNK_BYTES = 256 * 1024
+BUILDS_DIR = "./builds"
+
+TEXT_TYPES = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml")
+
+
+def site_path_for(owner: str, repo: str, project_path: str = ""):
+    """URL path a local build is served at, or None when static serving is off; project_path only for per-project builds"""
+    if not STATIC_SITE_ENABLED:
+        return None
+    path = (project_path or "").strip("/")
+    if path:
+        return f"{STATIC_SITE_PREFIX}/{owner}/{repo}/{path}/"
+    return f"{STATIC_SITE_PREFIX}/{owner}/{repo}/"
+
+
+def resolve_site(path: str):
+    """(build_dir, path inside the build) for a path below STATIC_SITE_PREFIX, or None if no build matches"""
+    parts = path[len(STATIC_SITE_PREFIX):].lstrip("/").split("/", 2)
+    if len(parts) < 2 or not all(parts[:2]) or any(p.startswith(".") or "\\" in p for p in parts[:2]):
+        return None
+    owner, repo = parts[:2]
+    rest = parts[2] if len(parts) == 3 else None
+    if rest:
+        # Projects of a monorepo built with all=true live in their own build directory, named like
+        # deploy_target does ("apps/web" -> "{owner}_{repo}__apps_web"); the longest matching project wins
+        segments = rest.split("/")
+        for count in range(len(segments), 0, -1):
+            head = segments[:count]
+            if not all(head) or any(p.startswith(".") or "\\" in p for p in head):
+                continue
+            nested = os.path.join(BUILDS_DIR, f"{owner}_{repo}__{'_'.join(head)}")
+            if os.path.isdir(nested):
+                return nested, "/".join(segments[count:]) if count < len(segments) else None
+    build_dir = os.path.join(BUILDS_DIR, f"{owner}_{repo}")
+    if not os.path.isdir(build_dir):
+        return None
+    return build_dir, rest
+
+
+class FileCache:
+    """LRU of small file bodies; keys include inode and mtime, so a swapped build directory never serves stale bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def put(self, key, data: bytes):
+        if key in self._entries or len(data) > self.max_bytes:
+            return
+        self._entries[key] = data
+        self.bytes += len(data)
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+
+file_cache = FileCache(STATIC_CACHE_MAX_BYTES)
+# build_dir -> (manifest stat key, files)
+_manifests = {}
+
+
+def _manifest_files(build_dir: str):
+    """File entries of the build's manifest, or None for builds written before manifests existed"""
+    path = os.path.join(build_dir, MANIFEST_NAME)
+    try:
+        st = os.stat(path)
+    except OSError:
+        _manifests.pop(build_dir, None)
+        return None
+    key = (st.st_ino, st.st_mtime_ns)
+    cached = _manifests.get(build_dir)
+    if cached and cached[0] == key:
+        return cached[1]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            files = json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return None
+    _manifests[build_dir] = (key, files)
+    return files
+
+
+def lookup(build_dir: str, name: str):
+    """What to serve for name inside a build, or None; dotfiles and .gz sidecars are never served directly"""
+    parts = name.split("/")
+    if any(not p or p.startswith(".") or "\\" in p for p in parts):
+        return None
+    path = os.path.join(build_dir, *parts)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    files = _manifest_files(build_dir)
+    if files is not None:
+        entry = files.get(name)
+        if entry is None:
+            return None
+        etag = entry["sha256"][:32]
+        cache_class = entry.get("cache") or classify(name)
+        content_type = entry.get("content_type") or content_type_for(name)
+        has_gzip = "gzip_size" in entry
+    else:
+        if name.endswith(".gz") and os.path.exists(path[:-3]):
+            return None
+        etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        cache_class = classify(name)
+        content_type = content_type_for(name)
+        has_gzip = os.path.exists(path + ".gz")
+    return {
+        "path": path,
+        "stat": st,
+        "etag": etag,
+        "content_type": content_type,
+        "cache_control": CACHE_CONTROL[cache_class],
+        "has_gzip": has_gzip,
+    }
+
+
+def _header(scope, name: bytes):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def accepts_gzip(accept_encoding: str):
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            q = params.strip()
+            try:
+                return not (q.startswith("q=") and float(q[2:]) == 0)
+            except ValueError:
+                return False
+    return False
+
+
+def etag_matches(header: str, etag: str):
+    """If-None-Match comparison; weak comparison, as RFC 9110 requires for GET"""
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def parse_range(header: str, size: int):
+    """(start, end) inclusive for a single bytes range; None to ignore the header, False if unsatisfiable"""
+    unit, _, spec = (header or "").partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Multipart ranges are answered with the whole file, which RFC 9110 allows
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def not_modified_since(header: str, mtime: float):
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+async def _send_empty(send, status: int, headers=None):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-length", b"0")] + (headers or []),
+    })
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _read(path: str, offset: int = 0, count: int = -1):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(count)
+
+
+async def send_file(scope, send, path: str, st, start: int, length: int):
+    """Body of a file range: from memory, by zero-copy sendfile when the server offers it, or in chunks"""
+    extensions = scope.get("extensions") or {}
+    if st.st_size <= STATIC_CACHE_MAX_FILE_BYTES:
+        key = (path, st.st_ino, st.st_mtime_ns, st.st_size)
+        data = file_cache.get(key)
+        if data is None:
+            data = await asyncio.to_thread(_read, path)
+            file_cache.put(key, data)
+            static_responses.inc(result="read")
+        else:
+            static_responses.inc(result="memory")
+        await send({"type": "http.response.body", "body": data[start:start + length]})
+        return
+    static_responses.inc(result="stream")
+    if "http.response.zerocopysend" in extensions:
+        with open(path, "rb") as f:
+            await send({"type": "http.response.zerocopysend", "file": f.fileno(), "offset": start, "count": length})
+        return
+    if "http.response.pathsend" in extensions and start == 0 and length == st.st_size:
+        await send({"type": "http.response.pathsend", "path": os.path.abspath(path)})
+        return
+    fd = await asyncio.to_thread(os.open, path, os.O_RDONLY)
+    try:
+        offset, end = start, start + length
+        while offset < end:
+            chunk = await asyncio.to_thread(os.pread, fd, min(STATIC_CHUNK_BYTES, end - offset), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": offset < end})
+        if offset < end:
+            # The file shrank underneath us; end the response rather than hang
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        os.close(fd)
+
+
+async def serve(scope, send, build_dir: str, name: str):
+    """Answer one GET or HEAD for a file of a local build, with S3's SPA fallback to index.html"""
+    if scope["method"] not in ("GET", "HEAD"):
+        await _send_empty(send, 405, [(b"allow", b"GET, HEAD")])
+        return
+    if not name or name.endswith("/"):
+        name += "index.html"
+    janitor.mark_used(build_dir)
+    info = lookup(build_dir, name)
+    if info is None and lookup(build_dir, f"{name}/index.html"):
+        location = scope["path"] + "/"
+        if scope.get("query_string"):
+            location += "?" + scope["query_string"].decode("latin-1")
+        await _send_empty(send, 307, [(b"location", location.encode("latin-1"))])
+        return
+    if info is None:
+        # Like the S3 website ErrorDocument: client-side routes get the app, missing assets a 404
+        accept = _header(scope, b"accept") or ""
+        if "." not in name.rsplit("/", 1)[-1] or "text/html" in accept:
+            info = lookup(build_dir, "index.html")
+            static_responses.inc(result="spa_fallback")
+    if info is None:
+        static_responses.inc(result="not_found")
+        await _send_empty(send, 404)
+        return
+
+    st = info["stat"]
+    range_header = _header(scope, b"range")
+    use_gzip = info["has_gzip"] and not range_header and accepts_gzip(_header(scope, b"accept-encoding"))
+    path = info["path"] + ".gz" if use_gzip else info["path"]
+    if use_gzip:
+        st = os.stat(path)
+    etag = f'"{info["etag"]}-gz"' if use_gzip else f'"{info["etag"]}"'
+
+    content_type = info["content_type"]
+    if content_type.startswith(TEXT_TYPES):
+        content_type += "; charset=utf-8"
+    headers = [
+        (b"etag", etag.encode("latin-1")),
+        (b"last-modified", formatdate(info["stat"].st_mtime, usegmt=True).encode("latin-1")),
+        (b"cache-control", info["cache_control"].encode("latin-1")),
+        (b"accept-ranges", b"bytes"),
+    ]
+    if info["has_gzip"]:
+        headers.append((b"vary", b"Accept-Encoding"))
+
+    if_none_match = _header(scope, b"if-none-match")
+    if_modified_since = _header(scope, b"if-modified-since")
+    if (etag_matches(if_none_match, etag) if if_none_match is not None
+            else if_modified_since and not_modified_since(if_modified_since, info["stat"].st_mtime)):
+        static_responses.inc(result="not_modified")
+        await send({"type": "http.response.start", "status": 304, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    status, start, length = 200, 0, st.st_size
+    if range_header:
+        if_range = _header(scope, b"if-range")
+        byte_range = parse_range(range_header, st.st_size) if not if_range or if_range.strip() == etag else None
+        if byte_range is False:
+            static_responses.inc(result="range_not_satisfiable")
+            await _send_empty(send, 416, headers + [(b"content-range", f"bytes */{st.st_size}".encode())])
+            return
+        if byte_range:
+            status, start, length = 206, byte_range[0], byte_range[1] - byte_range[0] + 1
+            headers.append((b"content-range", f"bytes {start}-{byte_range[1]}/{st.st_size}".encode()))
+            static_responses.inc(result="partial")
+
+    headers += [(b"content-type", content_type.encode("latin-1")), (b"content-length", str(length).encode())]
+    if use_gzip:
+        headers.append((b"content-encoding", b"gzip"))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    if scope["method"] == "HEAD":
+        await send({"type": "http.response.body", "body": b""})
+        return
+    await send_file(scope, send, path, st, start, length)
+
+
+class StaticSiteMiddleware:
+    """Serves local builds below STATIC_SITE_PREFIX before requests reach the API"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and STATIC_SITE_ENABLED and scope["path"].startswith(STATIC_SITE_PREFIX + "/"):
+            resolved = resolve_site(scope["path"])
+            if resolved is None:
+                static_responses.inc(result="not_found")
+                await _send_empty(send, 404)
+                return
+            build_dir, name = resolved
+            if name is None:
+                # /{owner}/{repo} without a trailing slash: redirect so relative URLs resolve
+                location = scope["path"] + "/"
+                if scope.get("query_string"):
+                    location += "?" + scope["query_string"].decode("latin-1")
+                await _send_empty(send, 307, [(b"location", location.encode("latin-1"))])
+                return
+            await serve(scope, send, build_dir, name)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,146 @@
+import os
+import hmac
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET", "")
+WEBHOOK_DELIVERY_TTL = float(os.getenv("WEBHOOK_DELIVERY_TTL", "86400"))
+WEBHOOK_DELIVERY_CACHE_SIZE = int(os.getenv("WEBHOOK_DELIVERY_CACHE_SIZE", "10000"))
+# GitHub lists at most this many commits in a push webhook payload; a list this long may have been cut off
+PUSH_PAYLOAD_COMMIT_LIMIT = 2048
+
+
+def verify_signature(secret: str, body: bytes, signature_header: str):
+    """Check GitHub's X-Hub-Signature-256 header against the raw request body"""
+    if not secret or not signature_header or not signature_header.startswith("sha256="):
+        return False
+    expected = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature_header)
+
+
+def changed_paths(payload: dict):
+    """Files touched by a push, or None when the payload cannot tell us (treat as everything)"""
+    commits = payload.get("commits") or []
+    if not commits or len(commits) >= PUSH_PAYLOAD_COMMIT_LIMIT or payload.get("forced"):
+        return None
+    paths = set()
+    for commit in commits:
+        for key in ("added", "modified", "removed"):
+            paths.update(commit.get(key) or [])
+    return paths
+
+
+def path_affects(project_path: str, paths):
+    """Whether any changed path lies inside the project directory ("" is the repository root)"""
+    if paths is None or not project_path:
+        return True
+    prefix = project_path.strip("/") + "/"
+    return any(path.startswith(prefix) for path in paths)
+
+
+class DeliveryLog:
+    """Recently seen webhook deliveries, so GitHub's redeliveries and retries are processed once.
+
+    A delivery is recorded when it arrives, so retries sent while it is still being handled are
+    dropped, and forgotten again if handling it fails.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._seen = OrderedDict()
+        self._latest = OrderedDict()
+        self._lock = threading.Lock()
+
+    def first_time(self, *keys, stream: str = None, push: str = None):
+        """Record the keys; False if any of them was already seen within the TTL.
+
+        push identifies the change itself and is a duplicate only of the latest push recorded for
+        stream (a repository's branch), so moving a branch back to an earlier state is processed.
+        """
+        now = time.time()
+        keys = [key for key in keys + (push,) if key]
+        with self._lock:
+            while self._seen and next(iter(self._seen.values())) < now - self.ttl:
+                self._seen.popitem(last=False)
+            if any(key in self._seen for key in keys):
+                return False
+            for key in keys:
+                self._seen[key] = now
+            if stream and push:
+                previous = self._latest.pop(stream, None)
+                if previous:
+                    self._seen.pop(previous, None)
+                self._latest[stream] = push
+                while len(self._latest) > self.max_entries:
+                    self._latest.popitem(last=False)
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return True
+
+    def forget(self, *keys):
+        """Drop keys again, e.g. after the delivery failed, so a redelivery is processed"""
+        with self._lock:
+            for key in keys:
+                self._seen.pop(key, None)
+
+
+class DeploymentRegistry:
+    """What is deployed per repository and which token may redeploy it.
+
+    Kept in memory only: access tokens are never written to disk, so after a
+    restart a project has to be built or started once by hand again before
+    pushes redeploy it.
+    """
+
+    def __init__(self):
+        self._repos = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, owner: str, repo: str):
+        return self._repos.setdefault(f"{owner}/{repo}".lower(), {"token": None, "frontends": {}, "backends": {}})
+
+    def remember_frontend(self, owner: str, repo: str, project_path: str, token, per_project: bool = False):
+        with self._lock:
+            entry = self._entry(owner, repo)
+            entry["token"] = token
+            entry["frontends"][project_path or ""] = per_project
+
+    def remember_backend(self, owner: str, repo: str, project_path: str, backend_type: str, token):
+        with self._lock:
+            entry = self._entry(owner, repo)
+            entry["token"] = token
+            entry["backends"][project_path or ""] = backend_type
+
+    def forget_frontend(self, owner: str, repo: str):
+        with self._lock:
+            entry = self._repos.get(f"{owner}/{repo}".lower())
+            if entry:
+                entry["frontends"].clear()
+
+    def forget_backend(self, owner: str, repo: str):
+        with self._lock:
+            entry = self._repos.get(f"{owner}/{repo}".lower())
+            if entry:
+                entry["backends"].clear()
+
+    def lookup(self, owner: str, repo: str):
+        with self._lock:
+            entry = self._repos.get(f"{owner}/{repo}".lower())
+            if not entry or not entry["token"]:
+                return None
+            return {
+                "token": entry["token"],
+                "frontends": dict(entry["frontends"]),
+                "backends": dict(entry["backends"]),
+            }
+
+
+deliveries = DeliveryLog(WEBHOOK_DELIVERY_CACHE_SIZE, WEBHOOK_DELIVERY_TTL)
+deployments = DeploymentRegistry()
@@ -0,0 +1,220 @@
+import io
+import os
+import time
+import uuid
+import shutil
+import asyncio
+import hashlib
+import tarfile
+import threading
+from dotenv import load_dotenv
+
+from app.admission import admission, container_limits, parse_bytes, AdmissionTimeout
+from app.clients import get_docker_client
+from app.metrics import wheel_cache_requests, pip_install_seconds
+from app.log import get_logger
+
+load_dotenv()
+
+
+WHEEL_CACHE_ENABLED = os.getenv("WHEEL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Host directory holding the wheel sets; a set is bind-mounted, so the Docker daemon has to run on this host
+WHEEL_CACHE_DIR = os.path.abspath(os.getenv("WHEEL_CACHE_DIR", "./wheel_cache"))
+# The janitor keeps the cache below this, removing least recently used wheel sets first
+WHEEL_CACHE_MAX_BYTES = parse_bytes(os.getenv("WHEEL_CACHE_MAX_BYTES", "5g"))
+WHEEL_BUILD_TIMEOUT = float(os.getenv("WHEEL_BUILD_TIMEOUT", "1800"))
+# A set whose build failed (e.g. requirements naming local paths) is not tried again for this long
+WHEEL_BUILD_RETRY_SECONDS = float(os.getenv("WHEEL_BUILD_RETRY_SECONDS", "3600"))
+# Where a wheel set appears inside backend containers, read-only
+WHEELS_MOUNT = "/wheels"
+# Written last into a wheel set by its build; sets without it are incomplete
+COMPLETE_MARKER = ".complete"
+WHEELS_LABEL = "hoster.wheels"
+
+# Runs in a container that sees only requirements.txt and its own, new output directory
+BUILD_SCRIPT = f"""
+set -e
+pip wheel --disable-pip-version-check --wheel-dir {WHEELS_MOUNT} -r /hoster/requirements.txt
+touch {WHEELS_MOUNT}/{COMPLETE_MARKER}
+"""
+
+log = get_logger("wheel_cache")
+
+
+def requirements_key(requirements: bytes, image: str):
+    """Key of the wheel set for a requirements.txt: its requirement lines plus the image the wheels are built for"""
+    lines = [line.strip() for line in requirements.decode("utf-8", errors="replace").splitlines()]
+    lines = [line for line in lines if line and not line.startswith("#")]
+    return hashlib.sha256("\n".join([image] + lines).encode("utf-8")).hexdigest()[:24]
+
+
+def requirements_archive(requirements: bytes):
+    """Tar placing requirements.txt under /hoster"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        info = tarfile.TarInfo("hoster/requirements.txt")
+        info.size, info.mode, info.mtime = len(requirements), 0o644, time.time()
+        tar.addfile(info, io.BytesIO(requirements))
+    return buffer.getvalue()
+
+
+class WheelCache:
+    """Wheel sets built from requirements.txt files, one directory per requirements_key, shared by Python backends.
+
+    Backends run untrusted code, so they never write to the cache. A set
+    is built by a separate container that gets only the requirements file
+    and a fresh directory of its own; it is moved into place once
+    complete. A backend whose set exists gets just that set, mounted
+    read-only, and installs from it offline (pip --no-index). Without a
+    set it installs from the index as before while the set is built in
+    the background for the next start.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._building = set()
+        self._failed = {}
+        self._tasks = set()
+        self._stats = {"hits": 0, "misses": 0, "built": 0, "build_failed": 0}
+        self._installs = {"hit": [0, 0.0], "miss": [0, 0.0]}
+
+    def path(self, key: str):
+        return os.path.join(self.root, key)
+
+    def lookup(self, requirements: bytes, image: str):
+        """Key and hit/miss for a requirements.txt; None when the cache is off"""
+        if not WHEEL_CACHE_ENABLED:
+            return None
+        key = requirements_key(requirements, image)
+        hit = os.path.exists(os.path.join(self.path(key), COMPLETE_MARKER))
+        if hit:
+            # The janitor evicts the least recently used sets first
+            os.utime(self.path(key))
+        result = "hit" if hit else "miss"
+        wheel_cache_requests.inc(result=result)
+        with self._lock:
+            self._stats["hits" if hit else "misses"] += 1
+        return {"key": key, "result": result, "install_seconds": None}
+
+    def observe_install(self, result: str, seconds: float):
+        pip_install_seconds.observe(seconds, result=result)
+        with self._lock:
+            self._installs[result][0] += 1
+            self._installs[result][1] += seconds
+
+    def volumes(self, key: str):
+        """The one set a backend may read"""
+        return {self.path(key): {"bind": WHEELS_MOUNT, "mode": "ro"}}
+
+    def environment(self):
+        return {"HOSTER_WHEELS": WHEELS_MOUNT, "PIP_DISABLE_PIP_VERSION_CHECK": "1"}
+
+    def build_in_background(self, key: str, requirements: bytes, image: str):
+        """Build the set for key unless it is being built or recently failed; returns immediately"""
+        with self._lock:
+            failed_at = self._failed.get(key)
+            if key in self._building or (failed_at and time.time() - failed_at < WHEEL_BUILD_RETRY_SECONDS):
+                return
+            self._building.add(key)
+        task = asyncio.create_task(self._build_when_admitted(key, requirements, image))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _build_when_admitted(self, key: str, requirements: bytes, image: str):
+        try:
+            # Compiling wheels costs as much as a build, so it waits for a build slot
+            async with admission.slot("build"):
+                await asyncio.to_thread(self.build, key, requirements, image)
+        except AdmissionTimeout as e:
+            log.warning("Wheel build not started", key=key, error=str(e))
+        finally:
+            with self._lock:
+                self._building.discard(key)
+
+    def build(self, key: str, requirements: bytes, image: str):
+        """Build the set for key in a throwaway container; True once it is in place"""
+        client = get_docker_client()
+        if client is None:
+            return False
+        os.makedirs(self.root, exist_ok=True)
+        building = os.path.join(self.root, f".building-{key}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(building)
+        started_at = time.perf_counter()
+        container = None
+        try:
+            container = client.containers.create(
+                image, command=["sh", "-c", BUILD_SCRIPT],
+                volumes={building: {"bind": WHEELS_MOUNT, "mode": "rw"}},
+                labels={WHEELS_LABEL: key}, **container_limits("build")
+            )
+            if not container.put_archive("/", requirements_archive(requirements)):
+                raise RuntimeError("Could not copy requirements.txt into the container")
+            container.start()
+            status = container.wait(timeout=WHEEL_BUILD_TIMEOUT).get("StatusCode")
+            if status != 0 or not os.path.exists(os.path.join(building, COMPLETE_MARKER)):
+                tail = container.logs(tail=5).decode("utf-8", errors="replace").strip()
+                raise RuntimeError(f"pip wheel exited with {status}: {tail}")
+            try:
+                os.rename(building, self.path(key))
+            except OSError:
+                # Another build of the same set finished first
+                pass
+        except Exception as e:
+            with self._lock:
+                self._failed[key] = time.time()
+                self._stats["build_failed"] += 1
+            log.warning("Wheel build failed", key=key, error=str(e))
+            return False
+        finally:
+            if container is not None:
+                try:
+                    container.remove(force=True)
+                except Exception:
+                    pass
+            shutil.rmtree(building, ignore_errors=True)
+        with self._lock:
+            self._failed.pop(key, None)
+            self._stats["built"] += 1
+        log.info("Built wheel set", key=key, duration_ms=round((time.perf_counter() - started_at) * 1000, 1))
+        return True
+
+    def sets(self):
+        """(last_used, key, path) of every complete wheel set, least recently used first"""
+        found = []
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return found
+        for name in names:
+            path = self.path(name)
+            if name.startswith(".") or not os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+                continue
+            try:
+                found.append((os.stat(path).st_mtime, name, path))
+            except FileNotFoundError:
+                continue
+        return sorted(found)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            building = len(self._building)
+            installs = {
+                result: {"count": count, "avg_seconds": round(total / count, 3) if count else None}
+                for result, (count, total) in self._installs.items()
+            }
+        total = stats["hits"] + stats["misses"]
+        return {
+            "enabled": WHEEL_CACHE_ENABLED,
+            "dir": self.root,
+            "max_bytes": WHEEL_CACHE_MAX_BYTES,
+            "sets": len(self.sets()),
+            "building": building,
+            **stats,
+            "hit_rate": round(stats["hits"] / total, 3) if total else None,
+            "installs": installs,
+        }
+
+
+wheel_cache = WheelCache(WHEEL_CACHE_DIR)
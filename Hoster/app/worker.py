@@ -0,0 +1,225 @@
+"""Build worker: runs builds handed out by the API through app.build_queue.
+
+    python -m app.worker
+
+Run one per build host with BUILD_EXECUTOR=queue set on the API. Workers
+need Docker and the same GitHub, S3 and queue settings as the API.
+"""
+import os
+import time
+import signal
+import socket
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from dotenv import load_dotenv
+
+from app.admission import admission, HOST_CPUS, HOST_MEMORY
+from app.build_queue import get_job_queue, BUILD_JOB_LEASE_SECONDS
+from app.build_history import BuildTrace
+from app.build_jobs import BuildJob
+from app.container_pool import container_pool, CONTAINER_POOL_SIZE
+from app.janitor import janitor
+from app.clients import docker_client_async
+from app.github import GitHubRateLimited
+from app.metrics import registry
+from app.routes.Project.Project import run_build_pipeline, deploy_target, BUILD_BACKEND
+from app.log import get_logger
+
+load_dotenv()
+
+
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+# Builds run at once; by default as many as the admission limits let this host run
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY") or admission.capacity("build"))
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1"))
+WORKER_HEARTBEAT_SECONDS = float(os.getenv("WORKER_HEARTBEAT_SECONDS", "5"))
+# Serve /metrics on this port; unset means no HTTP listener
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+log = get_logger("worker")
+
+
+class BuildWorker:
+    """Claims jobs while it has free slots, renews their leases while they run and reports heartbeats.
+
+    A worker that dies stops renewing; once the lease expires the job is
+    claimed again by any worker, up to BUILD_JOB_MAX_ATTEMPTS times.
+    """
+
+    def __init__(self, queue, worker_id: str = WORKER_ID, concurrency: int = WORKER_CONCURRENCY):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.concurrency = max(1, concurrency)
+        self.started_at = time.time()
+        self.running = {}
+        self.completed = 0
+        self.failed = 0
+        self._stopping = asyncio.Event()
+
+    def info(self):
+        return {
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "capacity": self.concurrency,
+            "running": len(self.running),
+            "jobs": sorted(self.running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "cpus": HOST_CPUS,
+            "memory": HOST_MEMORY,
+            "builder": BUILD_BACKEND,
+            "started_at": self.started_at,
+            "draining": self._stopping.is_set(),
+            "paused": admission.paused("build"),
+        }
+
+    def stop(self):
+        """Stop claiming; running builds finish first"""
+        self._stopping.set()
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.queue.heartbeat, self.worker_id, self.info())
+            except Exception as e:
+                log.warning("Heartbeat failed", worker=self.worker_id, error=str(e))
+            await asyncio.sleep(WORKER_HEARTBEAT_SECONDS)
+
+    async def run(self):
+        log.info("Worker started", worker=self.worker_id, concurrency=self.concurrency)
+        heartbeat = asyncio.create_task(self._heartbeat())
+        stopped = asyncio.create_task(self._stopping.wait())
+        try:
+            while not self._stopping.is_set():
+                if len(self.running) >= self.concurrency:
+                    await asyncio.wait([*self.running.values(), stopped], return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                if admission.paused("build"):
+                    # Leave the job to workers that can start it now
+                    await self._sleep(WORKER_POLL_SECONDS)
+                    continue
+                try:
+                    claimed = await asyncio.to_thread(self.queue.claim, self.worker_id, BUILD_JOB_LEASE_SECONDS)
+                except Exception as e:
+                    log.warning("Could not claim a job", worker=self.worker_id, error=str(e))
+                    claimed = None
+                if claimed is None:
+                    await self._sleep(WORKER_POLL_SECONDS)
+                    continue
+                job_id, payload = claimed
+                task = asyncio.create_task(self._execute(job_id, payload))
+                self.running[job_id] = task
+                task.add_done_callback(lambda _, job_id=job_id: self.running.pop(job_id, None))
+            if self.running:
+                log.info("Waiting for running builds", worker=self.worker_id, jobs=sorted(self.running))
+                await asyncio.gather(*self.running.values(), return_exceptions=True)
+        finally:
+            heartbeat.cancel()
+            stopped.cancel()
+            await asyncio.to_thread(self.queue.unregister, self.worker_id)
+            log.info("Worker stopped", worker=self.worker_id, completed=self.completed, failed=self.failed)
+
+    async def _execute(self, job_id: str, payload: dict):
+        build = asyncio.create_task(self._build(job_id, payload))
+        lease_lost = False
+        while not build.done():
+            await asyncio.wait([build], timeout=BUILD_JOB_LEASE_SECONDS / 3)
+            if build.done():
+                break
+            try:
+                renewed = await asyncio.to_thread(self.queue.renew, job_id, self.worker_id, BUILD_JOB_LEASE_SECONDS)
+            except Exception as e:
+                # Keep building; the lease may still be renewed before it runs out
+                log.warning("Could not renew lease", job_id=job_id, error=str(e))
+                continue
+            if not renewed:
+                # Another worker has taken the job over; its result is the one that counts
+                lease_lost = True
+                build.cancel()
+                log.warning("Lease lost, build abandoned", job_id=job_id, worker=self.worker_id)
+        try:
+            result = await build
+        except asyncio.CancelledError:
+            if lease_lost:
+                return
+            raise
+        if result["status_code"] == 200:
+            self.completed += 1
+        else:
+            self.failed += 1
+        if not await asyncio.to_thread(self.queue.complete, job_id, self.worker_id, result):
+            log.warning("Result discarded, lease expired", job_id=job_id, worker=self.worker_id)
+
+    async def _build(self, job_id: str, payload: dict):
+        """Run the build pipeline for a job; returns {payload, status_code, trace[, retry_after]}"""
+        owner, repo, sha, project_path = payload["owner"], payload["repo"], payload["sha"], payload["project_path"]
+        headers = {"Authorization": payload["authorization"]}
+        trace = BuildTrace()
+        job = BuildJob(owner, repo, sha, project_path, deploy_target(owner, repo, project_path, payload["per_project"])[1])
+        # The API deletes jobs it no longer waits for (superseded or timed out); those must not go live
+        job.still_current = lambda: self.queue.renew(job_id, self.worker_id, BUILD_JOB_LEASE_SECONDS)
+        log.info("Build started", owner=owner, repo=repo, sha=sha, project_path=project_path, worker=self.worker_id)
+        result = {}
+        try:
+            body, status_code = await run_build_pipeline(
+                headers, owner, repo, project_path, sha, job, trace,
+                payload.get("cache_key"), payload.get("tree_sha"), payload["per_project"]
+            )
+        except GitHubRateLimited as e:
+            body, status_code = {"success": False, "error": str(e), "retry_after": e.retry_after}, 429
+            result["retry_after"] = e.retry_after
+        except Exception as e:
+            log.exception("Build failed", owner=owner, repo=repo, sha=sha)
+            body, status_code = {"success": False, "error": str(e)}, 500
+        log.info("Build finished", owner=owner, repo=repo, sha=sha, project_path=project_path,
+                 status_code=status_code, duration_ms=trace.to_dict()["total_ms"])
+        return {**result, "payload": body, "status_code": status_code, "trace": trace.spans}
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def main():
+    if not await docker_client_async():
+        log.warning("Docker not reachable yet; builds fail until it is")
+    if BUILD_BACKEND == "container":
+        container_pool.resize("build", CONTAINER_POOL_SIZE)
+    container_pool.start()
+    janitor.start()
+    if WORKER_METRICS_PORT:
+        server = ThreadingHTTPServer(("", WORKER_METRICS_PORT), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    worker = BuildWorker(get_job_queue())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await asyncio.to_thread(container_pool.stop)
+        janitor.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,195 @@
+"""In-process replacement for the docker-py client used by Hoster.
+
+Build containers sleep for a configurable time and then produce a small but
+valid React build in /app/dist, which get_archive streams back; backend
+containers just report themselves as running. Archives copied in with
+put_archive are unpacked in memory and kept on the container.
+"""
+import io
+import os
+import tarfile
+import time
+import uuid
+import threading
+from docker.errors import NotFound
+
+
+FAKE_INDEX_HTML = (
+    '<!doctype html><html><head><meta charset="utf-8"><title>bench</title>'
+    '<script type="module" crossorigin src="/assets/index-3f2a1b9c.js"></script>'
+    '<link rel="stylesheet" href="/assets/index-8d7e6f5a.css"></head>'
+    '<body><div id="root"></div></body></html>'
+)
+
+
+class FakeContainer:
+    def __init__(self, client, image, command=None, volumes=None, **kwargs):
+        self.client = client
+        self.id = uuid.uuid4().hex + uuid.uuid4().hex
+        self.short_id = self.id[:12]
+        self.image = image
+        self.volumes = volumes or {}
+        self.kwargs = kwargs
+        self.labels = kwargs.get("labels") or {}
+        self.status = "created"
+        self.files = {}
+        self.attrs = {"Id": self.id, "State": {"Status": self.status}}
+
+    def put_archive(self, path, data):
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            for member in tar.getmembers():
+                if member.isfile():
+                    self.files[os.path.join(path, member.name)] = tar.extractfile(member).read()
+        return True
+
+    def start(self):
+        self.status = "running"
+        self.started_at = time.time()
+
+    def wait(self, **kwargs):
+        time.sleep(self.client.build_seconds)
+        self.files["/app/dist/index.html"] = FAKE_INDEX_HTML.encode("utf-8")
+        for name, size in (("index-3f2a1b9c.js", 150_000), ("index-8d7e6f5a.css", 20_000)):
+            self.files[f"/app/dist/assets/{name}"] = ("/* bench */" + "x" * size).encode("utf-8")
+        self.exit()
+        return {"StatusCode": 0}
+
+    def get_archive(self, path, chunk_size=2 * 1024 * 1024, **kwargs):
+        prefix = path.rstrip("/") + "/"
+        files = {name: data for name, data in self.files.items() if name.startswith(prefix)}
+        if not files:
+            raise NotFound(f"Could not find the file {path} in container {self.id}")
+        buffer = io.BytesIO()
+        top = os.path.basename(path.rstrip("/"))
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for name, data in sorted(files.items()):
+                info = tarfile.TarInfo(f"{top}/{name[len(prefix):]}")
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        data = buffer.getvalue()
+        chunks = (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+        return chunks, {"name": top, "size": len(data)}
+
+    def logs(self, **kwargs):
+        now = int(time.time() * 1000)
+        half = int(self.client.build_seconds * 500)
+        return (
+            f"@@hoster-phase npm_install start {now - 2 * half}\n"
+            f"@@hoster-phase npm_install end {now - half}\n"
+            f"@@hoster-phase build start {now - half}\n"
+            "vite v5.0.0 building for production...\n"
+            f"@@hoster-phase build end {now}\n"
+            "✅ SUCCESS: Build completed and files copied\n"
+        ).encode("utf-8")
+
+    def rename(self, name):
+        self.kwargs["name"] = name
+
+    def exit(self):
+        self.status = "exited"
+        self.attrs["State"] = {"Status": "exited", "FinishedAt": time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z", time.gmtime())}
+
+    def stop(self, **kwargs):
+        self.exit()
+
+    def kill(self, signal=None):
+        if signal in (None, "SIGKILL"):
+            self.exit()
+
+    def remove(self, **kwargs):
+        self.client.containers._remove(self.id)
+
+    def reload(self):
+        pass
+
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+        self._containers = {}
+        self._lock = threading.Lock()
+
+    def create(self, image, command=None, **kwargs):
+        container = FakeContainer(self.client, image, command, **kwargs)
+        with self._lock:
+            self._containers[container.id] = container
+        return container
+
+    def run(self, image, command=None, detach=False, remove=False, **kwargs):
+        container = self.create(image, command, **kwargs)
+        container.start()
+        return container
+
+    def get(self, container_id):
+        with self._lock:
+            for cid, container in self._containers.items():
+                if cid == container_id or cid.startswith(container_id) or container.kwargs.get("name") == container_id:
+                    return container
+        raise NotFound(f"No such container: {container_id}")
+
+    def list(self, all=False, filters=None, **kwargs):
+        with self._lock:
+            containers = list(self._containers.values())
+        if not all:
+            containers = [c for c in containers if c.status == "running"]
+        filters = filters or {}
+        if filters.get("status"):
+            containers = [c for c in containers if c.status == filters["status"]]
+        if filters.get("name"):
+            containers = [c for c in containers if filters["name"] in (c.kwargs.get("name") or "")]
+        label = filters.get("label")
+        if label:
+            key, _, value = label.partition("=")
+            containers = [c for c in containers if key in c.labels and (not value or c.labels[key] == value)]
+        return containers
+
+    def _remove(self, container_id):
+        with self._lock:
+            self._containers.pop(container_id, None)
+
+
+class FakeImage:
+    def __init__(self, name):
+        self.id = "sha256:" + uuid.uuid5(uuid.NAMESPACE_URL, name).hex * 2
+        repo = name.rsplit(":", 1)[0]
+        self.attrs = {"RepoDigests": [f"{repo}@{self.id}"]}
+
+
+class FakeImages:
+    def prune(self, filters=None):
+        return {"ImagesDeleted": None, "SpaceReclaimed": 0}
+
+    def pull(self, name, **kwargs):
+        return FakeImage(name)
+
+    def get(self, name):
+        return FakeImage(name)
+
+
+class FakeAPI:
+    def __init__(self, client):
+        self.client = client
+        self.hooks = {"response": []}
+
+    def containers(self, all=False, size=False, filters=None, **kwargs):
+        return [{"Id": c.id, "SizeRw": 4096} for c in self.client.containers.list(all=all, filters=filters)]
+
+
+class FakeDockerClient:
+    def __init__(self, build_seconds: float = 0.5):
+        self.build_seconds = build_seconds
+        self.api = FakeAPI(self)
+        self.containers = FakeContainers(self)
+        self.images = FakeImages()
+
+    def ping(self):
+        return True
+
+    def info(self):
+        return {"DockerRootDir": "/var/lib/docker"}
+
+    def df(self):
+        return {"LayersSize": 0}
+
+    def version(self):
+        return {"Version": "fake", "ApiVersion": "1.43"}
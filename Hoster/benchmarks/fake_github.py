@@ -0,0 +1,239 @@
+"""Stand-in for the parts of the GitHub REST API that Hoster calls.
+
+Serves a set of synthetic repositories: paginated /user/repos, contents,
+commits, git commits and trees, and zipballs built on the fly.
+"""
+import io
+import json
+import time
+import base64
+import hashlib
+import zipfile
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+REACT_PACKAGE_JSON = {
+    "name": "bench-app",
+    "version": "1.0.0",
+    "dependencies": {"react": "^18.2.0", "react-dom": "^18.2.0"},
+    "devDependencies": {"vite": "^5.0.0"},
+    "scripts": {"dev": "vite", "build": "vite build"},
+}
+
+EXPRESS_PACKAGE_JSON = {
+    "name": "bench-api",
+    "version": "1.0.0",
+    "main": "index.js",
+    "dependencies": {"express": "^4.18.0"},
+    "scripts": {"start": "node index.js"},
+}
+
+
+def _git_sha(data: bytes):
+    return hashlib.sha1(data).hexdigest()
+
+
+def make_repo_files(index: int, source_files: int = 20, frontends: int = 1):
+    """Monorepo layout: Vite React apps in frontend/ (admin-1/, admin-2/, ... for more) and an Express API in backend/"""
+    files = {
+        "README.md": f"# bench repo {index}\n",
+        "backend/package.json": json.dumps(EXPRESS_PACKAGE_JSON, indent=2),
+        "backend/index.js": "require('express')().listen(process.env.PORT || 3000)\n",
+    }
+    for directory in ["frontend"] + [f"admin-{n}" for n in range(1, frontends)]:
+        files.update({
+            f"{directory}/package.json": json.dumps(REACT_PACKAGE_JSON, indent=2),
+            f"{directory}/index.html": '<!doctype html><html><body><div id="root"></div>'
+                                       '<script type="module" src="/src/main.jsx"></script></body></html>',
+            f"{directory}/src/main.jsx": "import React from 'react'\nimport App from './App'\n",
+            f"{directory}/src/App.jsx": "export default function App() { return <h1>bench</h1> }\n",
+        })
+        for n in range(source_files):
+            files[f"{directory}/src/components/Component{n}.jsx"] = (
+                f"export const Component{n} = () => <div>{'x' * 200}</div>\n"
+            )
+    return {path: content.encode("utf-8") for path, content in files.items()}
+
+
+class FakeRepo:
+    def __init__(self, owner: str, name: str, files: dict):
+        self.owner = owner
+        self.name = name
+        self.files = files
+        self.trees = {}
+        self.root_tree = self._build_tree("")
+        self.commit_sha = _git_sha(f"commit {owner}/{name} {self.root_tree}".encode("utf-8"))
+        self._zipball = None
+        self._lock = threading.Lock()
+
+    def _children(self, directory: str):
+        prefix = f"{directory}/" if directory else ""
+        entries = {}
+        for path in self.files:
+            if not path.startswith(prefix):
+                continue
+            head, _, rest = path[len(prefix):].partition("/")
+            entries[head] = "tree" if rest else "blob"
+        return entries
+
+    def _build_tree(self, directory: str):
+        entries = []
+        for name, kind in sorted(self._children(directory).items()):
+            path = f"{directory}/{name}" if directory else name
+            sha = self._build_tree(path) if kind == "tree" else _git_sha(self.files[path])
+            entries.append({"path": name, "type": kind, "sha": sha, "mode": "040000" if kind == "tree" else "100644"})
+        sha = _git_sha(json.dumps(entries).encode("utf-8"))
+        self.trees[sha] = entries
+        return sha
+
+    def contents(self, path: str):
+        path = path.strip("/")
+        if path in self.files:
+            data = self.files[path]
+            return {
+                "type": "file",
+                "name": path.rsplit("/", 1)[-1],
+                "path": path,
+                "size": len(data),
+                "encoding": "base64",
+                "content": base64.b64encode(data).decode("ascii"),
+            }
+        children = self._children(path)
+        if not children:
+            return None
+        return [
+            {
+                "type": "dir" if kind == "tree" else "file",
+                "name": name,
+                "path": f"{path}/{name}" if path else name,
+                "size": 0 if kind == "tree" else len(self.files[f"{path}/{name}" if path else name]),
+            }
+            for name, kind in sorted(children.items())
+        ]
+
+    def zipball(self):
+        with self._lock:
+            if self._zipball is None:
+                top = f"{self.owner}-{self.name}-{self.commit_sha[:7]}/"
+                buffer = io.BytesIO()
+                with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                    for path, data in self.files.items():
+                        archive.writestr(top + path, data)
+                self._zipball = buffer.getvalue()
+            return self._zipball
+
+    def summary(self, index: int):
+        return {
+            "name": self.name,
+            "full_name": f"{self.owner}/{self.name}",
+            "owner": {"login": self.owner},
+            "description": "benchmark repository",
+            "clone_url": f"https://github.com/{self.owner}/{self.name}.git",
+            "updated_at": f"2025-01-{index % 28 + 1:02d}T00:00:00Z",
+            "private": index % 3 == 0,
+            "language": "JavaScript",
+        }
+
+
+class FakeGitHub:
+    def __init__(self, owner: str = "bench", repo_count: int = 150, source_files: int = 20, latency: float = 0.0,
+                 frontends: int = 1):
+        self.owner = owner
+        self.latency = latency
+        self.repos = {
+            f"repo-{i}": FakeRepo(owner, f"repo-{i}", make_repo_files(i, source_files, frontends))
+            for i in range(repo_count)
+        }
+        self.request_count = 0
+        self._server = None
+
+    def start(self, host: str = "127.0.0.1", port: int = 0):
+        github = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                github.request_count += 1
+                if github.latency:
+                    time.sleep(github.latency)
+                github.handle(self)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @staticmethod
+    def _send(handler, status: int, body, content_type: str = "application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8") if content_type == "application/json" else body.encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.send_header("X-RateLimit-Limit", "5000")
+        handler.send_header("X-RateLimit-Remaining", "4999")
+        handler.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _user_repos(self, handler, query):
+        page = int(query.get("page", ["1"])[0])
+        per_page = int(query.get("per_page", ["30"])[0])
+        repos = list(self.repos.values())
+        last_page = max((len(repos) + per_page - 1) // per_page, 1)
+        chunk = [repo.summary(i) for i, repo in enumerate(repos)][(page - 1) * per_page:page * per_page]
+        etag = f'"{_git_sha(json.dumps([page, per_page, len(repos)]).encode("utf-8"))}"'
+        if handler.headers.get("If-None-Match") == etag:
+            return self._send(handler, 304, b"", headers={"ETag": etag})
+        base = f"http://{handler.headers.get('Host')}/user/repos"
+        link = f'<{base}?page={last_page}&per_page={per_page}>; rel="last"'
+        return self._send(handler, 200, chunk, headers={"ETag": etag, "Link": link})
+
+    def handle(self, handler):
+        url = urlparse(handler.path)
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split("/") if p]
+
+        if parts == ["rate_limit"]:
+            core = {"limit": 5000, "remaining": 4999, "reset": int(time.time()) + 3600, "used": 1}
+            return self._send(handler, 200, {"resources": {"core": core}, "rate": core})
+        if parts == ["user"]:
+            return self._send(handler, 200, {"login": self.owner, "id": 1})
+        if parts == ["user", "repos"]:
+            return self._user_repos(handler, query)
+        if len(parts) < 3 or parts[0] != "repos" or parts[1] != self.owner or parts[2] not in self.repos:
+            return self._send(handler, 404, {"message": "Not Found"})
+
+        repo = self.repos[parts[2]]
+        rest = parts[3:]
+        if rest[:1] == ["contents"]:
+            found = repo.contents("/".join(rest[1:]))
+            return self._send(handler, 200, found) if found is not None else self._send(handler, 404, {"message": "Not Found"})
+        if rest[:1] == ["commits"] and len(rest) == 2:
+            if "sha" in handler.headers.get("Accept", ""):
+                return self._send(handler, 200, repo.commit_sha, content_type="text/plain")
+            return self._send(handler, 200, {"sha": repo.commit_sha, "commit": {"tree": {"sha": repo.root_tree}}})
+        if rest[:2] == ["git", "commits"]:
+            return self._send(handler, 200, {"sha": repo.commit_sha, "tree": {"sha": repo.root_tree}})
+        if rest[:2] == ["git", "trees"] and len(rest) == 3:
+            entries = repo.trees.get(rest[2])
+            if entries is None:
+                return self._send(handler, 404, {"message": "Not Found"})
+            return self._send(handler, 200, {"sha": rest[2], "tree": entries, "truncated": False})
+        if rest[:1] == ["zipball"]:
+            return self._send(handler, 200, repo.zipball(), content_type="application/zip")
+        return self._send(handler, 404, {"message": "Not Found"})
@@ -0,0 +1,159 @@
+"""Minimal S3-compatible stub (path-style addressing) for the calls Hoster makes.
+
+Objects are kept in memory; bucket-level configuration calls are accepted
+and answered with canned responses.
+"""
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from xml.sax.saxutils import escape
+
+
+class FakeS3:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.objects = {}
+        self.metadata = {}
+        self.bytes_received = 0
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self, host: str = "127.0.0.1", port: int = 0):
+        s3 = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self):
+                s3.request_count += 1
+                if s3.latency:
+                    time.sleep(s3.latency)
+                s3.handle(self)
+
+            do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = _dispatch
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @staticmethod
+    def _read_body(handler):
+        if handler.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(handler.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while handler.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    return body
+                body += handler.rfile.read(size)
+                handler.rfile.readline()
+        return handler.rfile.read(int(handler.headers.get("Content-Length") or 0))
+
+    @staticmethod
+    def _send(handler, status: int, body: bytes = b"", headers=None):
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/xml")
+        handler.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        if handler.command != "HEAD":
+            handler.wfile.write(body)
+
+    def _list(self, handler, bucket, query):
+        prefix = query.get("prefix", [""])[0]
+        delimiter = query.get("delimiter", [""])[0]
+        with self._lock:
+            keys = sorted(k for (b, k) in self.objects if b == bucket and k.startswith(prefix))
+        common = []
+        if delimiter:
+            rolled = {
+                prefix + k[len(prefix):].split(delimiter, 1)[0] + delimiter
+                for k in keys if delimiter in k[len(prefix):]
+            }
+            keys = [k for k in keys if delimiter not in k[len(prefix):]]
+            common = sorted(rolled)
+        contents = "".join(
+            f"<Contents><Key>{escape(k)}</Key><Size>{len(self.objects[(bucket, k)])}</Size></Contents>"
+            for k in keys[:1000]
+        )
+        contents += "".join(f"<CommonPrefixes><Prefix>{escape(p)}</Prefix></CommonPrefixes>" for p in common)
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f"<ListBucketResult><Name>{bucket}</Name><Prefix>{escape(prefix)}</Prefix>"
+            f"<KeyCount>{min(len(keys), 1000) + len(common)}</KeyCount><MaxKeys>1000</MaxKeys>"
+            f"<IsTruncated>false</IsTruncated>{contents}</ListBucketResult>"
+        )
+        return self._send(handler, 200, body.encode("utf-8"))
+
+    def handle(self, handler):
+        url = urlparse(handler.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+        body = self._read_body(handler) if handler.command in ("PUT", "POST") else b""
+
+        if not key:
+            if "website" in query or "policy" in query or "cors" in query:
+                if handler.command == "GET" and "website" in query:
+                    xml = b"<WebsiteConfiguration><IndexDocument><Suffix>index.html</Suffix></IndexDocument></WebsiteConfiguration>"
+                    return self._send(handler, 200, xml)
+                return self._send(handler, 200 if handler.command != "DELETE" else 204)
+            if "location" in query:
+                return self._send(handler, 200, b"<LocationConstraint>us-east-1</LocationConstraint>")
+            if "delete" in query and handler.command == "POST":
+                with self._lock:
+                    for part in body.split(b"<Key>")[1:]:
+                        key = part.split(b"</Key>")[0].decode("utf-8")
+                        self.objects.pop((bucket, key), None)
+                        self.metadata.pop((bucket, key), None)
+                return self._send(handler, 200, b"<DeleteResult></DeleteResult>")
+            if handler.command in ("GET", "HEAD"):
+                return self._list(handler, bucket, query)
+            return self._send(handler, 200)
+
+        if handler.command == "PUT" and handler.headers.get("x-amz-copy-source"):
+            source_bucket, _, source_key = unquote(handler.headers["x-amz-copy-source"]).lstrip("/").partition("/")
+            with self._lock:
+                data = self.objects.get((source_bucket, source_key))
+                if data is not None:
+                    self.objects[(bucket, key)] = data
+                    self.metadata[(bucket, key)] = dict(self.metadata.get((source_bucket, source_key), {}))
+            if data is None:
+                return self._send(handler, 404, b"<Error><Code>NoSuchKey</Code></Error>")
+            xml = f'<CopyObjectResult><ETag>"{hashlib.md5(data).hexdigest()}"</ETag></CopyObjectResult>'
+            return self._send(handler, 200, xml.encode("utf-8"))
+        if handler.command == "PUT":
+            with self._lock:
+                self.objects[(bucket, key)] = body
+                self.metadata[(bucket, key)] = {
+                    name: handler.headers[name] for name in ("Content-Type", "Cache-Control", "Content-Encoding")
+                    if handler.headers.get(name)
+                }
+                self.bytes_received += len(body)
+            return self._send(handler, 200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+        if handler.command == "DELETE":
+            with self._lock:
+                self.objects.pop((bucket, key), None)
+                self.metadata.pop((bucket, key), None)
+            return self._send(handler, 204)
+        with self._lock:
+            data = self.objects.get((bucket, key))
+            metadata = self.metadata.get((bucket, key), {})
+        if data is None:
+            return self._send(handler, 404, b"<Error><Code>NoSuchKey</Code></Error>")
+        return self._send(handler, 200, data, {k: v for k, v in metadata.items() if k != "Content-Type"})
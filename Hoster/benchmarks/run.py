@@ -0,0 +1,263 @@
+"""Offline benchmark of the Hoster API.
+
+Runs the FastAPI app in-process against a fake GitHub API, an S3 stub and a
+fake Docker client, drives the main endpoints at a fixed concurrency and
+prints latency percentiles and throughput as JSON.
+
+    cd Hoster
+    python -m benchmarks.run --concurrency 20 --requests 200 --output bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.2
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+
+from benchmarks.fake_github import FakeGitHub
+from benchmarks.fake_s3 import FakeS3
+from benchmarks.fake_docker import FakeDockerClient
+
+
+SCENARIOS = ("repos", "check-react", "repo-structure", "build", "build-cached", "build-all", "backend-status")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Hoster API benchmark")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per scenario")
+    parser.add_argument("--repos", type=int, default=150, help="repositories served by the fake GitHub")
+    parser.add_argument("--source-files", type=int, default=20, help="extra source files per repository")
+    parser.add_argument("--frontends", type=int, default=1, help="React projects per repository (build-all builds them all)")
+    parser.add_argument("--backends", type=int, default=20, help="fake running backends for backend-status")
+    parser.add_argument("--github-latency", type=float, default=0.0, help="seconds added to every GitHub response")
+    parser.add_argument("--s3-latency", type=float, default=0.0, help="seconds added to every S3 response")
+    parser.add_argument("--build-seconds", type=float, default=0.2, help="simulated container build time")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression of p95 and throughput")
+    return parser.parse_args(argv)
+
+
+def configure_environment(workdir: str, github_url: str, s3_url: str):
+    """Point the app at the stand-ins; must run before the app is imported"""
+    os.environ.update({
+        "GITHUB_API_URL": github_url,
+        "S3_ENDPOINT_URL": s3_url,
+        "S3_BUCKET_NAME": "hoster-bench",
+        "S3_BASE_URL": f"{s3_url}/hoster-bench/",
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AWS_REGION": "us-east-1",
+        # The stub does not implement aws-chunked checksum trailers
+        "AWS_REQUEST_CHECKSUM_CALCULATION": "when_required",
+        "SESSION_BACKEND": "sqlite",
+        "SESSION_SQLITE_PATH": os.path.join(workdir, "sessions.db"),
+        "BUILD_CACHE_PATH": os.path.join(workdir, "build_cache.json"),
+        "BUILD_HISTORY_PATH": os.path.join(workdir, "build_history.db"),
+    })
+    os.environ.setdefault("GITHUB_CLIENT_ID", "bench")
+    os.environ.setdefault("GITHUB_CLIENT_SECRET", "bench")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # The fake never runs out of quota; keep the scheduler from pacing the load itself
+    os.environ.setdefault("GITHUB_BURST", "1000000")
+    # Build artifacts are written relative to the working directory
+    os.chdir(workdir)
+
+
+def percentile(sorted_values, fraction: float):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, wall_seconds: float, concurrency: int):
+    ordered = sorted(latencies)
+    codes = {}
+    for status in statuses:
+        codes[str(status)] = codes.get(str(status), 0) + 1
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": sum(1 for status in statuses if status >= 400),
+        "status_codes": codes,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        "latency_ms": {
+            "min": ms(ordered[0] if ordered else None),
+            "mean": ms(sum(ordered) / len(ordered) if ordered else None),
+            "p50": ms(percentile(ordered, 0.50)),
+            "p95": ms(percentile(ordered, 0.95)),
+            "p99": ms(percentile(ordered, 0.99)),
+            "max": ms(ordered[-1] if ordered else None),
+        },
+    }
+
+
+async def drive(client, make_request, total: int, concurrency: int):
+    """Issue total requests with at most concurrency in flight; returns (latencies, statuses, wall)"""
+    latencies, statuses = [], []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            method, url = make_request(i)
+            started_at = time.perf_counter()
+            try:
+                response = await client.request(method, url)
+                status = response.status_code
+            except Exception:
+                status = 599
+            latencies.append(time.perf_counter() - started_at)
+            statuses.append(status)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(1, min(concurrency, total)))])
+    return latencies, statuses, time.perf_counter() - started_at
+
+
+def scenario_requests(owner: str, repo_count: int):
+    repo = lambda i: f"repo-{i % repo_count}"
+    return {
+        "repos": lambda i: ("GET", "/api/project/repos"),
+        "check-react": lambda i: ("GET", f"/api/project/check-react/{owner}/{repo(i)}"),
+        "repo-structure": lambda i: ("GET", f"/api/project/repo-structure/{owner}/{repo(i)}"),
+        # Distinct repositories and force=true exercise the whole pipeline on every request
+        "build": lambda i: ("POST", f"/api/project/build/{owner}/{repo(i)}?force=true"),
+        "build-cached": lambda i: ("POST", f"/api/project/build/{owner}/{repo(0)}"),
+        "build-all": lambda i: ("POST", f"/api/project/build/{owner}/{repo(i)}?all=true&force=true"),
+        "backend-status": lambda i: ("GET", "/api/project/backend-status"),
+    }
+
+
+def register_fake_backends(project, docker_client, owner: str, count: int):
+    for i in range(count):
+        port = 9000 + i
+        container = docker_client.containers.run("node:18-alpine", name=f"backend_{owner}_api-{i}_{port}", detach=True)
+        project.register_backend(f"{owner}_api-{i}", {
+            "container_id": container.id,
+            "port": port,
+            "owner": owner,
+            "repo": f"api-{i}",
+            "backend_type": "nodejs",
+            "local_url": f"http://localhost:{port}",
+            "started_at": time.time(),
+        })
+
+
+async def run_benchmark(args, github, s3, docker_client):
+    import httpx
+    from app.main import app
+    from app.sessions import session_manager, SESSION_COOKIE_NAME
+    from app.routes.Project import Project as project
+    from app.clients import set_docker_client
+
+    set_docker_client(docker_client)
+    register_fake_backends(project, docker_client, "bench-backend", args.backends)
+
+    session_id = session_manager.create({
+        "token": {"access_token": "bench-token", "token_type": "bearer"},
+        "user": {"login": github.owner},
+    })
+    transport = httpx.ASGITransport(app=app)
+    requests_for = scenario_requests(github.owner, len(github.repos))
+    results = {}
+    async with httpx.AsyncClient(
+        transport=transport,
+        base_url="http://hoster.bench",
+        cookies={SESSION_COOKIE_NAME: session_id},
+        timeout=600,
+    ) as client:
+        for name in args.scenarios:
+            make_request = requests_for[name]
+            if args.warmup:
+                # Warm-up uses indexes past the measured range so cold scenarios stay cold
+                await drive(client, lambda i: make_request(i + args.requests), args.warmup, args.concurrency)
+            github_before, s3_before = github.request_count, s3.request_count
+            latencies, statuses, wall = await drive(client, make_request, args.requests, args.concurrency)
+            results[name] = summarize(latencies, statuses, wall, args.concurrency)
+            results[name]["upstream_requests"] = {
+                "github": github.request_count - github_before,
+                "s3": s3.request_count - s3_before,
+            }
+            print(f"{name}: p50={results[name]['latency_ms']['p50']}ms "
+                  f"p95={results[name]['latency_ms']['p95']}ms "
+                  f"rps={results[name]['throughput_rps']} errors={results[name]['errors']}", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold: float):
+    """List scenarios whose p95 latency or throughput regressed by more than threshold"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        old_p95, new_p95 = previous["latency_ms"]["p95"], current["latency_ms"]["p95"]
+        if old_p95 and new_p95 and new_p95 > old_p95 * (1 + threshold):
+            regressions.append({"scenario": name, "metric": "p95_ms", "baseline": old_p95, "current": new_p95})
+        old_rps, new_rps = previous["throughput_rps"], current["throughput_rps"]
+        if old_rps and new_rps and new_rps < old_rps * (1 - threshold):
+            regressions.append({"scenario": name, "metric": "throughput_rps", "baseline": old_rps, "current": new_rps})
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    sys.path.insert(0, os.getcwd())
+
+    github = FakeGitHub(repo_count=args.repos, source_files=args.source_files, latency=args.github_latency,
+                        frontends=args.frontends)
+    s3 = FakeS3(latency=args.s3_latency)
+    docker_client = FakeDockerClient(build_seconds=args.build_seconds)
+    github_url, s3_url = github.start(), s3.start()
+
+    with tempfile.TemporaryDirectory(prefix="hoster-bench-") as workdir:
+        configure_environment(workdir, github_url, s3_url)
+        try:
+            results = asyncio.run(run_benchmark(args, github, s3, docker_client))
+        finally:
+            github.stop()
+            s3.stop()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "scenarios": results,
+    }
+    exit_code = 0
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            report["regressions"] = compare(results, json.load(f), args.threshold)
+        exit_code = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Regression Test for Build Coalescing
+Tests that superseded builds are cleaned up and that only a newer commit of the same ref supersedes a queued build
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Hoster"))
+
+from app.build_jobs import BuildCoalescer
+
+
+def make_pipeline(release: asyncio.Event, started: list):
+    """Pipeline that stays queued until release is set, like a build waiting for admission"""
+    async def pipeline(job):
+        await release.wait()
+        job.state = "running"
+        started.append(job.sha)
+        return {"sha": job.sha}, 200
+    return pipeline
+
+
+async def cancelled_before_start():
+    """A job superseded before its task ever ran must leave the in-flight list"""
+    coalescer = BuildCoalescer()
+    release = asyncio.Event()
+    started = []
+    pipeline = make_pipeline(release, started)
+
+    # Both requests start in the same loop turn, so the first task is cancelled before it runs
+    old = asyncio.create_task(coalescer.run("o", "r", "aaa", "", pipeline, ref="HEAD"))
+    new = asyncio.create_task(coalescer.run("o", "r", "bbb", "", pipeline, ref="HEAD"))
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    in_flight = [job["sha"] for job in coalescer.in_flight()]
+    if in_flight != ["bbb"]:
+        print(f"❌ Superseded job still in flight: {in_flight}")
+        return False
+
+    release.set()
+    (old_result, _), old_job, _ = await old
+    await new
+    if old_job.sha != "bbb" or old_result["sha"] != "bbb":
+        print(f"❌ Superseded request did not follow the newer build: {old_job.sha}")
+        return False
+
+    # The old commit can be built again rather than attaching to the dead job
+    (result, status_code), job, coalesced = await coalescer.run("o", "r", "aaa", "", pipeline, ref="HEAD")
+    if job.sha != "aaa" or coalesced or status_code != 200:
+        print(f"❌ Rebuilding the old commit attached to {job.sha} (coalesced={coalesced})")
+        return False
+    if coalescer.in_flight():
+        print(f"❌ Jobs left behind: {coalescer.in_flight()}")
+        return False
+    print("✅ Cancelled job was removed and its commit can be built again")
+    return True
+
+
+async def pinned_ref_does_not_supersede():
+    """A ?ref=<old sha> request must not cancel a queued HEAD build"""
+    coalescer = BuildCoalescer()
+    release = asyncio.Event()
+    started = []
+    pipeline = make_pipeline(release, started)
+
+    head = asyncio.create_task(coalescer.run("o", "r", "bbb", "", pipeline, ref="HEAD"))
+    await asyncio.sleep(0)
+    pinned = asyncio.create_task(coalescer.run("o", "r", "aaa", "", pipeline, ref="aaa"))
+    await asyncio.sleep(0)
+
+    release.set()
+    (_, _), head_job, head_coalesced = await head
+    (_, _), pinned_job, pinned_coalesced = await pinned
+    if head_job.sha != "bbb" or pinned_job.sha != "aaa" or head_coalesced or pinned_coalesced:
+        print(f"❌ HEAD build ended as {head_job.sha}, pinned build as {pinned_job.sha}")
+        return False
+    if sorted(started) != ["aaa", "bbb"]:
+        print(f"❌ Expected both commits to build, built {started}")
+        return False
+    print("✅ Pinned ref left the queued HEAD build alone")
+    return True
+
+
+def main():
+    print("🧪 Build Coalescer Testing")
+    print("=" * 40)
+
+    cleanup_test = asyncio.run(cancelled_before_start())
+    ref_test = asyncio.run(pinned_ref_does_not_supersede())
+
+    print("\n" + "=" * 40)
+    print("📊 Test Results:")
+    print(f"Cancelled Job Cleanup:     {'✅ PASS' if cleanup_test else '❌ FAIL'}")
+    print(f"Supersede Same Ref Only:   {'✅ PASS' if ref_test else '❌ FAIL'}")
+
+    if not (cleanup_test and ref_test):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()